@@ -9,5 +9,34 @@ class Settings:
     DATABASE_URL: str = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
     DATABASE_NAME: str = os.getenv("MONGO_DB_NAME", "pharmacy_kpi_db")
     COLLECTION_NAME: str = os.getenv("MONGO_COLLECTION_NAME", "kpi_data")
+    # Store product names only in the 'products' dimension collection, not on every kpi_data row.
+    NORMALIZE_KPI_FACTS: bool = os.getenv("NORMALIZE_KPI_FACTS", "false").lower() == "true"
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_TTL_SECONDS: float = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    CACHE_VERSION_CHECK_SECONDS: float = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "1.0"))
+    # Requests taking at least this long are logged with their phase breakdown.
+    SLOW_REQUEST_MS: float = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+    # Maximum per-branch queries one request runs at once (see services/fanout.py).
+    FANOUT_CONCURRENCY: int = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+    # Where CPU-bound calculations run: "thread", "process" or "inline" (see services/executor.py).
+    CALCULATION_EXECUTOR: str = os.getenv("CALCULATION_EXECUTOR", "thread").lower()
+    CALCULATION_WORKERS: int = int(os.getenv("CALCULATION_WORKERS", "0"))  # 0 picks a size from the CPU count
+    CALCULATION_OFFLOAD_MIN_ROWS: int = int(os.getenv("CALCULATION_OFFLOAD_MIN_ROWS", "5000"))
+    # How often the API recomputes daily KPIs of newly ingested days; 0 disables it (see services/materializer.py).
+    MATERIALIZE_INTERVAL_SECONDS: float = float(os.getenv("MATERIALIZE_INTERVAL_SECONDS", "5"))
+    # Failed runs after which a partition is moved to the failed_partitions collection.
+    MATERIALIZE_MAX_ATTEMPTS: int = int(os.getenv("MATERIALIZE_MAX_ATTEMPTS", "3"))
+    # Products kept per (branch_id, day) top-seller summary (see services/heavy_hitters.py).
+    TOP_SELLER_SKETCH_SIZE: int = int(os.getenv("TOP_SELLER_SKETCH_SIZE", "200"))
+    # Alert rules evaluated whenever daily KPIs are written, and their "warning,critical" thresholds (see services/alerts.py).
+    ALERT_RULES: str = os.getenv("ALERT_RULES", "stock_out,cash_discrepancy,near_expiry,sales_drop")
+    ALERT_STOCK_OUT_THRESHOLDS: str = os.getenv("ALERT_STOCK_OUT_THRESHOLDS", "1,3")  # products out of stock
+    ALERT_CASH_DISCREPANCY_THRESHOLDS: str = os.getenv("ALERT_CASH_DISCREPANCY_THRESHOLDS", "20,50")  # |sales - cash|
+    ALERT_NEAR_EXPIRY_THRESHOLDS: str = os.getenv("ALERT_NEAR_EXPIRY_THRESHOLDS", "2,5")  # products near expiry
+    ALERT_SALES_DROP_THRESHOLDS: str = os.getenv("ALERT_SALES_DROP_THRESHOLDS", "0.5,0.75")  # fraction below trailing mean
+    ALERT_SALES_TRAILING_DAYS: int = int(os.getenv("ALERT_SALES_TRAILING_DAYS", "7"))
+    SERVER_TIMING_ENABLED: bool = os.getenv("SERVER_TIMING_ENABLED", "false").lower() == "true"
 
 settings = Settings()
@@ -0,0 +1,4 @@
+import pytest
+
+# Keep pytest's detailed assertion messages inside the shared helpers.
+pytest.register_assert_rewrite("testing_utils")
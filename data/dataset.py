@@ -1,59 +1,136 @@
-import pandas as pd
-import numpy as np
+'''
+Synthetic pharmacy KPI dataset generator.
+
+Generates one row per branch, day and product, in the schema the API loads
+(see scripts/load_csv_to_db.py). Rows are generated with vectorized numpy calls,
+a block of days at a time, and appended to the output file, so memory stays
+bounded by --chunk-rows no matter how many rows are written.
+
+    python data/dataset.py                                   # the bundled 3 x 365 x 8 dataset
+    python data/dataset.py --branches 500 --products 600 --days 365 --output big.parquet
+'''
+import argparse
+import time
 from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['Date', 'Product_ID', 'Product_Name', 'Category', 'Quantity_Sold', 'Price', 'Sales_Value',
+           'Inventory_Level', 'Expiration_Date', 'Cash_Received', 'branch_id']
+
+# Product list (mix of Rx and OTC); larger catalogs continue the pattern with numbered products
+BASE_PRODUCTS = [('Aspirin', 'OTC'), ('Insulin (Rx)', 'Rx'), ('Bandages', 'OTC'), ('Antibiotic (Rx)', 'Rx'),
+                 ('Vitamins', 'OTC'), ('Painkiller (Rx)', 'Rx'), ('Shampoo', 'OTC'), ('Cough Syrup (Rx)', 'Rx')]
+
+# Demand profiles, assigned to branches in turn:
+# (Rx mean quantity, OTC mean quantity, min price, max price)
+BRANCH_PROFILES = [
+    (15, 10, 7, 60),  # Urban branch - higher Rx volume
+    (8, 25, 4, 40),   # Rural branch - higher OTC sales
+    (10, 20, 5, 50),  # Average branch
+]
+
+# Relative to the current directory, as before, so a bare run never overwrites the tracked sample in data/.
+DEFAULT_OUTPUT = 'all_in_one_kpi_dataset.csv'
+
+def make_products(num_products: int):
+    names, categories = [], []
+    for i in range(num_products):
+        if i < len(BASE_PRODUCTS):
+            name, category = BASE_PRODUCTS[i]
+        else:
+            category = BASE_PRODUCTS[i % len(BASE_PRODUCTS)][1]
+            name = f"Product {i + 1} (Rx)" if category == 'Rx' else f"Product {i + 1}"
+        names.append(name)
+        categories.append(category)
+    return np.arange(1, num_products + 1), np.array(names, dtype=object), np.array(categories, dtype=object)
+
+def generate_block(rng: np.random.Generator, branch_id: int, dates: np.ndarray, products) -> pd.DataFrame:
+    '''
+    Generates every (day, product) row of one branch for the given days.
+    '''
+    product_ids, names, categories = products
+    num_products = len(product_ids)
+    rows = len(dates) * num_products
+    rx_mean, otc_mean, price_low, price_high = BRANCH_PROFILES[(branch_id - 1) % len(BRANCH_PROFILES)]
+
+    is_rx = np.tile(categories == 'Rx', len(dates))
+    quantity_sold = rng.poisson(np.where(is_rx, rx_mean, otc_mean))
+    price = rng.uniform(price_low, price_high, rows)
+    sales_value = quantity_sold * price
+    date = np.repeat(dates, num_products)
+
+    return pd.DataFrame({
+        'Date': date,
+        'Product_ID': np.tile(product_ids, len(dates)),
+        'Product_Name': pd.Categorical.from_codes(np.tile(np.arange(num_products), len(dates)), names),
+        'Category': np.where(is_rx, 'Rx', 'OTC'),
+        'Quantity_Sold': quantity_sold,
+        'Price': price,
+        'Sales_Value': sales_value.round(2),
+        'Inventory_Level': rng.integers(0, 100, rows),
+        'Expiration_Date': date + rng.integers(1, 365, rows).astype('timedelta64[D]'),
+        'Cash_Received': (sales_value + rng.normal(0, 5, rows)).round(2),  # Small discrepancy
+        'branch_id': branch_id,
+    }, columns=COLUMNS)
+
+def generate(num_branches: int, num_products: int, num_days: int, start_date: datetime, seed: int, chunk_rows: int):
+    '''
+    Yields the dataset as DataFrames of at most 'chunk_rows' rows (at least one day per chunk),
+    ordered by branch, then date, then product.
+    '''
+    rng = np.random.default_rng(seed)
+    products = make_products(num_products)
+    dates = np.datetime64(start_date.date(), 'D') + np.arange(num_days)
+    days_per_chunk = max(1, chunk_rows // num_products)
+    for branch_id in range(1, num_branches + 1):
+        for start in range(0, num_days, days_per_chunk):
+            yield generate_block(rng, branch_id, dates[start:start + days_per_chunk], products)
+
+def write_csv(chunks, path: str) -> int:
+    rows = 0
+    with open(path, 'w', newline='') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=(i == 0), date_format='%Y-%m-%d')
+            rows += len(chunk)
+    return rows
+
+def write_parquet(chunks, path: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output requires pyarrow (pip install pyarrow).")
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            chunk['Product_Name'] = chunk['Product_Name'].astype(str)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic pharmacy KPI dataset.")
+    parser.add_argument("--branches", type=int, default=3, help="Number of branches")
+    parser.add_argument("--products", type=int, default=8, help="Number of products")
+    parser.add_argument("--days", type=int, default=365, help="Number of days")
+    parser.add_argument("--start-date", default="2025-08-25", help="First day (YYYY-MM-DD)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed; the same arguments give the same file")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000, help="Rows generated and written per chunk")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Output format (default: from the file extension)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Output file (default: all_in_one_kpi_dataset.csv in the current directory)")
+    args = parser.parse_args()
 
-np.random.seed(42)  # For reproducibility
-
-# Generate dates for 365 days starting from August 25, 2025
-start_date = datetime(2025, 8, 25)
-dates = [start_date + timedelta(days=i) for i in range(365)]
-
-# Product list (mix of Rx and OTC)
-products = ['Aspirin', 'Insulin (Rx)', 'Bandages', 'Antibiotic (Rx)', 'Vitamins', 'Painkiller (Rx)', 'Shampoo', 'Cough Syrup (Rx)']
-product_ids = range(1, 9)
-categories = ['OTC', 'Rx', 'OTC', 'Rx', 'OTC', 'Rx', 'OTC', 'Rx']
-
-# Number of branches
-num_branches = 3 # Let's start with 3 branches for simulation
-
-data = []
-for branch_id in range(1, num_branches + 1):
-    for date in dates:
-        for pid, pname, cat in zip(product_ids, products, categories):
-            # Introduce some variation based on branch_id
-            if branch_id == 1: # Urban branch - higher Rx volume
-                qty_sold = np.random.poisson(15) if cat == 'Rx' else np.random.poisson(10)
-                price = np.random.uniform(7, 60)
-            elif branch_id == 2: # Rural branch - higher OTC sales
-                qty_sold = np.random.poisson(8) if cat == 'Rx' else np.random.poisson(25)
-                price = np.random.uniform(4, 40)
-            else: # Average branch
-                qty_sold = np.random.poisson(10) if cat == 'Rx' else np.random.poisson(20)
-                price = np.random.uniform(5, 50)
-
-            sales_value = qty_sold * price
-            inventory_level = np.random.randint(0, 100)
-            exp_date = date + timedelta(days=np.random.randint(1, 365))
-            cash_received = sales_value + np.random.normal(0, 5)  # Small discrepancy
-            
-            data.append({
-                'Branch_ID': branch_id,
-                'Date': date,
-                'Product_ID': pid,
-                'Product_Name': pname,
-                'Category': cat,
-                'Quantity_Sold': qty_sold,
-                'Price': price,
-                'Sales_Value': round(sales_value, 2),
-                'Inventory_Level': inventory_level,
-                'Expiration_Date': exp_date,
-                'Cash_Received': round(cash_received, 2)
-            })
-
-df = pd.DataFrame(data)
-
-# Save to CSV
-df.to_csv('all_in_one_kpi_dataset.csv', index=False)
-
-# Preview
-print(df.head(10))
\ No newline at end of file
+    output_format = args.format or ("parquet" if args.output.endswith(".parquet") else "csv")
+    chunks = generate(args.branches, args.products, args.days, datetime.strptime(args.start_date, "%Y-%m-%d"),
+                      args.seed, args.chunk_rows)
+    started = time.perf_counter()
+    rows = write_parquet(chunks, args.output) if output_format == "parquet" else write_csv(chunks, args.output)
+    print(f"Wrote {rows} rows to {args.output} in {time.perf_counter() - started:.1f}s")
@@ -1,8 +1,49 @@
+from fastapi import HTTPException, Query
+from typing import List, Optional
+from datetime import date
 from database import db_client
 from config import settings
+from services.fieldsets import parse_fields
+from services.filters import DateRange
 
 async def get_db_collection():
     return db_client.db[settings.COLLECTION_NAME]
 
 async def get_db_client():
     return db_client.client
+
+def get_fields(
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to include in each item, e.g. 'product_id,total_sales_value'")
+) -> Optional[List[str]]:
+    return parse_fields(fields)
+
+def get_date_range(
+    start_date: Optional[date] = Query(None, description="Only include data on or after this date (YYYY-MM-DD)"),
+    end_date: Optional[date] = Query(None, description="Only include data on or before this date (YYYY-MM-DD)"),
+) -> DateRange:
+    if start_date is not None and end_date is not None and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    return DateRange(start_date, end_date)
+
+def get_branch_ids(
+    branch_ids: Optional[str] = Query(None, description="Comma-separated branch IDs, e.g. '1,2,5' (default: all branches)")
+) -> Optional[List[int]]:
+    values = parse_fields(branch_ids)
+    if not values:
+        return None
+    try:
+        return [int(value) for value in values]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="branch_ids must be comma-separated integers")
+
+WINDOW_UNITS = {"d": 1, "w": 7}
+
+def get_window(
+    window: Optional[str] = Query(None, description="Trailing window ending at the latest data (or end_date), e.g. '7d' or '4w'")
+) -> Optional[int]:
+    if window is None:
+        return None
+    value, unit = window[:-1], window[-1:].lower()
+    if unit not in WINDOW_UNITS or not value.isdigit() or int(value) < 1:
+        raise HTTPException(status_code=400, detail="window must be a number of days or weeks, e.g. '7d' or '4w'")
+    return int(value) * WINDOW_UNITS[unit]
@@ -1,6 +1,12 @@
+import asyncio
 from fastapi import FastAPI
 from database import db_client
 from config import settings
+from services.indexes import ensure_indexes
+from services.metrics import timing_middleware
+from services.serialization import FastJSONResponse
+from services.executor import shutdown_executor
+from services.materializer import materialize_forever
 from routers import (
     stock_outs,
     near_expiries,
@@ -11,21 +17,34 @@ from routers import (
     inventory_levels,
     branch_comparison,
     transfers, # New import
-    kpi
+    kpi,
+    diagnostics,
+    metrics
 )
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
+    default_response_class=FastJSONResponse,
 )
 
+app.middleware("http")(timing_middleware)
+
 @app.on_event("startup")
 async def startup_db_client():
     await db_client.connect()
+    await ensure_indexes(db_client.db)
+    if settings.MATERIALIZE_INTERVAL_SECONDS > 0:
+        app.state.materializer = asyncio.create_task(
+            materialize_forever(db_client.db, settings.MATERIALIZE_INTERVAL_SECONDS))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    materializer = getattr(app.state, "materializer", None)
+    if materializer is not None:
+        materializer.cancel()
     await db_client.close()
+    shutdown_executor()
 
 app.include_router(stock_outs.router)
 app.include_router(near_expiries.router)
@@ -37,6 +56,8 @@ app.include_router(inventory_levels.router)
 app.include_router(branch_comparison.router)
 app.include_router(transfers.router) # New include
 app.include_router(kpi.router)
+app.include_router(diagnostics.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
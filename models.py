@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 from bson import ObjectId
 from pydantic_core import core_schema
 
@@ -61,6 +61,18 @@ class DailyKPI(BaseModel):
 class DailyKPIInDB(DailyKPI):
     id: PyObjectId = Field(alias="_id")
 
+class Alert(BaseModel):
+    rule: str
+    severity: str
+    branch_id: int
+    date: datetime
+    value: float
+    threshold: float
+    description: str
+
+class AlertInDB(Alert):
+    id: PyObjectId = Field(alias="_id")
+
 class NearExpiry(BaseModel):
     date: datetime
     product_id: str
@@ -68,3 +80,8 @@ class NearExpiry(BaseModel):
     expiration_date: datetime
     days_to_expiry: int
     description: str
+
+class NearExpiryBreakdown(BaseModel):
+    items: List[NearExpiry]
+    by_branch: Dict[str, int]
+    by_category: Dict[str, int]
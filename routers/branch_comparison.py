@@ -1,12 +1,12 @@
 from fastapi import APIRouter, Depends
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
-from dependencies import get_db_collection
-from services.calculations import (
-    calculate_sales_by_branch,
-    calculate_inventory_turns_by_branch,
-    calculate_service_level_by_branch,
-)
+from dependencies import get_db_collection, get_date_range, get_branch_ids
+from services.filters import DateRange, kpi_query
+from services.cache import cached_result
+from services.metrics import phase
+from services.aggregations import aggregate_branch_totals, branch_metrics_from_totals
+from services.fanout import fan_out_by_branch
 
 router = APIRouter(
     prefix="/branches",
@@ -17,20 +17,20 @@ router = APIRouter(
 @router.get("/compare", response_model=Dict[str, Any])
 async def compare_branches(
     collection: AsyncIOMotorClient = Depends(get_db_collection),
+    date_range: DateRange = Depends(get_date_range),
+    branch_ids: Optional[List[int]] = Depends(get_branch_ids),
 ):
     """
-    Compares key performance indicators (KPIs) across all branches.
+    Compares key performance indicators (KPIs) across branches (all of them by default), optionally within a date window.
     """
-    data = await collection.find({}).to_list(length=None)
-
-    sales_by_branch = calculate_sales_by_branch(data)
-    inventory_turns_by_branch = calculate_inventory_turns_by_branch(data)
-    service_level_by_branch = calculate_service_level_by_branch(data)
+    query = kpi_query(date_range=date_range)
 
-    comparison_data = {
-        "sales_by_branch": sales_by_branch,
-        "inventory_turns_by_branch": inventory_turns_by_branch,
-        "service_level_by_branch": service_level_by_branch,
-    }
+    async def compute():
+        # One aggregation per branch, run concurrently; each only reads its own branch's index range.
+        with phase("db_fetch"):
+            totals = await fan_out_by_branch(collection, query, aggregate_branch_totals, branch_ids)
+        with phase("compute"):
+            return branch_metrics_from_totals(totals)
 
-    return comparison_data
+    params = {**date_range.params(), "branch_ids": branch_ids}
+    return await cached_result(collection, "branch_comparison", params, compute)
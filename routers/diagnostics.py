@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from typing import Dict, Any
+from services.cache import result_cache
+from services.indexes import check_indexes
+from database import get_database
+
+router = APIRouter(
+    prefix="/diagnostics",
+    tags=["Diagnostics"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("/cache", response_model=Dict[str, Any])
+async def get_cache_stats():
+    """
+    Reports result cache size and hit/miss/eviction counters for monitoring.
+    """
+    return result_cache.stats()
+
+@router.get("/indexes", response_model=Dict[str, Any])
+async def get_index_report():
+    """
+    Reports missing registered indexes and runs explain() on each router's
+    query shape, flagging any plan that falls back to a collection scan.
+    """
+    db = await get_database()
+    return await check_indexes(db)
@@ -1,9 +1,17 @@
 from fastapi import APIRouter, Depends, Query
 from typing import List, Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
-from dependencies import get_db_collection
-from services.calculations import calculate_inventory_levels
+from dependencies import get_db_collection, get_fields, get_date_range
+from services.filters import DateRange, kpi_query
+from services.cache import cached_result
+from services.metrics import phase, record_docs
+from services.serialization import FastJSONResponse
+from services.executor import offload
+from services.calculations import calculate_inventory_levels, projection_for
+from services.catalog import get_catalog, CATALOG_FIELDS
+from services.fieldsets import wants_field, select_fields_many
 from datetime import datetime # Import datetime
+import asyncio
 
 router = APIRouter(
     prefix="/inventory-levels",
@@ -11,28 +19,46 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _describe(item: Dict[str, Any], branch_id: Optional[int]) -> Dict[str, Any]:
+    item["description"] = (
+        f"Product {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
+        f"Initial Inventory: {item.get('initial_inventory', 0)}, "
+        f"Total Sold: {item.get('quantity_sold_total', 0)}, "
+        f"Current Inventory: {item.get('current_inventory', 0)}."
+    )
+    if branch_id is not None:
+        item["description"] += f" (Branch ID: {branch_id})"
+    return item
+
 @router.get("/", response_model=List[Dict[str, Any]])
 async def get_inventory_levels(
     collection: AsyncIOMotorClient = Depends(get_db_collection),
-    branch_id: Optional[int] = Query(None, description="Filter by Branch ID")
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    date_range: DateRange = Depends(get_date_range),
+    fields: Optional[List[str]] = Depends(get_fields),
 ):
     """
-    Retrieves current inventory levels for all products, optionally filtered by branch.
+    Retrieves current inventory levels for all products, optionally filtered by branch and date range.
     """
-    query = {}
-    if branch_id is not None:
-        query["branch_id"] = branch_id
+    query = kpi_query(branch_id, date_range)
+
+    async def compute():
+        projection = projection_for(calculate_inventory_levels, exclude=CATALOG_FIELDS)
+        with phase("db_fetch"):
+            data, catalog = await asyncio.gather(
+                collection.find(query, projection).to_list(length=None),
+                get_catalog(collection.database),
+            )
+        record_docs(len(data))
 
-    data = await collection.find(query).to_list(length=None)
+        with phase("compute"):
+            results = await offload(calculate_inventory_levels, data)
+            catalog.attach_product_names(results)
+            if wants_field(fields, "description"):
+                for item in results:
+                    _describe(item, branch_id)
+            return select_fields_many(results, fields)
 
-    results = calculate_inventory_levels(data)
-    for item in results:
-        item["description"] = (
-            f"Product {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
-            f"Initial Inventory: {item.get('initial_inventory', 0)}, "
-            f"Total Sold: {item.get('quantity_sold_total', 0)}, "
-            f"Current Inventory: {item.get('current_inventory', 0)}."
-        )
-        if branch_id is not None:
-            item["description"] += f" (Branch ID: {branch_id})"
-    return results
+    params = {"branch_id": branch_id, **date_range.params(), "fields": fields}
+    # Computed from our own rows, so the response is encoded without response_model validation.
+    return FastJSONResponse(await cached_result(collection, "inventory_levels", params, compute))
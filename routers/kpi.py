@@ -1,10 +1,18 @@
 '''
 This router handles the API endpoints for KPIs.
 '''
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException
 from services.kpi_service import kpi_service, KPIService
-from models import DailyKPIInDB
-from typing import List, Optional
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.filters import DateRange
+from services.fieldsets import parse_fields
+from services.rollup import GRAINS, CUBE_DIMENSIONS
+from services.serialization import FastJSONResponse
+from services.trends import DEFAULT_WINDOW, MAX_WINDOW
+from services.alerts import RULES, SEVERITIES
+from dependencies import get_date_range
+from models import AlertInDB, DailyKPIInDB
+from typing import List, Optional, Dict, Any
 from datetime import date
 
 router = APIRouter(
@@ -12,27 +20,123 @@ router = APIRouter(
     tags=["kpis"],
 )
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def page_limit(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Maximum number of items per page")):
+    return limit
+
+def page_cursor(cursor: Optional[str] = Query(None, description=f"Value of the {NEXT_CURSOR_HEADER} header from the previous page")):
+    return cursor
+
+async def _paged(fetch):
+    """
+    Awaits a (items, next_cursor) page and exposes the cursor as a response header.
+    The header is omitted on the last page. The items are trusted daily_kpis or alerts rows,
+    so they are encoded directly instead of being validated against the response_model.
+    """
+    try:
+        items, next_cursor = await fetch
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return FastJSONResponse(items, headers=headers)
+
 @router.get("/daily", response_model=List[DailyKPIInDB])
 async def get_daily_kpis(
     service: KPIService = Depends(lambda: kpi_service),
     start_date: Optional[date] = Query(None, description="Start date for KPI data (YYYY-MM-DD)"),
     end_date: Optional[date] = Query(None, description="End date for KPI data (YYYY-MM-DD)"),
     branch_id: Optional[int] = Query(None, description="Branch ID for KPI data"),
+    limit: int = Depends(page_limit),
+    cursor: Optional[str] = Depends(page_cursor),
+):
+    return await _paged(service.get_daily_kpis(
+        branch_id=branch_id, start_date=start_date, end_date=end_date, limit=limit, cursor=cursor))
+
+@router.get("/summary", response_model=Dict[str, Any])
+async def get_kpi_summary(
+    service: KPIService = Depends(lambda: kpi_service),
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    date_range: DateRange = Depends(get_date_range),
+    top_n: int = Query(5, description="Number of top sellers to include"),
+):
+    return await service.get_kpi_summary(branch_id=branch_id, top_n=top_n, **date_range.params())
+
+@router.get("/rollup", response_model=List[Dict[str, Any]])
+async def get_kpi_rollup(
+    service: KPIService = Depends(lambda: kpi_service),
+    grain: str = Query("day", description=f"Time grain: {', '.join(GRAINS)}"),
+    by: Optional[str] = Query(None, description=f"Comma-separated dimensions to group by: {', '.join(CUBE_DIMENSIONS)}"),
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    category: Optional[str] = Query(None, description="Filter by Category"),
+    product_id: Optional[int] = Query(None, description="Filter by Product ID"),
+    date_range: DateRange = Depends(get_date_range),
 ):
-    return await service.get_daily_kpis(branch_id=branch_id, start_date=start_date, end_date=end_date)
+    """
+    Sales, cash, stock-out and inventory measures from the rollup cube, e.g.
+    sales by category per week for one branch: ?grain=week&by=Category&branch_id=2
+    """
+    if grain not in GRAINS:
+        raise HTTPException(status_code=400, detail=f"grain must be one of: {', '.join(GRAINS)}")
+    dimensions = parse_fields(by) or []
+    unknown = [dimension for dimension in dimensions if dimension not in CUBE_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dimensions: {', '.join(unknown)}")
+    return FastJSONResponse(await service.get_rollup(grain, dimensions, branch_id, category, product_id, **date_range.params()))
 
-@router.get("/trends", response_model=List[DailyKPIInDB])
-async def get_kpi_trends(service: KPIService = Depends(lambda: kpi_service)):
-    return await service.get_kpi_trends()
+def trend_window(window: int = Query(DEFAULT_WINDOW, ge=1, le=MAX_WINDOW, description="Rolling window in days")):
+    return window
 
-@router.get("/trends/{branch_id}", response_model=List[DailyKPIInDB])
-async def get_kpi_trends_by_branch(branch_id: int, service: KPIService = Depends(lambda: kpi_service)):
-    return await service.get_kpi_trends(branch_id)
+@router.get("/trends", response_model=List[Dict[str, Any]])
+async def get_kpi_trends(
+    service: KPIService = Depends(lambda: kpi_service),
+    window: int = Depends(trend_window),
+    date_range: DateRange = Depends(get_date_range),
+):
+    """
+    Daily trends of sales value, Rx volume, stock-outs and cash discrepancy, summed over all branches.
+    """
+    return FastJSONResponse(await service.get_kpi_trends(window=window, **date_range.params()))
+
+@router.get("/trends/{branch_id}", response_model=List[Dict[str, Any]])
+async def get_kpi_trends_by_branch(
+    branch_id: int,
+    service: KPIService = Depends(lambda: kpi_service),
+    window: int = Depends(trend_window),
+    date_range: DateRange = Depends(get_date_range),
+):
+    """
+    Daily trends of sales value, Rx volume, stock-outs and cash discrepancy for one branch.
+    """
+    return FastJSONResponse(await service.get_kpi_trends(branch_id, window=window, **date_range.params()))
 
-@router.get("/alerts", response_model=List[DailyKPIInDB])
-async def get_kpi_alerts(service: KPIService = Depends(lambda: kpi_service)):
-    return await service.get_kpi_alerts()
+def alert_filters(
+    severity: Optional[str] = Query(None, description=f"Only alerts of this severity: {', '.join(SEVERITIES)}"),
+    rule: Optional[str] = Query(None, description=f"Only alerts of this rule: {', '.join(RULES)}"),
+) -> Dict[str, Optional[str]]:
+    if severity is not None and severity not in SEVERITIES:
+        raise HTTPException(status_code=400, detail=f"severity must be one of: {', '.join(SEVERITIES)}")
+    if rule is not None and rule not in RULES:
+        raise HTTPException(status_code=400, detail=f"rule must be one of: {', '.join(RULES)}")
+    return {"severity": severity, "rule": rule}
 
-@router.get("/alerts/{branch_id}", response_model=List[DailyKPIInDB])
-async def get_kpi_alerts_by_branch(branch_id: int, service: KPIService = Depends(lambda: kpi_service)):
-    return await service.get_kpi_alerts(branch_id)
+@router.get("/alerts", response_model=List[AlertInDB])
+async def get_kpi_alerts(
+    service: KPIService = Depends(lambda: kpi_service),
+    filters: Dict[str, Optional[str]] = Depends(alert_filters),
+    date_range: DateRange = Depends(get_date_range),
+    limit: int = Depends(page_limit),
+    cursor: Optional[str] = Depends(page_cursor),
+):
+    return await _paged(service.get_kpi_alerts(**filters, **date_range.params(), limit=limit, cursor=cursor))
+
+@router.get("/alerts/{branch_id}", response_model=List[AlertInDB])
+async def get_kpi_alerts_by_branch(
+    branch_id: int,
+    service: KPIService = Depends(lambda: kpi_service),
+    filters: Dict[str, Optional[str]] = Depends(alert_filters),
+    date_range: DateRange = Depends(get_date_range),
+    limit: int = Depends(page_limit),
+    cursor: Optional[str] = Depends(page_cursor),
+):
+    return await _paged(service.get_kpi_alerts(branch_id, **filters, **date_range.params(), limit=limit, cursor=cursor))
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.metrics import render_metrics
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.get("", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Exposes per-route latency, phase timing, document and response size histograms in Prometheus text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
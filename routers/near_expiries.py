@@ -1,10 +1,19 @@
-from fastapi import APIRouter, Depends, Query
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, Depends, Query, Request
+from typing import List, Dict, Any, Optional, Union
 from motor.motor_asyncio import AsyncIOMotorClient
-from dependencies import get_db_collection
-from services.calculations import calculate_near_expiries
-from datetime import datetime # Import datetime
-from models import NearExpiry
+from dependencies import get_db_collection, get_fields
+from services.filters import kpi_query
+from services.cache import cached_result
+from services.metrics import phase, record_docs
+from services.serialization import FastJSONResponse
+from services.aggregations import aggregate_near_expiries, near_expiry_window
+from services.calculations import near_expiry_event, projection_for
+from services.catalog import get_catalog, CATALOG_FIELDS
+from services.fieldsets import wants_field, select_fields, select_fields_many
+from services.streaming import wants_ndjson, ndjson_response, STREAM_BATCH_SIZE
+from datetime import datetime, date
+from models import NearExpiry, NearExpiryBreakdown
+import asyncio
 
 router = APIRouter(
     prefix="/near-expiries",
@@ -12,36 +21,79 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/", response_model=List[NearExpiry])
+def _describe(item: Dict[str, Any], branch_id: Optional[int]) -> Dict[str, Any]:
+    exp_date = item.get('expiration_date') or datetime.min
+
+    item["description"] = (
+        f"Product {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
+        f"expires on {exp_date.strftime('%Y-%m-%d')} "
+        f"(Days to expiry: {item.get('days_to_expiry', 'N/A')})."
+    )
+    if branch_id is not None:
+        item["description"] += f" (Branch ID: {branch_id})"
+    return item
+
+async def _stream_near_expiries(collection, query: Dict[str, Any], days_threshold: int, limit: Optional[int],
+                                branch_id: Optional[int], fields: Optional[List[str]]):
+    today = datetime.today()
+    describe = wants_field(fields, "description")
+    catalog = await get_catalog(collection.database)
+    projection = projection_for(near_expiry_event, exclude=CATALOG_FIELDS)
+    query = {**query, "Expiration_Date": near_expiry_window(today, days_threshold)}
+    cursor = collection.find(query, projection, batch_size=STREAM_BATCH_SIZE).sort("Expiration_Date", 1)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    async for record in cursor:
+        record_docs(1)
+        event = near_expiry_event(record, days_threshold, today)
+        if event is not None:
+            catalog.attach_product_names([event])
+            if describe:
+                _describe(event, branch_id)
+            yield select_fields(event, fields)
+
+@router.get("/", response_model=Union[List[NearExpiry], NearExpiryBreakdown])
 async def get_near_expiries(
+    request: Request,
     days_threshold: int = 30,
     collection: AsyncIOMotorClient = Depends(get_db_collection),
-    branch_id: Optional[int] = Query(None, description="Filter by Branch ID")
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    limit: Optional[int] = Query(None, ge=1, description="Return only the items expiring soonest"),
+    breakdown: bool = Query(False, description="Wrap items in an object with per-branch and per-category counts"),
+    stream: bool = Query(False, description="Stream events as NDJSON (same as 'Accept: application/x-ndjson')"),
+    fields: Optional[List[str]] = Depends(get_fields),
 ):
     """
-    Retrieves products that are near their expiration date, optionally filtered by branch.
+    Retrieves products that are near their expiration date, soonest first, optionally filtered by branch.
     """
-    query = {}
-    if branch_id is not None:
-        query["branch_id"] = branch_id
-
-    data = await collection.find(query).to_list(length=None)
-
-    results = calculate_near_expiries(data, days_threshold)
-    for item in results:
-        exp_date_val = item.get('expiration_date')
-        if isinstance(exp_date_val, str):
-            exp_date = datetime.fromisoformat(exp_date_val.split('T')[0])
-        elif isinstance(exp_date_val, datetime):
-            exp_date = exp_date_val
-        else:
-            exp_date = datetime.min
-
-        item["description"] = (
-            f"Product {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
-            f"expires on {exp_date.strftime('%Y-%m-%d')} "
-            f"(Days to expiry: {item.get('days_to_expiry', 'N/A')})."
-        )
-        if branch_id is not None:
-            item["description"] += f" (Branch ID: {branch_id})"
+    query = kpi_query(branch_id)
+
+    if wants_ndjson(request, stream):
+        return ndjson_response(_stream_near_expiries(collection, query, days_threshold, limit, branch_id, fields))
+
+    async def compute():
+        # The expiry window, sort and limit all run inside MongoDB on the Expiration_Date index.
+        with phase("db_fetch"):
+            result, catalog = await asyncio.gather(
+                aggregate_near_expiries(collection, query, datetime.today(), days_threshold, limit, breakdown),
+                get_catalog(collection.database),
+            )
+        with phase("compute"):
+            catalog.attach_product_names(result["items"])
+            if wants_field(fields, "description"):
+                for item in result["items"]:
+                    _describe(item, branch_id)
+            result["items"] = select_fields_many(result["items"], fields)
+            return result
+
+    # Days to expiry are relative to today, so results are only reused within the same day.
+    params = {"branch_id": branch_id, "days_threshold": days_threshold, "limit": limit, "breakdown": breakdown,
+              "today": date.today(), "fields": fields}
+    result = await cached_result(collection, "near_expiries", params, compute)
+    if breakdown:
+        return FastJSONResponse(result)
+    results = result["items"]
+    if fields is not None:
+        # Trimmed items no longer satisfy the NearExpiry schema, so skip response_model validation.
+        return FastJSONResponse(results)
     return results
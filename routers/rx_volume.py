@@ -1,8 +1,12 @@
 from fastapi import APIRouter, Depends, Query
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 from motor.motor_asyncio import AsyncIOMotorClient
-from dependencies import get_db_collection
-from services.calculations import calculate_rx_volume
+from dependencies import get_db_collection, get_fields, get_date_range
+from services.filters import DateRange, kpi_query
+from services.cache import cached_result
+from services.metrics import phase
+from services.aggregations import aggregate_rx_volume
+from services.fieldsets import select_fields
 from datetime import datetime # Import datetime
 
 router = APIRouter(
@@ -14,19 +18,23 @@ router = APIRouter(
 @router.get("/", response_model=Dict[str, Any])
 async def get_rx_volume(
     collection: AsyncIOMotorClient = Depends(get_db_collection),
-    branch_id: Optional[int] = Query(None, description="Filter by Branch ID")
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    date_range: DateRange = Depends(get_date_range),
+    fields: Optional[List[str]] = Depends(get_fields),
 ):
     """
-    Retrieves the total prescription (Rx) volume, optionally filtered by branch.
+    Retrieves the total prescription (Rx) volume, optionally filtered by branch and date range.
     """
-    query = {}
-    if branch_id is not None:
-        query["branch_id"] = branch_id
+    query = kpi_query(branch_id, date_range)
 
-    data = await collection.find(query).to_list(length=None)
+    async def compute():
+        with phase("db_fetch"):
+            result = await aggregate_rx_volume(collection, query)
+        with phase("compute"):
+            result["description"] = f"Total Rx volume: {result.get('total_rx_volume', 0):.2f}."
+            if branch_id is not None:
+                result["description"] += f" (Branch ID: {branch_id})"
+            return result
 
-    result = calculate_rx_volume(data)
-    result["description"] = f"Total Rx volume: {result.get('total_rx_volume', 0):.2f}."
-    if branch_id is not None:
-        result["description"] += f" (Branch ID: {branch_id})"
-    return result
+    result = await cached_result(collection, "rx_volume", {"branch_id": branch_id, **date_range.params()}, compute)
+    return select_fields(result, fields)
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from typing import List, Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
-from dependencies import get_db_collection
-from services.calculations import calculate_stock_outs
+from dependencies import get_db_collection, get_fields, get_date_range
+from services.filters import DateRange, kpi_query
+from services.cache import cached_result
+from services.metrics import phase, record_docs
+from services.serialization import FastJSONResponse
+from services.executor import offload
+from services.calculations import calculate_stock_outs, stock_out_event, projection_for
+from services.catalog import get_catalog, CATALOG_FIELDS
+from services.fieldsets import wants_field, select_fields, select_fields_many
+from services.streaming import wants_ndjson, ndjson_response, STREAM_BATCH_SIZE
 from datetime import datetime # Import datetime
+import asyncio
 
 router = APIRouter(
     prefix="/stock-outs",
@@ -11,33 +20,62 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _describe(item: Dict[str, Any], branch_id: Optional[int]) -> Dict[str, Any]:
+    item["description"] = (
+        f"Stock-out for {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
+        f"on {item.get('date', datetime.min).strftime('%Y-%m-%d')}. "
+        f"Quantity sold during stock-out: {item.get('quantity_sold_during_stock_out', 0)}."
+    )
+    if branch_id is not None:
+        item["description"] += f" (Branch ID: {branch_id})"
+    return item
+
+async def _stream_stock_outs(collection, query: Dict[str, Any], branch_id: Optional[int], fields: Optional[List[str]]):
+    describe = wants_field(fields, "description")
+    catalog = await get_catalog(collection.database)
+    projection = projection_for(stock_out_event, exclude=CATALOG_FIELDS)
+    async for record in collection.find(query, projection, batch_size=STREAM_BATCH_SIZE):
+        record_docs(1)
+        event = stock_out_event(record)
+        if event is not None:
+            catalog.attach_product_names([event])
+            if describe:
+                _describe(event, branch_id)
+            yield select_fields(event, fields)
+
 @router.get("/", response_model=List[Dict[str, Any]])
 async def get_stock_outs(
+    request: Request,
     collection: AsyncIOMotorClient = Depends(get_db_collection),
-    branch_id: Optional[int] = Query(None, description="Filter by Branch ID")
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    date_range: DateRange = Depends(get_date_range),
+    stream: bool = Query(False, description="Stream events as NDJSON (same as 'Accept: application/x-ndjson')"),
+    fields: Optional[List[str]] = Depends(get_fields),
 ):
     """
-    Retrieves records of stock-out events, optionally filtered by branch.
+    Retrieves records of stock-out events, optionally filtered by branch and date range.
     """
-    query = {}
-    if branch_id is not None:
-        query["branch_id"] = branch_id
+    query = kpi_query(branch_id, date_range)
+
+    if wants_ndjson(request, stream):
+        return ndjson_response(_stream_stock_outs(collection, query, branch_id, fields))
 
-    data = await collection.find(query).to_list(length=None)
-    # Convert date strings back to datetime objects if necessary for calculations
-    for item in data:
-        if isinstance(item.get('Date'), str):
-            item['Date'] = datetime.fromisoformat(item['Date'].split('T')[0])
-        if isinstance(item.get('Expiration_Date'), str):
-            item['Expiration_Date'] = datetime.fromisoformat(item['Expiration_Date'].split('T')[0])
+    async def compute():
+        projection = projection_for(calculate_stock_outs, exclude=CATALOG_FIELDS)
+        with phase("db_fetch"):
+            data, catalog = await asyncio.gather(
+                collection.find(query, projection).to_list(length=None),
+                get_catalog(collection.database),
+            )
+        record_docs(len(data))
+        with phase("compute"):
+            results = await offload(calculate_stock_outs, data)
+            catalog.attach_product_names(results)
+            if wants_field(fields, "description"):
+                for item in results:
+                    _describe(item, branch_id)
+            return select_fields_many(results, fields)
 
-    results = calculate_stock_outs(data)
-    for item in results:
-        item["description"] = (
-            f"Stock-out for {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
-            f"on {item.get('date', datetime.min).strftime('%Y-%m-%d')}. "
-            f"Quantity sold during stock-out: {item.get('quantity_sold_during_stock_out', 0)}."
-        )
-        if branch_id is not None:
-            item["description"] += f" (Branch ID: {branch_id})"
-    return results
+    params = {"branch_id": branch_id, **date_range.params(), "fields": fields}
+    # Computed from our own rows, so the response is encoded without response_model validation.
+    return FastJSONResponse(await cached_result(collection, "stock_outs", params, compute))
@@ -1,9 +1,19 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Dict, Any, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
-from dependencies import get_db_collection
-from services.calculations import calculate_top_sellers
-from datetime import datetime # Import datetime
+from config import settings
+from dependencies import get_db_collection, get_fields, get_date_range, get_window
+from services.filters import DateRange, kpi_query
+from services.cache import cached_result
+from services.metrics import phase, record_docs
+from services.serialization import FastJSONResponse
+from services.executor import offload
+from services.calculations import calculate_top_sellers, projection_for
+from services.catalog import get_catalog, CATALOG_FIELDS
+from services.fieldsets import wants_field, select_fields_many
+from services.heavy_hitters import SKETCHES_COLLECTION, latest_day, summaries_cover, window_summary
+from datetime import date, datetime, timedelta
+import asyncio
 
 router = APIRouter(
     prefix="/top-sellers",
@@ -11,27 +21,86 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+def _describe(item: Dict[str, Any], branch_id: Optional[int]) -> Dict[str, Any]:
+    item["description"] = (
+        f"Product {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
+        f"had a total sales value of {item.get('total_sales_value', 0):.2f}."
+    )
+    if branch_id is not None:
+        item["description"] += f" (Branch ID: {branch_id})"
+    return item
+
 @router.get("/", response_model=List[Dict[str, Any]])
 async def get_top_sellers(
     top_n: int = 5,
     collection: AsyncIOMotorClient = Depends(get_db_collection),
-    branch_id: Optional[int] = Query(None, description="Filter by Branch ID")
+    branch_id: Optional[int] = Query(None, description="Filter by Branch ID"),
+    date_range: DateRange = Depends(get_date_range),
+    window_days: Optional[int] = Depends(get_window),
+    exact: bool = Query(False, description="Sum the raw rows instead of merging the per-day top-seller summaries"),
+    fields: Optional[List[str]] = Depends(get_fields),
 ):
     """
-    Retrieves the top selling products by sales value, optionally filtered by branch.
+    Retrieves the top selling products by sales value, optionally filtered by branch and date range.
+
+    By default the answer is merged from the per-(branch, day) summaries in services/heavy_hitters.py;
+    each item's 'max_error' bounds how far its sales value may over-estimate the true one (0 when summed exactly). 'exact=true',
+    a top_n larger than the summaries or a window the summaries do not fully cover sums the raw rows instead.
     """
-    query = {}
-    if branch_id is not None:
-        query["branch_id"] = branch_id
-
-    data = await collection.find(query).to_list(length=None)
-
-    results = calculate_top_sellers(data, top_n)
-    for item in results:
-        item["description"] = (
-            f"Product {item.get('product_name', 'N/A')} (ID: {item.get('product_id', 'N/A')}) "
-            f"had a total sales value of {item.get('total_sales_value', 0):.2f}."
-        )
-        if branch_id is not None:
-            item["description"] += f" (Branch ID: {branch_id})"
-    return results
+    if window_days is not None:
+        if date_range.start_date is not None:
+            raise HTTPException(status_code=400, detail="Use either window or start_date, not both")
+        end_date = date_range.end_date
+        if end_date is None:
+            latest = await latest_day(collection, "Date", branch_id)
+            end_date = latest.date() if latest else date.today()
+        date_range = DateRange(end_date - timedelta(days=window_days - 1), end_date)
+    query = kpi_query(branch_id, date_range)
+    db = collection.database
+
+    def present(results: List[Dict[str, Any]], catalog) -> List[Dict[str, Any]]:
+        catalog.attach_product_names(results)
+        if wants_field(fields, "description"):
+            for item in results:
+                _describe(item, branch_id)
+        return select_fields_many(results, fields)
+
+    async def compute():
+        projection = projection_for(calculate_top_sellers, exclude=CATALOG_FIELDS)
+        with phase("db_fetch"):
+            data, catalog = await asyncio.gather(
+                collection.find(query, projection).to_list(length=None),
+                get_catalog(db),
+            )
+        record_docs(len(data))
+
+        with phase("compute"):
+            results = await offload(calculate_top_sellers, data, top_n)
+            # Exact sums, so both paths return the same item shape.
+            for item in results:
+                item["max_error"] = 0.0
+            return present(results, catalog)
+
+    async def compute_from_summaries():
+        sketch_query = kpi_query(branch_id, date_range, date_field="day")
+        with phase("db_fetch"):
+            # Partial coverage would silently drop the sales of days without a summary.
+            if not await summaries_cover(db, branch_id, date_range):
+                return None
+            summary, catalog = await asyncio.gather(
+                window_summary(db[SKETCHES_COLLECTION], sketch_query, settings.TOP_SELLER_SKETCH_SIZE),
+                get_catalog(db),
+            )
+        if summary is None:
+            return None
+        with phase("compute"):
+            # Keys in the same order as calculate_top_sellers; present() fills the name.
+            return present([{"product_id": item["product_id"], "product_name": None, **item} for item in summary.top(top_n)], catalog)
+
+    params = {"branch_id": branch_id, **date_range.params(), "top_n": top_n, "fields": fields}
+    # Computed from our own rows, so the response is encoded without response_model validation.
+    if not exact and top_n <= settings.TOP_SELLER_SKETCH_SIZE:
+        results = await cached_result(db[SKETCHES_COLLECTION], "top_sellers_summary", params, compute_from_summaries)
+        if results is not None:
+            return FastJSONResponse(results)
+    return FastJSONResponse(await cached_result(collection, "top_sellers", params, compute))
@@ -3,8 +3,11 @@ from typing import Dict, Any, List
 from motor.motor_asyncio import AsyncIOMotorClient
 from dependencies import get_db_client # Use get_db_client to get the client and then access a different collection
 from pydantic import BaseModel
+from services.cache import cached_result, bump_data_version
+from services.metrics import phase, record_docs
+from services.executor import offload
 from datetime import datetime
-from services.calculations import calculate_transfer_volume_by_branch, calculate_transfer_value_by_branch
+from services.calculations import calculate_transfer_volume_by_branch, calculate_transfer_value_by_branch, projection_for
 
 router = APIRouter(
     prefix="/transfers",
@@ -31,6 +34,7 @@ async def log_transfer(
     transfers_collection = db_client["pharmacy_kpi_db"]["transfers"] # Assuming 'pharmacy_kpi_db' is the DB name
     transfer_dict = transfer.dict()
     result = await transfers_collection.insert_one(transfer_dict)
+    await bump_data_version(transfers_collection.database, transfers_collection.name)
     return {"message": "Transfer logged successfully", "id": str(result.inserted_id)}
 
 @router.get("/", response_model=List[Dict[str, Any]])
@@ -41,10 +45,17 @@ async def get_all_transfers(
     Retrieves all logged inter-branch transfers.
     """
     transfers_collection = db_client["pharmacy_kpi_db"]["transfers"]
-    transfers = await transfers_collection.find().to_list(length=None)
-    for transfer in transfers:
-        transfer["_id"] = str(transfer["_id"]) # Convert ObjectId to string
-    return transfers
+
+    async def compute():
+        with phase("db_fetch"):
+            transfers = await transfers_collection.find().to_list(length=None)
+        record_docs(len(transfers))
+        with phase("decode"):
+            for transfer in transfers:
+                transfer["_id"] = str(transfer["_id"]) # Convert ObjectId to string
+        return transfers
+
+    return await cached_result(transfers_collection, "transfers", {}, compute)
 
 @router.get("/summary", response_model=Dict[str, Any])
 async def get_transfers_summary(
@@ -54,12 +65,20 @@ async def get_transfers_summary(
     Retrieves a summary of inter-branch transfers, including volume and value by branch.
     """
     transfers_collection = db_client["pharmacy_kpi_db"]["transfers"]
-    transfers_data = await transfers_collection.find().to_list(length=None)
 
-    transfer_volume = calculate_transfer_volume_by_branch(transfers_data)
-    transfer_value = calculate_transfer_value_by_branch(transfers_data)
+    async def compute():
+        projection = projection_for(calculate_transfer_volume_by_branch, calculate_transfer_value_by_branch)
+        with phase("db_fetch"):
+            transfers_data = await transfers_collection.find({}, projection).to_list(length=None)
+        record_docs(len(transfers_data))
+
+        with phase("compute"):
+            transfer_volume = await offload(calculate_transfer_volume_by_branch, transfers_data)
+            transfer_value = await offload(calculate_transfer_value_by_branch, transfers_data)
+
+        return {
+            "transfer_volume_by_branch": transfer_volume,
+            "transfer_value_by_branch": transfer_value,
+        }
 
-    return {
-        "transfer_volume_by_branch": transfer_volume,
-        "transfer_value_by_branch": transfer_value,
-    }
+    return await cached_result(transfers_collection, "transfers_summary", {}, compute)
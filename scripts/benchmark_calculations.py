@@ -0,0 +1,100 @@
+'''
+This script benchmarks the columnar NumPy engine against the per-dict loops in services/calculations.py.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from services.columnar import ColumnarKPIData
+from services.calculations import (
+    calculate_stock_outs,
+    calculate_top_sellers,
+    calculate_rx_volume,
+    calculate_cash_reconciliation,
+    calculate_inventory_levels,
+    calculate_sales_by_branch,
+    calculate_inventory_turns_by_branch,
+    calculate_service_level_by_branch,
+)
+
+PRODUCTS = ['Aspirin', 'Insulin (Rx)', 'Bandages', 'Antibiotic (Rx)', 'Vitamins', 'Painkiller (Rx)', 'Shampoo', 'Cough Syrup (Rx)']
+CATEGORIES = ['OTC', 'Rx', 'OTC', 'Rx', 'OTC', 'Rx', 'OTC', 'Rx']
+
+def generate_records(num_rows: int, seed: int = 42):
+    '''
+    Generates kpi_data-shaped documents, as they come back from MongoDB.
+    '''
+    rng = np.random.default_rng(seed)
+    product_idx = rng.integers(0, len(PRODUCTS), num_rows)
+    days = rng.integers(0, 365, num_rows)
+    branch_ids = rng.integers(1, 4, num_rows)
+    quantities = rng.poisson(15, num_rows)
+    prices = rng.uniform(4, 60, num_rows)
+    inventory = rng.integers(0, 100, num_rows)
+    cash = quantities * prices + rng.normal(0, 5, num_rows)
+    start = datetime(2025, 8, 25)
+    return [
+        {
+            'Date': start + timedelta(days=int(days[i])),
+            'Product_ID': int(product_idx[i]) + 1,
+            'Product_Name': PRODUCTS[product_idx[i]],
+            'Category': CATEGORIES[product_idx[i]],
+            'Quantity_Sold': int(quantities[i]),
+            'Price': float(prices[i]),
+            'Inventory_Level': int(inventory[i]),
+            'Cash_Received': float(cash[i]),
+            'branch_id': int(branch_ids[i]),
+        }
+        for i in range(num_rows)
+    ]
+
+def _time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmark(num_rows: int, repeat: int = 3):
+    '''
+    Times each calculation with both engines and prints the speedup.
+    '''
+    records = generate_records(num_rows)
+    build_time = _time(lambda: ColumnarKPIData.from_records(records), repeat)
+    columnar = ColumnarKPIData.from_records(records)
+
+    cases = [
+        ('stock_outs', lambda: calculate_stock_outs(records), columnar.stock_outs),
+        ('top_sellers', lambda: calculate_top_sellers(records, 5), lambda: columnar.top_sellers(5)),
+        ('rx_volume', lambda: calculate_rx_volume(records), columnar.rx_volume),
+        ('cash_reconciliation', lambda: calculate_cash_reconciliation(records), columnar.cash_reconciliation),
+        ('inventory_levels', lambda: calculate_inventory_levels(records), columnar.inventory_levels),
+        ('sales_by_branch', lambda: calculate_sales_by_branch(records), columnar.sales_by_branch),
+        ('inventory_turns_by_branch', lambda: calculate_inventory_turns_by_branch(records), columnar.inventory_turns_by_branch),
+        ('service_level_by_branch', lambda: calculate_service_level_by_branch(records), columnar.service_level_by_branch),
+    ]
+
+    print(f"Rows: {num_rows}, building columns: {build_time * 1000:.1f} ms")
+    print(f"{'calculation':<28}{'dict loop (ms)':>16}{'columnar (ms)':>16}{'speedup':>10}")
+    total_loop = 0.0
+    total_columnar = 0.0
+    for name, loop_fn, columnar_fn in cases:
+        loop_time = _time(loop_fn, repeat)
+        columnar_time = _time(columnar_fn, repeat)
+        total_loop += loop_time
+        total_columnar += columnar_time
+        print(f"{name:<28}{loop_time * 1000:>16.2f}{columnar_time * 1000:>16.2f}{loop_time / columnar_time:>9.1f}x")
+    print(f"{'all (incl. column build)':<28}{total_loop * 1000:>16.2f}{(total_columnar + build_time) * 1000:>16.2f}"
+          f"{total_loop / (total_columnar + build_time):>9.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark columnar KPI engine against dict loops.")
+    parser.add_argument("--rows", type=int, default=200_000, help="Number of synthetic records")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per measurement (best is reported)")
+    args = parser.parse_args()
+    run_benchmark(args.rows, args.repeat)
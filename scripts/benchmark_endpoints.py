@@ -0,0 +1,299 @@
+'''
+This script benchmarks every API endpoint against seeded synthetic datasets.
+
+Each dataset size is generated with data/dataset.py, loaded the way the loaders
+store it (kpi_data, products/branches, daily_kpis, kpi_rollup, transfers), and
+every GET endpoint is then called through the ASGI app in-process. For each
+endpoint it reports p50/p95/p99 latency, throughput, peak RSS and, against a
+real mongod, documents examined per request. Results are written as JSON so
+runs from different commits can be compared with --compare.
+
+Backends:
+    mongod  the server at MONGO_URI (a separate 'pharmacy_kpi_bench' database is used)
+    memory  an in-process stand-in from mongomock-motor (pip install mongomock-motor);
+            it evaluates queries in pure Python without indexes, so its numbers are
+            only comparable with other 'memory' runs and it is practical up to
+            roughly 100k rows; use mongod for the 1M and 10M row datasets
+    auto    mongod if it answers a ping, otherwise memory
+
+    python scripts/benchmark_endpoints.py --rows 10000 1000000 --output before.json
+    python scripts/benchmark_endpoints.py --rows 10000 1000000 --compare before.json
+'''
+import sys
+import os
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(project_root)
+sys.path.append(os.path.join(project_root, 'data'))
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import resource
+import subprocess
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from database import db_client
+from dataset import generate
+from services.cache import result_cache, bump_data_version
+from services.catalog import PRODUCTS_COLLECTION, BRANCHES_COLLECTION, build_dimensions
+from services.daily_kpis import DAILY_KPIS_COLLECTION, compute_daily_kpis
+from services.data_preprocessing import preprocess_kpi_data, convert_df_to_docs
+from services.indexes import ensure_indexes
+from services.rollup import ROLLUP_COLLECTION, build_cells
+
+BENCH_DATABASE_NAME = "pharmacy_kpi_bench"
+# The transfers router always reads this database.
+TRANSFERS_DATABASE_NAME = "pharmacy_kpi_db"
+NUM_BRANCHES = 10
+NUM_PRODUCTS = 50
+
+# One representative request per GET endpoint; {branch_id} and {start}/{end} are filled in.
+REQUESTS = [
+    ("root", "/"),
+    ("sales_value", "/sales-value/"),
+    ("sales_value_branch_30d", "/sales-value/?branch_id={branch_id}&start_date={start}&end_date={end}"),
+    ("rx_volume", "/rx-volume/"),
+    ("cash_reconciliation", "/cash-reconciliation/?branch_id={branch_id}"),
+    ("top_sellers", "/top-sellers/"),
+    ("top_sellers_30d", "/top-sellers/?start_date={start}&end_date={end}"),
+    ("inventory_levels", "/inventory-levels/?branch_id={branch_id}"),
+    ("stock_outs", "/stock-outs/?branch_id={branch_id}"),
+    ("stock_outs_ndjson", "/stock-outs/?branch_id={branch_id}&stream=true"),
+    ("near_expiries", "/near-expiries/?limit=100"),
+    ("near_expiries_breakdown", "/near-expiries/?breakdown=true&limit=100"),
+    ("branch_comparison", "/branches/compare"),
+    ("transfers", "/transfers/"),
+    ("transfers_summary", "/transfers/summary"),
+    ("kpis_daily", "/kpis/daily?limit=1000"),
+    ("kpis_daily_branch", "/kpis/daily?branch_id={branch_id}&start_date={start}&end_date={end}"),
+    ("kpis_summary", "/kpis/summary?branch_id={branch_id}"),
+    ("kpis_rollup", "/kpis/rollup?grain=week&by=Category&branch_id={branch_id}"),
+    ("kpis_trends", "/kpis/trends"),
+    ("kpis_trends_branch", "/kpis/trends/{branch_id}"),
+    ("kpis_alerts", "/kpis/alerts"),
+    ("kpis_alerts_branch", "/kpis/alerts/{branch_id}"),
+    ("diagnostics_cache", "/diagnostics/cache"),
+    ("diagnostics_indexes", "/diagnostics/indexes"),
+]
+# explain() is not available in the in-process stand-in.
+MONGOD_ONLY = {"diagnostics_indexes"}
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return float('nan')
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=project_root, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def connect(backend: str):
+    '''
+    Returns (client, backend name) for the requested backend.
+    '''
+    if backend in ("auto", "mongod"):
+        client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+            return client, "mongod"
+        except Exception:
+            client.close()
+            if backend == "mongod":
+                raise SystemExit(f"MongoDB at {settings.DATABASE_URL} is not reachable.")
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit("No mongod reachable and mongomock-motor is not installed (pip install mongomock-motor).")
+    return AsyncMongoMockClient(), "memory"
+
+async def seed(client, backend: str, num_rows: int, seed_value: int) -> Dict[str, int]:
+    '''
+    Generates 'num_rows' kpi_data rows ending today and loads them with their derived collections.
+    '''
+    db = client[BENCH_DATABASE_NAME]
+    for name in (settings.COLLECTION_NAME, PRODUCTS_COLLECTION, BRANCHES_COLLECTION,
+                 DAILY_KPIS_COLLECTION, ROLLUP_COLLECTION):
+        await db.drop_collection(name)
+    if backend == "mongod":
+        await ensure_indexes(db)
+
+    num_days = max(1, math.ceil(num_rows / (NUM_BRANCHES * NUM_PRODUCTS)))
+    start = datetime.combine(datetime.today().date(), datetime.min.time()) - timedelta(days=num_days - 1)
+    branches = max(1, min(NUM_BRANCHES, math.ceil(num_rows / NUM_PRODUCTS)))
+    counts = {"kpi_data": 0, "daily_kpis": 0, "kpi_rollup": 0}
+    branch_docs = {}
+    for chunk in generate(branches, NUM_PRODUCTS, num_days, start, seed_value, 200_000):
+        chunk = chunk.head(num_rows - counts["kpi_data"])
+        if chunk.empty:
+            break
+        processed = preprocess_kpi_data(chunk)
+        docs = convert_df_to_docs(processed)
+        await db[settings.COLLECTION_NAME].insert_many(docs)
+        daily = compute_daily_kpis(processed)
+        if daily:
+            await db[DAILY_KPIS_COLLECTION].insert_many(daily)
+        cells = build_cells(processed)
+        await db[ROLLUP_COLLECTION].insert_many(cells)
+        product_docs, chunk_branches = build_dimensions(processed)
+        if not counts["kpi_data"]:
+            await db[PRODUCTS_COLLECTION].insert_many(product_docs)
+        branch_docs.update((doc["_id"], doc) for doc in chunk_branches)
+        counts["kpi_data"] += len(docs)
+        counts["daily_kpis"] += len(daily)
+        counts["kpi_rollup"] += len(cells)
+    await db[BRANCHES_COLLECTION].insert_many(list(branch_docs.values()))
+    # New versions make the catalog and any cached results from the previous dataset stale.
+    for name in (settings.COLLECTION_NAME, DAILY_KPIS_COLLECTION, ROLLUP_COLLECTION):
+        await bump_data_version(db, name)
+
+    if backend == "memory":
+        # Only seed transfers in the stand-in; against mongod the router reads the real database.
+        transfers = client[TRANSFERS_DATABASE_NAME]["transfers"]
+        await transfers.drop()
+        await transfers.insert_many([
+            {"from_branch": i % branches + 1, "to_branch": (i + 1) % branches + 1, "product_id": str(i % NUM_PRODUCTS + 1),
+             "quantity": 5 + i % 20, "date": start + timedelta(days=i % num_days), "cost": 10.0 + i % 50}
+            for i in range(1000)
+        ])
+    return counts
+
+async def docs_examined(client, backend: str) -> Optional[int]:
+    if backend != "mongod":
+        return None
+    status = await client.admin.command("serverStatus")
+    return status["metrics"]["queryExecutor"]["scannedObjects"]
+
+async def bench_endpoint(http, client, backend: str, url: str, requests: int, concurrency: int) -> Dict[str, Any]:
+    warmup = await http.get(url)
+    examined_before = await docs_examined(client, backend)
+    slots = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        async with slots:
+            started = time.perf_counter()
+            response = await http.get(url)
+            await response.aread()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+    examined_after = await docs_examined(client, backend)
+
+    latencies.sort()
+    return {
+        "url": url,
+        "status": warmup.status_code,
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "throughput_rps": round(requests / wall, 2) if wall else None,
+        "docs_examined_per_request": None if examined_before is None else (examined_after - examined_before) / requests,
+        "response_bytes": len(warmup.content),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+async def run(sizes: List[int], backend: str, requests: int, concurrency: int, cache: bool, seed_value: int,
+              only: Optional[List[str]]) -> Dict[str, Any]:
+    from main import app  # imported late so the settings above are in place
+
+    client, backend = await connect(backend)
+    settings.DATABASE_NAME = BENCH_DATABASE_NAME
+    settings.CACHE_ENABLED = cache
+    db_client.client = client
+    db_client.db = client[BENCH_DATABASE_NAME]
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "backend": backend,
+            "python": platform.python_version(),
+            "requests_per_endpoint": requests,
+            "concurrency": concurrency,
+            "cache": cache,
+        },
+        "runs": [],
+    }
+    today = datetime.today().date()
+    params = {"branch_id": 1, "start": (today - timedelta(days=29)).isoformat(), "end": today.isoformat()}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            for num_rows in sizes:
+                print(f"Seeding {num_rows} rows ({backend})...")
+                seeded_at = time.perf_counter()
+                counts = await seed(client, backend, num_rows, seed_value)
+                run_result = {"rows": num_rows, "seeded": counts,
+                              "seed_seconds": round(time.perf_counter() - seeded_at, 1), "endpoints": {}}
+                for name, template in REQUESTS:
+                    if (only and name not in only) or (backend != "mongod" and name in MONGOD_ONLY):
+                        continue
+                    result_cache.clear()
+                    stats = await bench_endpoint(http, client, backend, template.format(**params), requests, concurrency)
+                    run_result["endpoints"][name] = stats
+                    print(f"  {name:<26} p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  "
+                          f"p99 {stats['p99_ms']:>9.2f} ms  {stats['throughput_rps']:>8.1f} req/s  status {stats['status']}")
+                results["runs"].append(run_result)
+    finally:
+        client.close()
+    return results
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    '''
+    Prints the p95 latency change of every endpoint present in both result files.
+    '''
+    baseline_runs = {run["rows"]: run for run in baseline["runs"]}
+    print(f"Compared with {baseline['meta'].get('commit')} ({baseline['meta'].get('backend')}):")
+    for run in results["runs"]:
+        old = baseline_runs.get(run["rows"])
+        if old is None:
+            continue
+        print(f"  {run['rows']} rows")
+        for name, stats in run["endpoints"].items():
+            old_stats = old["endpoints"].get(name)
+            if not old_stats or not old_stats["p95_ms"]:
+                continue
+            ratio = stats["p95_ms"] / old_stats["p95_ms"]
+            print(f"    {name:<26} p95 {old_stats['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms  ({ratio:.2f}x)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint against seeded datasets.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000], help="Dataset sizes, e.g. 10000 1000000 10000000")
+    parser.add_argument("--backend", choices=["auto", "mongod", "memory"], default="auto")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--cache", action="store_true", help="Keep the result cache enabled (cleared before each endpoint)")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset random seed")
+    parser.add_argument("--only", nargs="+", help="Benchmark only these endpoint names")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Earlier results file to compare p95 latencies against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.rows, args.backend, args.requests, args.concurrency, args.cache, args.seed, args.only))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
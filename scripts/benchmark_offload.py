@@ -0,0 +1,82 @@
+'''
+This script measures how heavy KPI calculations affect light requests under each executor mode.
+
+Heavy jobs are calculate_inventory_levels and calculate_kpi_summary on synthetic
+rows, run through services/executor.offload. While they run, GET / is called
+repeatedly through the ASGI app. For each mode (inline, thread, process) the
+script reports the light-request p50/p99/max latency and the total time of the
+heavy jobs. Inline mode is the old behaviour: the heavy jobs block the event
+loop, so light requests wait for them.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import asyncio
+import time
+from typing import List
+import httpx
+from config import settings
+from main import app
+from services import executor
+from services.calculations import calculate_inventory_levels, calculate_kpi_summary
+from benchmark_calculations import generate_records
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def run_mode(mode: str, records, heavy_jobs: int, light_interval: float):
+    settings.CALCULATION_EXECUTOR = mode
+    settings.CALCULATION_OFFLOAD_MIN_ROWS = 0
+    executor.shutdown_executor()
+    if executor.get_executor() is not None:
+        # Start the workers before timing, so pool start-up is not counted.
+        await executor.offload(len, [])
+
+    latencies = []
+    done = asyncio.Event()
+
+    async def light_requests(client: httpx.AsyncClient):
+        while not done.is_set():
+            started = time.perf_counter()
+            response = await client.get("/")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(light_interval)
+
+    async def heavy_requests():
+        calculations = [(calculate_inventory_levels, ()), (calculate_kpi_summary, (5,))]
+        jobs = [calculations[i % len(calculations)] for i in range(heavy_jobs)]
+        await asyncio.gather(*(executor.offload(calculation, records, *args) for calculation, args in jobs))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        light = asyncio.create_task(light_requests(client))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        await heavy_requests()
+        heavy_time = time.perf_counter() - started
+        done.set()
+        await light
+    executor.shutdown_executor()
+
+    print(f"{mode:<8}{len(latencies):>8}{_percentile(latencies, 50) * 1000:>12.1f}{_percentile(latencies, 99) * 1000:>12.1f}"
+          f"{max(latencies) * 1000:>12.1f}{heavy_time * 1000:>14.0f}")
+
+async def main(rows: int, heavy_jobs: int, light_interval: float, modes: List[str]):
+    records = generate_records(rows)
+    print(f"Rows per heavy job: {rows}, heavy jobs: {heavy_jobs}, workers: {executor.worker_count()}")
+    print(f"{'mode':<8}{'light n':>8}{'p50 (ms)':>12}{'p99 (ms)':>12}{'max (ms)':>12}{'heavy (ms)':>14}")
+    for mode in modes:
+        await run_mode(mode, records, heavy_jobs, light_interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark light-request tail latency while heavy calculations run.")
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic rows per heavy calculation")
+    parser.add_argument("--heavy-jobs", type=int, default=8, help="Heavy calculations started at once")
+    parser.add_argument("--light-interval", type=float, default=0.005, help="Seconds between light requests")
+    parser.add_argument("--modes", nargs="+", choices=executor.EXECUTOR_KINDS, default=list(executor.EXECUTOR_KINDS))
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.heavy_jobs, args.light_interval, args.modes))
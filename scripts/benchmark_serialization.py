@@ -0,0 +1,88 @@
+'''
+This script benchmarks the trusted serialization path in services/serialization.py against the validated one.
+
+The validated path is what a daily KPI page used to cost. It builds
+DailyKPIInDB(**doc) for every row, FastAPI re-validates the list against
+response_model and dumps it to JSON-compatible data, and JSONResponse then
+encodes it with json.dumps. The trusted path uses model_construct and orjson.
+Both must produce the same JSON.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from models import DailyKPIInDB
+from services.serialization import FastJSONResponse, trusted_models
+
+def generate_daily_kpis(num_rows: int, seed: int = 42):
+    '''
+    Generates daily_kpis-shaped documents, as they come back from MongoDB.
+    '''
+    rng = np.random.default_rng(seed)
+    start = datetime(2025, 8, 25)
+    docs = []
+    for i in range(num_rows):
+        top_sellers = [
+            {"product_id": int(p), "product_name": f"Product {p}", "total_sales_value": float(rng.uniform(100, 5000))}
+            for p in rng.choice(50, 5, replace=False) + 1
+        ]
+        docs.append({
+            "_id": ObjectId(),
+            "date": start + timedelta(days=i // 10),
+            "branch_id": i % 10 + 1,
+            "total_stockouts": int(rng.integers(0, 5)),
+            "total_near_expiries": int(rng.integers(0, 20)),
+            "top_sellers": top_sellers,
+            "total_rx_volume": int(rng.integers(0, 500)),
+            "total_sales_value": float(rng.uniform(1000, 20000)),
+            "total_cash_reconciliation": float(rng.normal(0, 50)),
+            "inventory_levels_top_sellers": [{"product_id": s["product_id"], "inventory_level": int(rng.integers(0, 100))}
+                                             for s in top_sellers],
+            "description": f"Daily KPIs for branch {i % 10 + 1}.",
+        })
+    return docs
+
+def _time(fn, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run_benchmark(num_rows: int, repeat: int = 5):
+    docs = generate_daily_kpis(num_rows)
+    response_model = TypeAdapter(List[DailyKPIInDB])
+
+    def validated() -> bytes:
+        items = [DailyKPIInDB(**doc) for doc in docs]
+        content = response_model.dump_python(response_model.validate_python(items), mode="json", by_alias=True)
+        return JSONResponse(content).body
+
+    def trusted() -> bytes:
+        return FastJSONResponse(trusted_models(DailyKPIInDB, docs)).body
+
+    if json.loads(validated()) != json.loads(trusted()):
+        raise SystemExit("The trusted path produced different JSON from the validated path.")
+
+    validated_time = _time(validated, repeat)
+    trusted_time = _time(trusted, repeat)
+    print(f"{num_rows:>8} rows  validated {validated_time * 1000:>9.2f} ms  trusted {trusted_time * 1000:>9.2f} ms"
+          f"  speedup {validated_time / trusted_time:>5.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trusted against validated daily KPI serialization.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 50_000], help="Page sizes to time")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetitions per measurement (best is reported)")
+    args = parser.parse_args()
+    for rows in args.rows:
+        run_benchmark(rows, args.repeat)
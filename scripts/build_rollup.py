@@ -0,0 +1,64 @@
+'''
+Builds the kpi_rollup cube from the rows already in kpi_data.
+
+Ingestion keeps the cube up to date; run this once for data loaded before the
+cube existed, or with --rebuild to start from an empty cube.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import pandas as pd
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.cache import bump_data_version
+from services.data_preprocessing import preprocess_kpi_data
+from services.indexes import ensure_indexes
+from services.rollup import ROLLUP_COLLECTION, build_cells, write_cells
+
+SOURCE_FIELDS = ['Date', 'Product_ID', 'Category', 'Quantity_Sold', 'Price', 'Cash_Received',
+                 'Inventory_Level', 'Expiration_Date', 'branch_id']
+
+async def _flush(db, records) -> int:
+    cells = build_cells(preprocess_kpi_data(pd.DataFrame.from_records(records, columns=SOURCE_FIELDS)))
+    await write_cells(db, cells)
+    return len(cells)
+
+async def build_rollup(batch_size: int = 50_000, rebuild: bool = False):
+    '''
+    Streams kpi_data in (branch_id, Date) order and writes its rollup cells.
+    '''
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    try:
+        db = client[settings.DATABASE_NAME]
+        await ensure_indexes(db)
+        if rebuild:
+            await db[ROLLUP_COLLECTION].delete_many({})
+
+        projection = {field: 1 for field in SOURCE_FIELDS}
+        projection["_id"] = 0
+        cursor = db[settings.COLLECTION_NAME].find({}, projection).sort([("branch_id", 1), ("Date", 1)])
+        records, written = [], 0
+        async for record in cursor:
+            # A cell is rewritten, not summed, so all rows of one branch and day must go in the same batch.
+            if len(records) >= batch_size and (record.get('branch_id'), record.get('Date')) != \
+                    (records[-1].get('branch_id'), records[-1].get('Date')):
+                written += await _flush(db, records)
+                records = []
+            records.append(record)
+        if records:
+            written += await _flush(db, records)
+
+        await bump_data_version(db, ROLLUP_COLLECTION)
+        print(f"Wrote {written} rollup cells.")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the kpi_rollup cube from kpi_data.")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Raw rows summed per batch")
+    parser.add_argument("--rebuild", action="store_true", help="Delete all existing cells first")
+    args = parser.parse_args()
+    asyncio.run(build_rollup(args.batch_size, args.rebuild))
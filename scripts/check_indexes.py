@@ -0,0 +1,37 @@
+'''
+This script ensures the registered indexes exist and verifies that no router query shape uses a COLLSCAN.
+Exits with a non-zero status if an index is missing or a query shape scans a collection.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.indexes import ensure_indexes, check_indexes
+
+async def main(create: bool) -> int:
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    db = client[settings.DATABASE_NAME]
+    try:
+        if create:
+            print("Ensuring indexes...")
+            await ensure_indexes(db)
+        report = await check_indexes(db)
+    finally:
+        client.close()
+
+    for missing in report["missing_indexes"]:
+        print(f"MISSING  {missing['collection']}.{missing['index']}")
+    for plan in report["query_plans"]:
+        status = "COLLSCAN" if plan["collscan"] else "ok"
+        print(f"{status:<9}{plan['name']} ({plan['collection']}): {' > '.join(plan['stages'])}")
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify MongoDB indexes and query plans.")
+    parser.add_argument("--create", action="store_true", help="Create missing registered indexes first")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.create)))
@@ -7,14 +7,21 @@ project_root = os.path.abspath(os.path.join(script_dir, '..'))
 sys.path.insert(0, project_root)
 
 import pandas as pd
+import argparse
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
 from services.data_preprocessing import preprocess_kpi_data, convert_df_to_docs
+from services.cache import bump_data_version
+from services.indexes import ensure_indexes
+from services.catalog import write_dimensions, CATALOG_FIELDS
+from services import ingest
+from services.rollup import ROLLUP_COLLECTION, build_cells, write_cells
+from services.materializer import mark_partitions, partitions_of
 
 async def load_csv_to_mongodb(csv_file_path: str):
     """
-    Loads data from a CSV file, preprocesses it, and inserts it into MongoDB.
+    Loads data from a CSV file, preprocesses it, and upserts it into MongoDB.
     """
     client = None
     try:
@@ -23,24 +30,37 @@ async def load_csv_to_mongodb(csv_file_path: str):
         db = client[settings.DATABASE_NAME]
         collection = db[settings.COLLECTION_NAME]
 
-        # Create an index on branch_id for efficient queries
-        print("Creating index on 'branch_id'...")
-        await collection.create_index("branch_id", background=True)
-        print("Index created on 'branch_id'.")
+        # Create the registered indexes for efficient queries
+        print("Ensuring indexes...")
+        await ensure_indexes(db)
+        print("Indexes ensured.")
 
         print(f"Reading CSV from {csv_file_path}...")
         df = pd.read_csv(csv_file_path)
 
         print("Preprocessing data...")
         processed_df = preprocess_kpi_data(df)
+
+        print("Updating product and branch dimensions...")
+        await write_dimensions(db, processed_df)
+        cells = build_cells(processed_df)
+        partitions = partitions_of(processed_df)
+        if settings.NORMALIZE_KPI_FACTS:
+            # Names live in the 'products' collection; facts keep only the integer Product_ID.
+            processed_df = processed_df.drop(columns=list(CATALOG_FIELDS))
         docs = convert_df_to_docs(processed_df)
 
         if docs:
-            print(f"Inserting {len(docs)} documents into collection '{settings.COLLECTION_NAME}'...")
-            # Optional: Clear existing data before inserting
-            # await collection.delete_many({})
-            result = await collection.insert_many(docs)
-            print(f"Successfully inserted {len(result.inserted_ids)} documents.")
+            print(f"Upserting {len(docs)} documents into collection '{settings.COLLECTION_NAME}'...")
+            # Same branch:date:product _id as --stream, so reloading a file replaces its rows instead of duplicating them.
+            written = await ingest.upsert_rows(collection, docs)
+            print(f"Successfully wrote {written} documents.")
+            await bump_data_version(db, settings.COLLECTION_NAME)
+            print(f"Writing {len(cells)} rollup cells...")
+            await write_cells(db, cells)
+            await bump_data_version(db, ROLLUP_COLLECTION)
+            # The API's materializer (or scripts/materialize_daily_kpis.py) refreshes their daily KPIs.
+            await mark_partitions(db, partitions)
         else:
             print("No documents to insert.")
 
@@ -51,8 +71,45 @@ async def load_csv_to_mongodb(csv_file_path: str):
             client.close()
             print("MongoDB connection closed.")
 
+async def stream_csv_to_mongodb(csv_file_path: str, chunk_size: int, batch_size: int, max_in_flight: int, restart: bool):
+    """
+    Streams a CSV into MongoDB in chunks, resuming from the last checkpoint if interrupted.
+    """
+    client = None
+    try:
+        print(f"Connecting to MongoDB at {settings.DATABASE_URL}...")
+        client = AsyncIOMotorClient(settings.DATABASE_URL)
+        db = client[settings.DATABASE_NAME]
+
+        print("Ensuring indexes...")
+        await ensure_indexes(db)
+
+        print(f"Streaming {csv_file_path} in chunks of {chunk_size} rows...")
+        stats = await ingest.ingest_csv(db, csv_file_path, chunk_size, batch_size, max_in_flight, restart)
+        if stats["skipped"]:
+            print(f"Resumed after {stats['skipped']} rows already ingested.")
+        print(f"Read {stats['read']} rows, wrote {stats['written']} documents.")
+        if stats["read"]:
+            await bump_data_version(db, settings.COLLECTION_NAME)
+            await bump_data_version(db, ROLLUP_COLLECTION)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        if client:
+            client.close()
+            print("MongoDB connection closed.")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the KPI CSV into MongoDB.")
     # This path is relative to the project root when running from there
-    # If running this script directly, adjust the path as needed.
-    csv_path = "data/all_in_one_kpi_dataset.csv"
-    asyncio.run(load_csv_to_mongodb(csv_path))
+    parser.add_argument("csv_path", nargs="?", default="data/all_in_one_kpi_dataset.csv", help="Path to the KPI CSV file")
+    parser.add_argument("--stream", action="store_true", help="Chunked, resumable ingestion with bounded memory")
+    parser.add_argument("--chunksize", type=int, default=ingest.CHUNK_SIZE, help="Rows read per chunk (--stream)")
+    parser.add_argument("--batch-size", type=int, default=ingest.BATCH_SIZE, help="Documents per bulk write (--stream)")
+    parser.add_argument("--in-flight", type=int, default=ingest.MAX_IN_FLIGHT, help="Concurrent bulk writes (--stream)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and ingest the whole file again (--stream)")
+    args = parser.parse_args()
+    if args.stream:
+        asyncio.run(stream_csv_to_mongodb(args.csv_path, args.chunksize, args.batch_size, args.in_flight, args.restart))
+    else:
+        asyncio.run(load_csv_to_mongodb(args.csv_path))
@@ -1,70 +1,64 @@
-
 '''
 This script loads calculated daily KPIs into the MongoDB database.
 '''
 import pandas as pd
-from datetime import datetime, timedelta
+import argparse
 import asyncio
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import settings
-from models import DailyKPI
+from services.cache import bump_data_version
+from services.daily_kpis import DAILY_KPIS_COLLECTION, compute_daily_kpis, upsert_daily_kpis, new_rebuild_id
+from services.alerts import refresh_alerts
+from services.heavy_hitters import SKETCHES_COLLECTION, build_sketches, write_sketches
+from services.indexes import ensure_indexes
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'all_in_one_kpi_dataset.csv')
 
-async def load_kpis_to_db():
+async def load_kpis_to_db(csv_path: str = DEFAULT_CSV_PATH, batch_size: int = 1000, prune: bool = True):
     '''
     Calculates and loads daily KPIs into the MongoDB database.
-    '''
-    client = AsyncIOMotorClient(settings.DATABASE_URL)
-    db = client[settings.DATABASE_NAME]
-    kpi_collection = db["daily_kpis"]
-    await kpi_collection.delete_many({})
 
+    Args:
+        csv_path (str): The path to the raw KPI CSV file.
+        batch_size (int): Number of upserts per bulk_write call.
+        prune (bool): Delete daily KPIs and top-seller summaries for (branch_id, date) pairs no longer present in the CSV.
+    '''
     try:
-        df = pd.read_csv(r'c:\Users\Ahmed\DEV PROJECTS\pharmacy-kpi\data\all_in_one_kpi_dataset.csv')
+        df = pd.read_csv(csv_path)
     except FileNotFoundError:
-        print("Error: The CSV file was not found.")
+        print(f"Error: The CSV file at {csv_path} was not found.")
         return
 
     df['Date'] = pd.to_datetime(df['Date'])
     df['Expiration_Date'] = pd.to_datetime(df['Expiration_Date'])
 
-    for branch_id in df['branch_id'].unique():
-        branch_data = df[df['branch_id'] == branch_id]
-        for date in sorted(branch_data['Date'].unique()):
-            daily_data = branch_data[branch_data['Date'] == date]
+    docs = compute_daily_kpis(df)
+    # /top-sellers only uses summaries where they match the daily KPIs one for one.
+    sketches = build_sketches(df, settings.TOP_SELLER_SKETCH_SIZE)
+    print(f"Computed {len(docs)} daily KPI documents.")
 
-            stockouts = daily_data[daily_data['Inventory_Level'] == 0]
-            near_expiry_date = date + timedelta(days=30)
-            near_expiries = daily_data[daily_data['Expiration_Date'] <= near_expiry_date]
-            top_sellers = daily_data.sort_values(by='Quantity_Sold', ascending=False).head(3)
-            rx_volume = daily_data[daily_data['Category'] == 'Rx']['Quantity_Sold'].sum()
-            total_sales = daily_data['Sales_Value'].sum()
-            cash_reconciliation = daily_data['Cash_Received'].sum() - total_sales
-
-            description = (
-                f"Daily KPI report for {date.strftime('%Y-%m-%d')}. "
-                f"Total sales: ${total_sales:.2f}, Rx volume: {int(rx_volume)} units, "
-                f"Stockouts: {len(stockouts)} products, Near expiries: {len(near_expiries)} products."
-            )
-
-            kpi_data = DailyKPI(
-                date=date,
-                total_stockouts=len(stockouts),
-                total_near_expiries=len(near_expiries),
-                top_sellers=top_sellers[['Product_Name', 'Quantity_Sold']].to_dict('records'),
-                total_rx_volume=int(rx_volume),
-                total_sales_value=total_sales,
-                total_cash_reconciliation=cash_reconciliation,
-                inventory_levels_top_sellers=top_sellers[['Product_Name', 'Inventory_Level']].to_dict('records'),
-                branch_id=int(branch_id),
-                description=description
-            )
-            await kpi_collection.insert_one(kpi_data.dict())
-
-    print("Successfully loaded daily KPIs into the database.")
-    client.close()
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    try:
+        db = client[settings.DATABASE_NAME]
+        await ensure_indexes(db)
+        prune_run = new_rebuild_id() if prune else None
+        written = await upsert_daily_kpis(db[DAILY_KPIS_COLLECTION], docs, batch_size, prune_run=prune_run)
+        await write_sketches(db[SKETCHES_COLLECTION], sketches, batch_size, prune_run=prune_run)
+        await bump_data_version(db, DAILY_KPIS_COLLECTION)
+        await bump_data_version(db, SKETCHES_COLLECTION)
+        print(f"Successfully loaded {written} daily KPIs into the database.")
+        stats = await refresh_alerts(db, ((doc['branch_id'], doc['date']) for doc in docs), batch_size, prune=prune)
+        print(f"Evaluated alert rules: {stats['written']} alerts written, {stats['removed']} removed.")
+    finally:
+        client.close()
 
 if __name__ == "__main__":
-    asyncio.run(load_kpis_to_db())
+    parser = argparse.ArgumentParser(description="Compute daily KPIs from the raw CSV and upsert them into MongoDB.")
+    parser.add_argument("csv_path", nargs="?", default=DEFAULT_CSV_PATH, help="Path to the raw KPI CSV file")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Upserts per bulk_write batch")
+    parser.add_argument("--no-prune", action="store_true", help="Keep daily KPIs for dates missing from the CSV")
+    args = parser.parse_args()
+    asyncio.run(load_kpis_to_db(args.csv_path, args.batch_size, not args.no_prune))
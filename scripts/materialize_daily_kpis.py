@@ -0,0 +1,58 @@
+'''
+Recomputes the daily KPIs of the (branch_id, day) partitions ingestion marked as changed.
+
+The API does this in the background every MATERIALIZE_INTERVAL_SECONDS. Run
+this script when the API is not running, or with MATERIALIZE_INTERVAL_SECONDS=0,
+either once or with --watch to keep polling for new marks. --all first marks
+every partition of kpi_data, which builds the daily KPIs and top-seller
+summaries of data loaded before they were maintained incrementally.
+--retry-failed first marks the partitions parked in failed_partitions again.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.indexes import ensure_indexes
+from services.materializer import (MAX_PARTITIONS_PER_RUN, mark_all_partitions, materialize_dirty, materialize_forever,
+                                   retry_failed_partitions)
+
+async def materialize(watch: bool, interval: float, max_partitions: int, batch_size: int, mark_all: bool = False,
+                      retry_failed: bool = False):
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    try:
+        db = client[settings.DATABASE_NAME]
+        await ensure_indexes(db)
+        if mark_all:
+            print(f"Marked {await mark_all_partitions(db)} partitions.")
+        if retry_failed:
+            print(f"Marked {await retry_failed_partitions(db)} failed partitions for retry.")
+        if watch:
+            await materialize_forever(db, interval)
+            return
+        totals = {"partitions": 0, "written": 0, "removed": 0, "failed": 0}
+        while True:
+            stats = await materialize_dirty(db, max_partitions, batch_size)
+            for key in totals:
+                totals[key] += stats[key]
+            if stats["partitions"] < max_partitions:
+                break
+        print(f"Materialized {totals['partitions']} partitions: "
+              f"{totals['written']} daily KPIs written, {totals['removed']} removed, {totals['failed']} failed.")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute daily KPIs of changed (branch_id, day) partitions.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and poll for new changes")
+    parser.add_argument("--interval", type=float, default=settings.MATERIALIZE_INTERVAL_SECONDS or 5,
+                        help="Seconds between polls with --watch")
+    parser.add_argument("--max-partitions", type=int, default=MAX_PARTITIONS_PER_RUN, help="Partitions per run")
+    parser.add_argument("--all", action="store_true", help="Recompute every partition of kpi_data")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry the partitions in failed_partitions")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Daily KPI upserts per bulk write")
+    args = parser.parse_args()
+    asyncio.run(materialize(args.watch, args.interval, args.max_partitions, args.batch_size, args.all, args.retry_failed))
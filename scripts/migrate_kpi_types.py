@@ -0,0 +1,67 @@
+'''
+One-off migration of an existing kpi_data collection to typed fields.
+
+Older ingestions stored 'Date' and 'Expiration_Date' as ISO strings and whole
+numbers as doubles. This converts them in place on the server with pipeline
+updates: strings to BSON dates, integral doubles to int32 (int64 if they do not
+fit). Running it again is a no-op.
+'''
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.cache import bump_data_version
+from services.data_preprocessing import INTEGER_COLS
+from services.indexes import ensure_indexes
+
+DATE_COLS = ['Date', 'Expiration_Date']
+INT32_MAX = 2**31 - 1
+
+def date_migration(field: str):
+    return {field: {"$type": "string"}}, [{"$set": {field: {"$toDate": f"${field}"}}}]
+
+def integer_migration(field: str):
+    value = f"${field}"
+    query = {field: {"$type": "double"}, "$expr": {"$eq": [value, {"$floor": value}]}}
+    update = [{"$set": {field: {"$cond": [
+        {"$lte": [{"$abs": value}, INT32_MAX]}, {"$toInt": value}, {"$toLong": value},
+    ]}}}]
+    return query, update
+
+def migrations():
+    return [(field, *date_migration(field)) for field in DATE_COLS] + \
+           [(field, *integer_migration(field)) for field in INTEGER_COLS]
+
+async def migrate_kpi_types(dry_run: bool = False):
+    '''
+    Converts legacy string dates and double-typed integers in kpi_data.
+    '''
+    client = AsyncIOMotorClient(settings.DATABASE_URL)
+    try:
+        db = client[settings.DATABASE_NAME]
+        collection = db[settings.COLLECTION_NAME]
+        changed = 0
+        for field, query, update in migrations():
+            if dry_run:
+                count = await collection.count_documents(query)
+                print(f"{field}: {count} documents to convert")
+                continue
+            result = await collection.update_many(query, update)
+            changed += result.modified_count
+            print(f"{field}: converted {result.modified_count} documents")
+        if changed:
+            await bump_data_version(db, settings.COLLECTION_NAME)
+        if not dry_run:
+            await ensure_indexes(db)
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert string dates and double-typed integers in kpi_data to native types.")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the documents that would change")
+    args = parser.parse_args()
+    asyncio.run(migrate_kpi_types(args.dry_run))
@@ -0,0 +1,202 @@
+'''
+Server-side MongoDB aggregation pipelines for the scalar KPI endpoints.
+
+The functions in services/calculations.py remain the reference implementation;
+the pipelines below compute the same numbers inside MongoDB so that only one
+small result document crosses the wire instead of every raw row.
+'''
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+# Quantity_Sold * Price, treating missing fields as 0 like record.get(..., 0) does.
+SALES_VALUE_EXPR = {
+    "$multiply": [
+        {"$ifNull": ["$Quantity_Sold", 0]},
+        {"$ifNull": ["$Price", 0]},
+    ]
+}
+
+def total_sales_value_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Builds the pipeline equivalent of calculate_total_sales_value.
+    """
+    return [
+        {"$match": query},
+        {"$group": {"_id": None, "total_sales_value": {"$sum": SALES_VALUE_EXPR}}},
+    ]
+
+def rx_volume_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Builds the pipeline equivalent of calculate_rx_volume.
+    """
+    return [
+        {"$match": {**query, "Category": "Rx"}},
+        {"$group": {"_id": None, "total_rx_volume": {"$sum": "$Quantity_Sold"}}},
+    ]
+
+def cash_reconciliation_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Builds the pipeline equivalent of calculate_cash_reconciliation.
+    """
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "total_sales_value": {"$sum": SALES_VALUE_EXPR},
+            "total_cash_received": {"$sum": "$Cash_Received"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "total_sales_value": 1,
+            "total_cash_received": 1,
+            "discrepancy": {"$subtract": ["$total_sales_value", "$total_cash_received"]},
+        }},
+    ]
+
+def branch_totals_pipeline(query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Sums the inputs of calculate_branch_metrics over the rows matching 'query' (normally one branch).
+    """
+    quantity_sold = {"$ifNull": ["$Quantity_Sold", 0]}
+    inventory_level = {"$ifNull": ["$Inventory_Level", 0]}
+    is_stock_out = {"$and": [{"$eq": [inventory_level, 0]}, {"$gt": [quantity_sold, 0]}]}
+    return [
+        {"$match": query},
+        {"$group": {
+            "_id": None,
+            "sales_value": {"$sum": SALES_VALUE_EXPR},
+            "inventory_level": {"$sum": inventory_level},
+            "quantity_sold": {"$sum": quantity_sold},
+            "stock_out_quantity": {"$sum": {"$cond": [is_stock_out, quantity_sold, 0]}},
+            "rows": {"$sum": 1},
+        }},
+    ]
+
+def branch_metrics_from_totals(totals_by_branch: Dict[Any, Optional[Dict[str, Any]]]) -> Dict[str, Dict[Any, float]]:
+    """
+    Builds the calculate_branch_metrics result from per-branch totals. Branches without rows (None) are left out.
+    """
+    sales_by_branch, inventory_turns, service_level = {}, {}, {}
+    for branch_id, totals in totals_by_branch.items():
+        if totals is None:
+            continue
+        sales = totals["sales_value"]
+        sales_by_branch[branch_id] = sales
+        inventory_turns[branch_id] = sales / totals["inventory_level"] if totals["inventory_level"] > 0 else 0
+        total_orders = totals["quantity_sold"]
+        if total_orders > 0:
+            service_level[branch_id] = (total_orders - totals["stock_out_quantity"]) / total_orders
+        else:
+            service_level[branch_id] = 1.0  # Perfect service level if no orders
+    return {
+        "sales_by_branch": sales_by_branch,
+        "inventory_turns_by_branch": inventory_turns,
+        "service_level_by_branch": service_level,
+    }
+
+def near_expiry_window(today: datetime, days_threshold: int) -> Dict[str, datetime]:
+    """
+    Expiration_Date range of items expiring within 'days_threshold' days of 'today'.
+    """
+    return {"$gte": today, "$lte": today + timedelta(days=days_threshold)}
+
+def near_expiries_pipeline(query: Dict[str, Any], today: datetime, days_threshold: int,
+                           limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Builds the pipeline equivalent of calculate_near_expiries, sorted by days to expiry.
+
+    The expiry window is an indexed Expiration_Date range and the sort follows the
+    same index, so MongoDB reads only the matching entries in order.
+    """
+    pipeline = [
+        {"$match": {**query, "Expiration_Date": near_expiry_window(today, days_threshold)}},
+        {"$sort": {"Expiration_Date": 1}},
+    ]
+    if limit is not None:
+        pipeline.append({"$limit": limit})
+    pipeline.append({"$project": {
+        "_id": 0,
+        "date": "$Date",
+        "product_id": {"$toString": "$Product_ID"},
+        "expiration_date": "$Expiration_Date",
+        # Whole days, rounded down like timedelta.days
+        "days_to_expiry": {"$toInt": {"$floor": {"$divide": [{"$subtract": ["$Expiration_Date", today]}, 86_400_000]}}},
+    }})
+    return pipeline
+
+def near_expiry_counts_pipeline(query: Dict[str, Any], today: datetime, days_threshold: int) -> List[Dict[str, Any]]:
+    """
+    Per-branch and per-category counts of every item in the near-expiry window.
+
+    Only the counts go through $facet, so its single output document stays small
+    however many items match.
+    """
+    return [
+        {"$match": {**query, "Expiration_Date": near_expiry_window(today, days_threshold)}},
+        {"$facet": {
+            "by_branch": [{"$group": {"_id": "$branch_id", "count": {"$sum": 1}}}, {"$sort": {"_id": 1}}],
+            "by_category": [{"$group": {"_id": "$Category", "count": {"$sum": 1}}}, {"$sort": {"_id": 1}}],
+        }},
+    ]
+
+async def _aggregate_one(collection, pipeline: List[Dict[str, Any]], empty: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs a single-group pipeline and returns its result document without '_id'.
+    An empty match produces no group at all, so 'empty' is returned instead.
+    """
+    docs = await collection.aggregate(pipeline).to_list(length=1)
+    if not docs:
+        return dict(empty)
+    result = docs[0]
+    result.pop("_id", None)
+    return result
+
+async def aggregate_total_sales_value(collection, query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calculates the total sales value inside MongoDB.
+    """
+    return await _aggregate_one(collection, total_sales_value_pipeline(query), {"total_sales_value": 0})
+
+async def aggregate_rx_volume(collection, query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calculates the total prescription (Rx) volume inside MongoDB.
+    """
+    return await _aggregate_one(collection, rx_volume_pipeline(query), {"total_rx_volume": 0})
+
+async def aggregate_cash_reconciliation(collection, query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Compares total sales value with total cash received inside MongoDB.
+    """
+    return await _aggregate_one(
+        collection,
+        cash_reconciliation_pipeline(query),
+        {"total_sales_value": 0, "total_cash_received": 0, "discrepancy": 0},
+    )
+
+async def aggregate_branch_totals(collection, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Sums one branch's rows inside MongoDB, or returns None if no rows match.
+    """
+    docs = await collection.aggregate(branch_totals_pipeline(query)).to_list(length=1)
+    return docs[0] if docs and docs[0]["rows"] else None
+
+async def aggregate_near_expiries(collection, query: Dict[str, Any], today: datetime, days_threshold: int,
+                                  limit: Optional[int] = None, breakdown: bool = False) -> Dict[str, Any]:
+    """
+    Finds near-expiry items inside MongoDB, soonest first.
+
+    Returns {"items": [...]}, plus "by_branch" and "by_category" counts when 'breakdown' is set.
+    The counts come from a separate aggregation that runs concurrently with the item query.
+    """
+    items_cursor = collection.aggregate(near_expiries_pipeline(query, today, days_threshold, limit))
+    if not breakdown:
+        return {"items": await items_cursor.to_list(length=None)}
+    counts_cursor = collection.aggregate(near_expiry_counts_pipeline(query, today, days_threshold))
+    items, counts = await asyncio.gather(items_cursor.to_list(length=None), counts_cursor.to_list(length=1))
+    counts = counts[0]
+    return {
+        "items": items,
+        "by_branch": {group["_id"]: group["count"] for group in counts["by_branch"]},
+        "by_category": {group["_id"]: group["count"] for group in counts["by_category"]},
+    }
@@ -0,0 +1,172 @@
+'''
+Alert rules, evaluated whenever daily KPIs are written, and the indexed 'alerts' collection.
+
+Each rule turns one branch-day into a value:
+
+    stock_out         products out of stock that day
+    cash_discrepancy  |sales value - cash received|
+    near_expiry       products within 30 days of expiry
+    sales_drop        how far the day's sales value fell below the branch's mean of
+                      the previous ALERT_SALES_TRAILING_DAYS days, as a fraction
+
+A rule raises a 'warning' alert once its value reaches the first of its
+"warning,critical" thresholds in config.py, and a 'critical' one once it reaches
+the second. ALERT_RULES selects the rules that run.
+
+refresh_alerts() re-evaluates the days of the given (branch_id, day) partitions.
+For sales_drop it also re-evaluates the following days, whose trailing window
+includes them. The materializer (services/materializer.py) calls it after it
+writes daily KPIs, and scripts/load_kpis_to_db.py calls it after a full rebuild.
+Alerts are upserted on (branch_id, date, rule) and tagged with the run that wrote
+them. Alerts on the re-evaluated days that the run did not produce are deleted,
+so an alert disappears once corrected data no longer triggers it.
+'''
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, NamedTuple, Set, Tuple
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+from config import settings
+from services.cache import bump_data_version
+from services.daily_kpis import DAILY_KPIS_COLLECTION
+from services.fieldsets import parse_fields
+
+ALERTS_COLLECTION = "alerts"
+SEVERITIES = ("warning", "critical")
+KPI_FIELDS = ["branch_id", "date", "total_stockouts", "total_cash_reconciliation", "total_near_expiries", "total_sales_value"]
+
+class AlertRule(NamedTuple):
+    name: str
+    warning: float
+    critical: float
+    description: str
+
+# Rule name -> (thresholds setting, description template).
+RULES = {
+    "stock_out": ("ALERT_STOCK_OUT_THRESHOLDS",
+                  "{value:.0f} product(s) out of stock in branch {branch_id} on {date:%Y-%m-%d}."),
+    "cash_discrepancy": ("ALERT_CASH_DISCREPANCY_THRESHOLDS",
+                         "Cash received in branch {branch_id} on {date:%Y-%m-%d} differed from sales by {value:.2f}."),
+    "near_expiry": ("ALERT_NEAR_EXPIRY_THRESHOLDS",
+                    "{value:.0f} product(s) in branch {branch_id} within 30 days of expiry on {date:%Y-%m-%d}."),
+    "sales_drop": ("ALERT_SALES_DROP_THRESHOLDS",
+                   "Sales in branch {branch_id} on {date:%Y-%m-%d} were {value:.0%} below the trailing average."),
+}
+
+def active_rules() -> List[AlertRule]:
+    """
+    The rules enabled by ALERT_RULES, with their configured thresholds.
+    """
+    rules = []
+    for name in parse_fields(settings.ALERT_RULES) or []:
+        if name not in RULES:
+            raise ValueError(f"Unknown alert rule '{name}'; expected one of: {', '.join(RULES)}")
+        setting, description = RULES[name]
+        warning, critical = (float(part) for part in getattr(settings, setting).split(","))
+        rules.append(AlertRule(name, warning, critical, description))
+    return rules
+
+def rule_values(daily: pd.DataFrame, trailing_days: int) -> pd.DataFrame:
+    """
+    'daily' (one row per branch and day, KPI_FIELDS columns) sorted by branch and date, with a column per rule.
+    """
+    frame = daily.sort_values(["branch_id", "date"]).reset_index(drop=True)
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["stock_out"] = frame["total_stockouts"]
+    frame["cash_discrepancy"] = frame["total_cash_reconciliation"].abs()
+    frame["near_expiry"] = frame["total_near_expiries"]
+    # Mean sales of the previous days of the same branch; needs at least half the window to have data.
+    trailing = (frame.set_index("date").groupby("branch_id", sort=True)["total_sales_value"]
+                .rolling(f"{trailing_days}D", closed="left", min_periods=max(1, trailing_days // 2)).mean())
+    trailing = trailing.to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frame["sales_drop"] = np.where(trailing > 0, 1 - frame["total_sales_value"].to_numpy() / trailing, np.nan)
+    return frame
+
+def evaluate_alerts(daily: pd.DataFrame, rules: List[AlertRule], trailing_days: int) -> List[Dict[str, Any]]:
+    """
+    The alert documents 'rules' raise for the branch-days in 'daily'.
+    """
+    if daily.empty or not rules:
+        return []
+    frame = rule_values(daily, trailing_days)
+    alerts = []
+    for rule in rules:
+        values = frame[rule.name].to_numpy(dtype="float64")
+        critical = values >= rule.critical
+        warning = (values >= rule.warning) & ~critical
+        for severity, threshold, hits in (("critical", rule.critical, critical), ("warning", rule.warning, warning)):
+            for row in frame.loc[hits, ["branch_id", "date", rule.name]].itertuples(index=False):
+                branch_id, day, value = int(row[0]), row[1].to_pydatetime(), float(row[2])
+                alerts.append({
+                    "rule": rule.name,
+                    "severity": severity,
+                    "branch_id": branch_id,
+                    "date": day,
+                    "value": value,
+                    "threshold": threshold,
+                    "description": rule.description.format(branch_id=branch_id, date=day, value=value),
+                })
+    return alerts
+
+def _midnight(value) -> datetime:
+    return pd.Timestamp(value).normalize().to_pydatetime()
+
+async def _load_daily_kpis(collection, branch_id: int, first: datetime, last: datetime) -> pd.DataFrame:
+    query = {"branch_id": branch_id, "date": {"$gte": first, "$lte": last}}
+    projection = {field: 1 for field in KPI_FIELDS}
+    projection["_id"] = 0
+    docs = await collection.find(query, projection).to_list(length=None)
+    return pd.DataFrame(docs, columns=KPI_FIELDS)
+
+async def refresh_alerts(db, partitions: Iterable[Tuple[int, Any]], batch_size: int = 1000,
+                         prune: bool = False) -> Dict[str, int]:
+    """
+    Re-evaluates the alerts of the given (branch_id, day) partitions after their daily KPIs changed.
+
+    With 'prune', every alert this run did not write is deleted, which suits a full rebuild of daily_kpis.
+    Returns the number of days re-evaluated, alerts written and alerts removed.
+    """
+    rules = active_rules()
+    trailing_days = settings.ALERT_SALES_TRAILING_DAYS
+    # A day's sales are part of the trailing mean of the next trailing_days days.
+    reach = trailing_days if any(rule.name == "sales_drop" for rule in rules) else 0
+    affected: Dict[int, Set[datetime]] = {}
+    for branch_id, day in partitions:
+        day = _midnight(day)
+        affected.setdefault(int(branch_id), set()).update(day + timedelta(days=k) for k in range(reach + 1))
+    if not affected:
+        return {"evaluated": 0, "written": 0, "removed": 0}
+
+    kpis = db[DAILY_KPIS_COLLECTION]
+    frames = await asyncio.gather(*(
+        _load_daily_kpis(kpis, branch_id, min(days) - timedelta(days=reach), max(days)) for branch_id, days in affected.items()
+    ))
+    alerts = []
+    for (branch_id, days), frame in zip(affected.items(), frames):
+        alerts.extend(alert for alert in evaluate_alerts(frame, rules, trailing_days) if alert["date"] in days)
+
+    collection = db[ALERTS_COLLECTION]
+    run = uuid.uuid4().hex
+    written = 0
+    for start in range(0, len(alerts), batch_size):
+        operations = [
+            UpdateOne({"branch_id": alert["branch_id"], "date": alert["date"], "rule": alert["rule"]},
+                      {"$set": dict(alert, run=run)}, upsert=True)
+            for alert in alerts[start:start + batch_size]
+        ]
+        result = await collection.bulk_write(operations, ordered=False)
+        written += result.upserted_count + result.matched_count
+
+    removed = 0
+    if prune:
+        removed = (await collection.delete_many({"run": {"$ne": run}})).deleted_count
+    else:
+        for branch_id, days in affected.items():
+            result = await collection.delete_many({"branch_id": branch_id, "date": {"$in": sorted(days)}, "run": {"$ne": run}})
+            removed += result.deleted_count
+    if written or removed:
+        await bump_data_version(db, ALERTS_COLLECTION)
+    return {"evaluated": sum(len(days) for days in affected.values()), "written": written, "removed": removed}
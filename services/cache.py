@@ -0,0 +1,190 @@
+'''
+Result cache for the KPI endpoints with write-driven invalidation.
+
+Every write path (CSV ingestion, daily KPI loading, POST /transfers/) bumps a
+per-collection data-version counter stored in the 'data_versions' collection.
+Cached results are keyed by endpoint, request parameters and the version of the
+collection they were computed from, so a write makes older entries unreachable;
+they are purged as soon as the new version is observed.
+'''
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from pymongo import ReturnDocument
+from config import settings
+
+DATA_VERSIONS_COLLECTION = "data_versions"
+
+async def bump_data_version(db, collection_name: str) -> int:
+    """
+    Increments the data version of a collection. Call after every write to it.
+    """
+    doc = await db[DATA_VERSIONS_COLLECTION].find_one_and_update(
+        {"_id": collection_name},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    data_versions.remember(db.name, collection_name, doc["version"])
+    return doc["version"]
+
+class DataVersions:
+    """
+    Reads per-collection data versions, re-checking MongoDB at most once
+    every 'check_interval' seconds per collection.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self._versions: Dict[Tuple[str, str], Tuple[int, float]] = {}
+
+    def remember(self, db_name: str, collection_name: str, version: int):
+        self._versions[(db_name, collection_name)] = (version, time.monotonic())
+
+    async def current(self, db, collection_name: str) -> int:
+        known = self._versions.get((db.name, collection_name))
+        if known is not None and time.monotonic() - known[1] < self.check_interval:
+            return known[0]
+        doc = await db[DATA_VERSIONS_COLLECTION].find_one({"_id": collection_name})
+        version = doc["version"] if doc else 0
+        self.remember(db.name, collection_name, version)
+        return version
+
+def _estimate_size(value: Any) -> int:
+    """
+    Approximates the memory held by a cached result by its JSON size.
+    """
+    return len(json.dumps(value, default=str))
+
+class _Entry:
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+class ResultCache:
+    """
+    LRU cache with a TTL, an entry limit and a memory cap.
+
+    Keys are (endpoint, params, source, version) where 'source' identifies the
+    collection the result was computed from. Seeing a newer version for a
+    source purges every entry computed from an older one.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._source_versions: Dict[Hashable, int] = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any], source: Hashable, version: int) -> Hashable:
+        return (endpoint, tuple(sorted((k, str(v)) for k, v in params.items())), source, version)
+
+    def _remove(self, key: Hashable) -> _Entry:
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        return entry
+
+    def _observe_version(self, source: Hashable, version: int):
+        known = self._source_versions.get(source)
+        if known is not None and version > known:
+            stale = [key for key in self._entries if key[2] == source and key[3] < version]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        if known is None or version > known:
+            self._source_versions[source] = version
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def put(self, key: Hashable, value: Any):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(value, size, time.monotonic() + self.ttl_seconds)
+        self.current_bytes += size
+        while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def get_or_compute(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        source: Hashable,
+        version: int,
+        compute: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        self._observe_version(source, version)
+        key = self.make_key(endpoint, params, source, version)
+        value = self.get(key)
+        if value is None:
+            value = await compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+data_versions = DataVersions(settings.CACHE_VERSION_CHECK_SECONDS)
+result_cache = ResultCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES, settings.CACHE_TTL_SECONDS)
+
+async def cached_result(
+    collection,
+    endpoint: str,
+    params: Dict[str, Any],
+    compute: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Returns the cached result of 'compute' for this endpoint and parameters,
+    recomputing it when the collection's data version has changed.
+    """
+    if not settings.CACHE_ENABLED:
+        return await compute()
+    db = collection.database
+    version = await data_versions.current(db, collection.name)
+    source = (db.name, collection.name)
+    return await result_cache.get_or_compute(endpoint, params, source, version, compute)
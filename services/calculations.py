@@ -1,47 +1,68 @@
 from datetime import date, timedelta, datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 
+def stock_out_event(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Returns the stock-out event for a single record, or None if the record is not a stock-out.
+    """
+    if record.get('Inventory_Level', 0) == 0 and record.get('Quantity_Sold', 0) > 0:
+        return {
+            "date": record.get('Date'),
+            "product_id": record.get('Product_ID'),
+            "product_name": record.get('Product_Name'),
+            "quantity_sold_during_stock_out": record.get('Quantity_Sold')
+        }
+    return None
+
+def stock_out_mask(inventory_level, quantity_sold):
+    """
+    Vectorized stock_out_event predicate over arrays or Series: out of stock and still sold.
+    """
+    return (inventory_level == 0) & (quantity_sold > 0)
+
 def calculate_stock_outs(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Calculates stock-out events. A stock-out occurs if initial_inventory was 0 and quantity_sold was > 0.
     """
     stock_outs = []
     for record in data:
-        if record.get('Inventory_Level', 0) == 0 and record.get('Quantity_Sold', 0) > 0:
-            stock_outs.append({
-                "date": record.get('Date'),
-                "product_id": record.get('Product_ID'),
-                "product_name": record.get('Product_Name'),
-                "quantity_sold_during_stock_out": record.get('Quantity_Sold')
-            })
+        event = stock_out_event(record)
+        if event is not None:
+            stock_outs.append(event)
     return stock_outs
 
+def near_expiry_event(record: Dict[str, Any], days_threshold: int, today: datetime) -> Optional[Dict[str, Any]]:
+    """
+    Returns the near-expiry event for a single record, or None if the record does not
+    expire within 'days_threshold' days of 'today'.
+    Assumes 'Expiration_Date' is a datetime, as stored by ingestion.
+    """
+    exp_date = record.get('Expiration_Date')
+    if not isinstance(exp_date, datetime):
+        return None
+
+    if exp_date - today <= timedelta(days=days_threshold) and exp_date >= today:
+        return {
+            "date": record.get('Date'),
+            "product_id": str(record.get('Product_ID')),
+            "product_name": record.get('Product_Name'),
+            "expiration_date": record.get('Expiration_Date'),
+            "days_to_expiry": (exp_date - today).days
+        }
+    return None
+
 def calculate_near_expiries(data: List[Dict[str, Any]], days_threshold: int = 30) -> List[Dict[str, Any]]:
     """
     Identifies products near expiry within a given threshold (default 30 days).
-    Assumes 'Expiration_Date' is a string in ISO format or a datetime object.
+    Assumes 'Expiration_Date' is a datetime, as stored by ingestion.
     """
     near_expiries = []
     today = datetime.today()
     for record in data:
-        exp_date_val = record.get('Expiration_Date')
-        if exp_date_val:
-            if isinstance(exp_date_val, str):
-                exp_date = datetime.fromisoformat(exp_date_val.split('T')[0]) # Handle potential time part
-            elif isinstance(exp_date_val, datetime):
-                exp_date = exp_date_val
-            else:
-                continue # Skip if not string or datetime
-
-            if exp_date - today <= timedelta(days=days_threshold) and exp_date >= today:
-                near_expiries.append({
-                    "date": record.get('Date'),
-                    "product_id": str(record.get('Product_ID')),
-                    "product_name": record.get('Product_Name'),
-                    "expiration_date": record.get('Expiration_Date'),
-                    "days_to_expiry": (exp_date - today).days
-                })
+        event = near_expiry_event(record, days_threshold, today)
+        if event is not None:
+            near_expiries.append(event)
     return near_expiries
 
 def calculate_top_sellers(data: List[Dict[str, Any]], top_n: int = 5) -> List[Dict[str, Any]]:
@@ -49,20 +70,21 @@ def calculate_top_sellers(data: List[Dict[str, Any]], top_n: int = 5) -> List[Di
     Identifies top selling products by total sales value.
     """
     product_sales = defaultdict(float)
+    product_names = {}
     for record in data:
         product_id = record.get('Product_ID')
         sales_value = record.get('Quantity_Sold', 0) * record.get('Price', 0)
         if product_id:
             product_sales[product_id] += sales_value
+            # Remember the first name seen for each product instead of rescanning the data later
+            product_names.setdefault(product_id, record.get('Product_Name'))
 
     sorted_products = sorted(product_sales.items(), key=lambda item: item[1], reverse=True)
     top_sellers = []
     for prod_id, total_sales in sorted_products[:top_n]:
-        # Find product name for the top seller
-        product_name = next((item['Product_Name'] for item in data if item['Product_ID'] == prod_id), "Unknown")
         top_sellers.append({
             "product_id": prod_id,
-            "product_name": product_name,
+            "product_name": product_names.get(prod_id) or "Unknown",
             "total_sales_value": total_sales
         })
     return top_sellers
@@ -231,6 +253,86 @@ def calculate_service_level_by_branch(data: List[Dict[str, Any]]) -> Dict[str, f
             
     return service_level
 
+def calculate_branch_metrics(data: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    Computes sales, inventory turns and service level for each branch in a single pass.
+    Equivalent to calculate_sales_by_branch, calculate_inventory_turns_by_branch and
+    calculate_service_level_by_branch, which each scan the data separately.
+    """
+    sales_by_branch = defaultdict(float)
+    inventory_by_branch = defaultdict(float)
+    total_orders_by_branch = defaultdict(int)
+    stock_outs_by_branch = defaultdict(int)
+
+    for record in data:
+        branch_id = record.get('branch_id')
+        if branch_id is None:
+            continue
+        quantity_sold = record.get('Quantity_Sold', 0)
+        inventory_level = record.get('Inventory_Level', 0)
+        sales_by_branch[branch_id] += quantity_sold * record.get('Price', 0)
+        inventory_by_branch[branch_id] += inventory_level
+        total_orders_by_branch[branch_id] += quantity_sold
+        if inventory_level == 0 and quantity_sold > 0:
+            stock_outs_by_branch[branch_id] += quantity_sold
+
+    inventory_turns = {}
+    service_level = {}
+    for branch_id, sales in sales_by_branch.items():
+        avg_inventory = inventory_by_branch[branch_id]
+        inventory_turns[branch_id] = sales / avg_inventory if avg_inventory > 0 else 0
+        total_orders = total_orders_by_branch[branch_id]
+        if total_orders > 0:
+            service_level[branch_id] = (total_orders - stock_outs_by_branch.get(branch_id, 0)) / total_orders
+        else:
+            service_level[branch_id] = 1.0  # Perfect service level if no orders
+
+    return {
+        "sales_by_branch": dict(sales_by_branch),
+        "inventory_turns_by_branch": inventory_turns,
+        "service_level_by_branch": service_level,
+    }
+
+def calculate_kpi_summary(data: List[Dict[str, Any]], top_n: int = 5) -> Dict[str, Any]:
+    """
+    Computes the headline KPIs in a single pass: total sales value, Rx volume,
+    cash reconciliation, stock-out count and top sellers by sales value.
+    """
+    total_sales = 0
+    total_cash_received = 0
+    total_rx_volume = 0
+    stock_out_count = 0
+    product_sales = defaultdict(float)
+    product_names = {}
+
+    for record in data:
+        quantity_sold = record.get('Quantity_Sold', 0)
+        sales_value = quantity_sold * record.get('Price', 0)
+        total_sales += sales_value
+        total_cash_received += record.get('Cash_Received', 0)
+        if record.get('Category') == 'Rx':
+            total_rx_volume += quantity_sold
+        if record.get('Inventory_Level', 0) == 0 and quantity_sold > 0:
+            stock_out_count += 1
+        product_id = record.get('Product_ID')
+        if product_id:
+            product_sales[product_id] += sales_value
+            product_names.setdefault(product_id, record.get('Product_Name'))
+
+    sorted_products = sorted(product_sales.items(), key=lambda item: item[1], reverse=True)
+    top_sellers = [
+        {"product_id": prod_id, "product_name": product_names[prod_id] or "Unknown", "total_sales_value": total}
+        for prod_id, total in sorted_products[:top_n]
+    ]
+    return {
+        "total_sales_value": total_sales,
+        "total_rx_volume": total_rx_volume,
+        "total_cash_received": total_cash_received,
+        "discrepancy": total_sales - total_cash_received,
+        "stock_out_count": stock_out_count,
+        "top_sellers": top_sellers,
+    }
+
 def calculate_transfer_volume_by_branch(transfers_data: List[Dict[str, Any]]) -> Dict[str, int]:
     """
     Calculates the total transfer volume (number of units) for each branch.
@@ -261,4 +363,38 @@ def calculate_transfer_value_by_branch(transfers_data: List[Dict[str, Any]]) ->
             transfer_value[from_branch] -= value
         if to_branch is not None:
             transfer_value[to_branch] += value
-    return dict(transfer_value)
\ No newline at end of file
+    return dict(transfer_value)
+
+# Fields each calculation reads from a kpi_data (or transfers) document.
+# Routers pass these to MongoDB as a projection so unused fields never leave the server.
+CALCULATION_FIELDS = {
+    stock_out_event: ('Date', 'Product_ID', 'Product_Name', 'Inventory_Level', 'Quantity_Sold'),
+    calculate_stock_outs: ('Date', 'Product_ID', 'Product_Name', 'Inventory_Level', 'Quantity_Sold'),
+    near_expiry_event: ('Date', 'Product_ID', 'Product_Name', 'Expiration_Date'),
+    calculate_near_expiries: ('Date', 'Product_ID', 'Product_Name', 'Expiration_Date'),
+    calculate_top_sellers: ('Product_ID', 'Product_Name', 'Quantity_Sold', 'Price'),
+    calculate_rx_volume: ('Category', 'Quantity_Sold'),
+    calculate_total_sales_value: ('Quantity_Sold', 'Price'),
+    calculate_cash_reconciliation: ('Quantity_Sold', 'Price', 'Cash_Received'),
+    calculate_inventory_levels: ('Product_ID', 'Product_Name', 'Inventory_Level', 'Quantity_Sold'),
+    calculate_stock_status: ('Product_ID', 'Product_Name', 'Inventory_Level', 'Quantity_Sold'),
+    calculate_sales_by_branch: ('branch_id', 'Quantity_Sold', 'Price'),
+    calculate_inventory_turns_by_branch: ('branch_id', 'Quantity_Sold', 'Price', 'Inventory_Level'),
+    calculate_service_level_by_branch: ('branch_id', 'Quantity_Sold', 'Inventory_Level'),
+    calculate_branch_metrics: ('branch_id', 'Quantity_Sold', 'Price', 'Inventory_Level'),
+    calculate_kpi_summary: ('Product_ID', 'Product_Name', 'Category', 'Inventory_Level', 'Quantity_Sold', 'Price', 'Cash_Received'),
+    calculate_transfer_volume_by_branch: ('from_branch', 'to_branch', 'quantity'),
+    calculate_transfer_value_by_branch: ('from_branch', 'to_branch', 'quantity', 'cost'),
+}
+
+def projection_for(*calculations, exclude: Tuple[str, ...] = ()) -> Dict[str, int]:
+    """
+    Builds a MongoDB projection covering the fields needed by the given calculations.
+    Fields in 'exclude' are left out, e.g. names that are joined from the dimension catalog instead.
+    """
+    projection = {"_id": 0}
+    for calculation in calculations:
+        for field in CALCULATION_FIELDS[calculation]:
+            if field not in exclude:
+                projection[field] = 1
+    return projection
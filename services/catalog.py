@@ -0,0 +1,165 @@
+'''
+In-memory product and branch dimension catalog.
+
+The catalog maps Product_ID to name, category and price band, and branch_id to
+its branch record. It is loaded once per process from the 'products' and
+'branches' collections written at ingestion (or derived from kpi_data when those
+do not exist yet), cached, and reloaded when the kpi_data data version changes.
+Routers project Product_Name away from their queries and join names back in O(1).
+'''
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
+import pandas as pd
+from pymongo import UpdateOne
+from config import settings
+from services.cache import data_versions
+
+PRODUCTS_COLLECTION = "products"
+BRANCHES_COLLECTION = "branches"
+UNKNOWN_PRODUCT_NAME = "Unknown"
+
+# Fields stored in the dimension collections; routers can drop them from fact projections.
+CATALOG_FIELDS = ('Product_Name',)
+
+# Upper bounds of the average unit price for each band; anything above the last is "high".
+PRICE_BANDS = [(10.0, "low"), (30.0, "medium")]
+
+def price_band(average_price: Optional[float]) -> Optional[str]:
+    if average_price is None:
+        return None
+    for upper_bound, band in PRICE_BANDS:
+        if average_price < upper_bound:
+            return band
+    return "high"
+
+class DimensionCatalog:
+    """
+    Product and branch dimensions keyed by ID.
+    """
+
+    def __init__(self, products: Iterable[Dict[str, Any]] = (), branches: Iterable[Dict[str, Any]] = (), version: int = 0):
+        self.products: Dict[Any, Dict[str, Any]] = {product["product_id"]: product for product in products}
+        self.branches: Dict[Any, Dict[str, Any]] = {branch["branch_id"]: branch for branch in branches}
+        self.version = version
+        # Some results carry product IDs as strings (e.g. near-expiries), so index those too.
+        self._products_by_str = {str(product_id): product for product_id, product in self.products.items()}
+
+    def product(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        product = self.products.get(product_id)
+        if product is None and product_id is not None:
+            product = self._products_by_str.get(str(product_id))
+        return product
+
+    def product_name(self, product_id: Any, default: Optional[str] = None) -> Optional[str]:
+        product = self.product(product_id)
+        return product["product_name"] if product else default
+
+    def category(self, product_id: Any, default: Optional[str] = None) -> Optional[str]:
+        product = self.product(product_id)
+        return product["category"] if product else default
+
+    def product_ids_in_category(self, category: str) -> List[Any]:
+        return [product_id for product_id, product in self.products.items() if product["category"] == category]
+
+    def attach_product_names(self, items: Iterable[Dict[str, Any]]) -> None:
+        """
+        Fills 'product_name' on result items from the catalog. Items whose product
+        is unknown keep whatever name they already have, or get "Unknown" as
+        calculate_top_sellers does, since the response models require a name.
+        """
+        for item in items:
+            item["product_name"] = self.product_name(item.get("product_id"), item.get("product_name")) or UNKNOWN_PRODUCT_NAME
+
+async def _load_products(db) -> List[Dict[str, Any]]:
+    docs = await db[PRODUCTS_COLLECTION].find({}).to_list(length=None)
+    if docs:
+        return [
+            {
+                "product_id": doc["_id"],
+                "product_name": doc.get("Product_Name"),
+                "category": doc.get("Category"),
+                "price_band": doc.get("price_band"),
+            }
+            for doc in docs
+        ]
+    # Collections ingested before the catalog existed: derive the dimension from the facts.
+    pipeline = [
+        {"$group": {
+            "_id": "$Product_ID",
+            "Product_Name": {"$first": "$Product_Name"},
+            "Category": {"$first": "$Category"},
+            "average_price": {"$avg": "$Price"},
+        }},
+    ]
+    docs = await db[settings.COLLECTION_NAME].aggregate(pipeline).to_list(length=None)
+    return [
+        {
+            "product_id": doc["_id"],
+            "product_name": doc.get("Product_Name"),
+            "category": doc.get("Category"),
+            "price_band": price_band(doc.get("average_price")),
+        }
+        for doc in docs
+        if doc["_id"] is not None
+    ]
+
+async def _load_branches(db) -> List[Dict[str, Any]]:
+    docs = await db[BRANCHES_COLLECTION].find({}).to_list(length=None)
+    if docs:
+        return [{"branch_id": doc["_id"], "branch_name": doc.get("branch_name")} for doc in docs]
+    branch_ids = await db[settings.COLLECTION_NAME].distinct("branch_id")
+    return [{"branch_id": branch_id, "branch_name": f"Branch {branch_id}"} for branch_id in branch_ids if branch_id is not None]
+
+async def load_catalog(db, version: int = 0) -> DimensionCatalog:
+    products, branches = await asyncio.gather(_load_products(db), _load_branches(db))
+    return DimensionCatalog(products, branches, version)
+
+_catalogs: Dict[str, DimensionCatalog] = {}
+
+async def get_catalog(db) -> DimensionCatalog:
+    """
+    Returns the process-wide catalog for this database, reloading it when the
+    kpi_data data version has changed since it was loaded.
+    """
+    version = await data_versions.current(db, settings.COLLECTION_NAME)
+    catalog = _catalogs.get(db.name)
+    if catalog is None or catalog.version != version:
+        catalog = await load_catalog(db, version)
+        _catalogs[db.name] = catalog
+    return catalog
+
+def build_dimensions(df: pd.DataFrame):
+    """
+    Extracts product and branch dimension documents from a preprocessed kpi_data DataFrame.
+    """
+    products = (
+        df.groupby('Product_ID', sort=False)
+        .agg(Product_Name=('Product_Name', 'first'), Category=('Category', 'first'), average_price=('Price', 'mean'))
+        .reset_index()
+    )
+    product_docs = [
+        {
+            "_id": row.Product_ID,
+            "Product_Name": row.Product_Name,
+            "Category": row.Category,
+            "price_band": price_band(row.average_price),
+        }
+        for row in products.itertuples(index=False)
+    ]
+    branch_docs = [
+        {"_id": branch_id, "branch_name": f"Branch {branch_id}"}
+        for branch_id in df['branch_id'].dropna().unique().tolist()
+    ]
+    return product_docs, branch_docs
+
+async def write_dimensions(db, df: pd.DataFrame) -> None:
+    """
+    Upserts the product and branch dimensions found in 'df'.
+    """
+    product_docs, branch_docs = build_dimensions(df)
+    if product_docs:
+        await db[PRODUCTS_COLLECTION].bulk_write(
+            [UpdateOne({"_id": doc.pop("_id")}, {"$set": doc}, upsert=True) for doc in product_docs], ordered=False)
+    if branch_docs:
+        await db[BRANCHES_COLLECTION].bulk_write(
+            [UpdateOne({"_id": doc.pop("_id")}, {"$setOnInsert": doc}, upsert=True) for doc in branch_docs], ordered=False)
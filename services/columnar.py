@@ -0,0 +1,255 @@
+'''
+Columnar NumPy engine for the KPI calculations.
+
+ColumnarKPIData holds kpi_data records as typed NumPy arrays instead of a list
+of dicts. Its methods are vectorized equivalents of the functions in
+services/calculations.py, which remain the reference implementation and define
+the expected output (including the ordering of products and branches).
+'''
+from typing import List, Dict, Any, Optional, Mapping, Sequence
+from itertools import repeat
+import numpy as np
+import pandas as pd
+from services.calculations import stock_out_mask
+
+KPI_COLUMNS = [
+    'Date', 'Product_ID', 'Product_Name', 'Category', 'Quantity_Sold',
+    'Price', 'Inventory_Level', 'Cash_Received', 'branch_id',
+]
+
+def _factorize(values) -> tuple:
+    """
+    Encodes values as int codes in first-appearance order. Missing values get -1.
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object), use_na_sentinel=True)
+    return codes.astype(np.int64), np.asarray(uniques, dtype=object)
+
+def _date_column(values) -> np.ndarray:
+    """
+    Converts values (datetimes or ISO strings) to datetime64[ns]. Dates repeat
+    heavily across rows, so only the distinct values are parsed.
+    """
+    codes, uniques = _factorize(values)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype=object), format="ISO8601").to_numpy(dtype="datetime64[ns]")
+    parsed = np.append(parsed, np.datetime64("NaT", "ns"))
+    return parsed[codes]
+
+def _float_column(values) -> np.ndarray:
+    """
+    Converts values to float64, treating missing or non-numeric entries as 0.
+    """
+    try:
+        column = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+    return np.nan_to_num(column, nan=0.0)
+
+def _first_index(codes: np.ndarray, size: int) -> np.ndarray:
+    """
+    Returns, for every code in range(size), the row index where it first appears.
+    """
+    valid = codes >= 0
+    uniq, idx = np.unique(codes[valid], return_index=True)
+    first = np.full(size, -1, dtype=np.int64)
+    first[uniq] = np.flatnonzero(valid)[idx]
+    return first
+
+def _first_appearance(codes: np.ndarray, size: int) -> np.ndarray:
+    """
+    Same as _first_index for codes produced by _factorize, in O(n): codes are
+    numbered in first-appearance order, so their running maximum steps up
+    exactly at each code's first row.
+    """
+    running_max = np.maximum.accumulate(np.concatenate(([-1], codes)))
+    first = np.full(size, -1, dtype=np.int64)
+    steps = np.flatnonzero(running_max[1:] > running_max[:-1])
+    first[running_max[1:][steps]] = steps
+    return first
+
+def _last_index(codes: np.ndarray, size: int) -> np.ndarray:
+    """
+    Returns, for every code in range(size), the row index where it last appears.
+    """
+    reversed_first = _first_index(codes[::-1], size)
+    last = np.full(size, -1, dtype=np.int64)
+    seen = reversed_first >= 0
+    last[seen] = len(codes) - 1 - reversed_first[seen]
+    return last
+
+class ColumnarKPIData:
+    """
+    Typed column store for kpi_data records.
+
+    - date: datetime64[ns]
+    - product_codes / branch_codes / category_codes: int64 codes into
+      product_ids / branch_ids / categories (first-appearance order, -1 = missing)
+    - quantity_sold, price, inventory_level, cash_received: float64
+    """
+
+    def __init__(self, columns: Mapping[str, Sequence[Any]]):
+        """
+        Builds the column store from a mapping of column name to values,
+        e.g. a pandas DataFrame or a dict of lists.
+        """
+        self.size = len(next(iter(columns.values()))) if len(columns) else 0
+        missing = [None] * self.size
+
+        def column(name: str):
+            return columns[name] if name in columns else missing
+
+        self.date = _date_column(column("Date"))
+        self.product_codes, self.product_ids = _factorize(column("Product_ID"))
+        self.name_codes, self.product_names = _factorize(column("Product_Name"))
+        self.branch_codes, self.branch_ids = _factorize(column("branch_id"))
+        self.category_codes, self.categories = _factorize(column("Category"))
+        self.quantity_sold = _float_column(column("Quantity_Sold"))
+        self.price = _float_column(column("Price"))
+        self.inventory_level = _float_column(column("Inventory_Level"))
+        self.cash_received = _float_column(column("Cash_Received"))
+        # Quantities are held as float64; report them as ints when the source was integral.
+        self._integral_quantities = bool(np.all(np.mod(self.quantity_sold, 1) == 0)) and bool(
+            np.all(np.mod(self.inventory_level, 1) == 0)
+        )
+        self.sales_value = self.quantity_sold * self.price
+        self.stock_out_mask = stock_out_mask(self.inventory_level, self.quantity_sold)
+
+    @classmethod
+    def from_records(cls, data: List[Dict[str, Any]]) -> "ColumnarKPIData":
+        """
+        Builds the column store from a list of MongoDB documents.
+        """
+        return cls({name: list(map(dict.get, data, repeat(name))) for name in KPI_COLUMNS})
+
+    def _quantity(self, value):
+        return int(value) if self._integral_quantities else float(value)
+
+    def _category_code(self, category: str) -> Optional[int]:
+        matches = np.flatnonzero(self.categories == category)
+        return int(matches[0]) if matches.size else None
+
+    def _name(self, row: int):
+        code = self.name_codes[row]
+        return self.product_names[code] if code >= 0 else None
+
+    def _by_product(self, weights: np.ndarray) -> np.ndarray:
+        valid = self.product_codes >= 0
+        return np.bincount(self.product_codes[valid], weights=weights[valid], minlength=len(self.product_ids))
+
+    def _listed_product_codes(self) -> np.ndarray:
+        # The per-product calculations skip rows whose Product_ID is falsy (missing, 0 or "").
+        return np.flatnonzero([bool(product_id) for product_id in self.product_ids])
+
+    def _by_branch(self, weights: np.ndarray) -> np.ndarray:
+        valid = self.branch_codes >= 0
+        return np.bincount(self.branch_codes[valid], weights=weights[valid], minlength=len(self.branch_ids))
+
+    def _branch_key(self, code: int):
+        branch_id = self.branch_ids[code]
+        return branch_id.item() if isinstance(branch_id, np.generic) else branch_id
+
+    def stock_outs(self) -> List[Dict[str, Any]]:
+        """
+        Vectorized equivalent of calculate_stock_outs.
+        """
+        rows = np.flatnonzero(self.stock_out_mask)
+        dates = self.date[rows].astype("datetime64[us]").tolist()
+        return [
+            {
+                "date": dates[i],
+                "product_id": self.product_ids[self.product_codes[row]] if self.product_codes[row] >= 0 else None,
+                "product_name": self._name(row),
+                "quantity_sold_during_stock_out": self._quantity(self.quantity_sold[row]),
+            }
+            for i, row in enumerate(rows)
+        ]
+
+    def top_sellers(self, top_n: int = 5) -> List[Dict[str, Any]]:
+        """
+        Vectorized equivalent of calculate_top_sellers.
+        """
+        sales = self._by_product(self.sales_value)
+        codes = self._listed_product_codes()
+        order = codes[np.argsort(-sales[codes], kind="stable")][:top_n]
+        first = _first_appearance(self.product_codes, len(self.product_ids))
+        return [
+            {
+                "product_id": self.product_ids[code],
+                "product_name": self._name(first[code]) or "Unknown",
+                "total_sales_value": float(sales[code]),
+            }
+            for code in order
+        ]
+
+    def rx_volume(self) -> Dict[str, Any]:
+        """
+        Vectorized equivalent of calculate_rx_volume.
+        """
+        rx_code = self._category_code("Rx")
+        if rx_code is None:
+            return {"total_rx_volume": 0}
+        total = self.quantity_sold[self.category_codes == rx_code].sum()
+        return {"total_rx_volume": self._quantity(total)}
+
+    def total_sales_value(self) -> Dict[str, Any]:
+        """
+        Vectorized equivalent of calculate_total_sales_value.
+        """
+        return {"total_sales_value": float(self.sales_value.sum())}
+
+    def cash_reconciliation(self) -> Dict[str, Any]:
+        """
+        Vectorized equivalent of calculate_cash_reconciliation.
+        """
+        total_sales = float(self.sales_value.sum())
+        total_cash_received = float(self.cash_received.sum())
+        return {
+            "total_sales_value": total_sales,
+            "total_cash_received": total_cash_received,
+            "discrepancy": total_sales - total_cash_received,
+        }
+
+    def inventory_levels(self) -> List[Dict[str, Any]]:
+        """
+        Vectorized equivalent of calculate_inventory_levels: the last seen
+        Inventory_Level per product minus the total quantity sold.
+        """
+        size = len(self.product_ids)
+        last = _last_index(self.product_codes, size)
+        sold = self._by_product(self.quantity_sold)
+        result = []
+        for code in self._listed_product_codes():
+            row = last[code]
+            initial_inventory = self.inventory_level[row]
+            result.append({
+                "product_id": self.product_ids[code],
+                "product_name": self._name(row),
+                "initial_inventory": self._quantity(initial_inventory),
+                "quantity_sold_total": self._quantity(sold[code]),
+                "current_inventory": self._quantity(initial_inventory - sold[code]),
+            })
+        return result
+
+    def sales_by_branch(self) -> Dict[Any, float]:
+        """
+        Vectorized equivalent of calculate_sales_by_branch.
+        """
+        sales = self._by_branch(self.sales_value)
+        return {self._branch_key(code): float(sales[code]) for code in range(len(self.branch_ids))}
+
+    def inventory_turns_by_branch(self) -> Dict[Any, float]:
+        """
+        Vectorized equivalent of calculate_inventory_turns_by_branch.
+        """
+        cogs = self._by_branch(self.sales_value)
+        inventory = self._by_branch(self.inventory_level)
+        turns = np.divide(cogs, inventory, out=np.zeros_like(cogs), where=inventory > 0)
+        return {self._branch_key(code): float(turns[code]) for code in range(len(self.branch_ids))}
+
+    def service_level_by_branch(self) -> Dict[Any, float]:
+        """
+        Vectorized equivalent of calculate_service_level_by_branch.
+        """
+        orders = self._by_branch(self.quantity_sold)
+        stock_outs = self._by_branch(np.where(self.stock_out_mask, self.quantity_sold, 0.0))
+        level = np.divide(orders - stock_outs, orders, out=np.ones_like(orders), where=orders > 0)
+        return {self._branch_key(code): float(level[code]) for code in range(len(self.branch_ids))}
@@ -0,0 +1,105 @@
+'''
+Vectorized computation and bulk upsert of DailyKPI documents.
+
+All per-(branch_id, Date) KPIs are computed in a single groupby pass over the
+raw KPI DataFrame, and written with batched, unordered bulk_write upserts keyed
+on (branch_id, date) so readers never see an empty collection mid-rebuild.
+'''
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from pymongo import UpdateOne
+
+DAILY_KPIS_COLLECTION = "daily_kpis"
+GROUP_KEYS = ['branch_id', 'Date']
+TOP_SELLERS_PER_DAY = 3
+NEAR_EXPIRY_DAYS = 30
+
+def compute_daily_kpis(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    '''
+    Computes one DailyKPI document per (branch_id, Date) in 'df'.
+
+    Args:
+        df (pd.DataFrame): Raw KPI rows with parsed 'Date' and 'Expiration_Date' columns.
+    '''
+    if df.empty:
+        return []
+
+    flags = pd.DataFrame({
+        'branch_id': df['branch_id'],
+        'Date': df['Date'],
+        'stockouts': (df['Inventory_Level'] == 0).astype('int64'),
+        'near_expiries': (df['Expiration_Date'] <= df['Date'] + timedelta(days=NEAR_EXPIRY_DAYS)).astype('int64'),
+        'rx_volume': df['Quantity_Sold'].where(df['Category'] == 'Rx', 0),
+        'sales': df['Sales_Value'],
+        'cash': df['Cash_Received'],
+    })
+    totals = flags.groupby(GROUP_KEYS, sort=True).sum()
+
+    # Top sellers per group: equivalent to nlargest(3, 'Quantity_Sold') inside each group
+    # (ties keep the earlier row), done as one stable sort plus groupby().head().
+    top = (
+        df.sort_values(GROUP_KEYS + ['Quantity_Sold'], ascending=[True, True, False], kind='stable')
+        .groupby(GROUP_KEYS, sort=False)
+        .head(TOP_SELLERS_PER_DAY)
+    )
+    top_sellers: Dict[tuple, List[Dict[str, Any]]] = {}
+    top_inventory: Dict[tuple, List[Dict[str, Any]]] = {}
+    for branch_id, date, name, quantity_sold, inventory_level in zip(
+        top['branch_id'], top['Date'], top['Product_Name'], top['Quantity_Sold'], top['Inventory_Level']
+    ):
+        key = (branch_id, date)
+        top_sellers.setdefault(key, []).append({'Product_Name': name, 'Quantity_Sold': int(quantity_sold)})
+        top_inventory.setdefault(key, []).append({'Product_Name': name, 'Inventory_Level': int(inventory_level)})
+
+    docs = []
+    for (branch_id, date), row in zip(totals.index, totals.itertuples(index=False)):
+        total_sales = float(row.sales)
+        rx_volume = int(row.rx_volume)
+        description = (
+            f"Daily KPI report for {date.strftime('%Y-%m-%d')}. "
+            f"Total sales: ${total_sales:.2f}, Rx volume: {rx_volume} units, "
+            f"Stockouts: {int(row.stockouts)} products, Near expiries: {int(row.near_expiries)} products."
+        )
+        docs.append({
+            'date': date.to_pydatetime(),
+            'total_stockouts': int(row.stockouts),
+            'total_near_expiries': int(row.near_expiries),
+            'top_sellers': top_sellers.get((branch_id, date), []),
+            'total_rx_volume': rx_volume,
+            'total_sales_value': total_sales,
+            'total_cash_reconciliation': float(row.cash) - total_sales,
+            'inventory_levels_top_sellers': top_inventory.get((branch_id, date), []),
+            'branch_id': int(branch_id),
+            'description': description,
+        })
+    return docs
+
+async def upsert_daily_kpis(collection, docs: List[Dict[str, Any]], batch_size: int = 1000,
+                            prune_run: Optional[str] = None) -> int:
+    '''
+    Upserts DailyKPI documents on (branch_id, date) in unordered bulk batches.
+
+    If 'prune_run' is given, every written document is tagged with it and documents
+    not written by this run are deleted afterwards, turning the upsert into a full
+    rebuild without ever emptying the collection. Every written document gets an
+    'updated_at' stamp, which lets services/trends.py pick up changes incrementally.
+    '''
+    written = 0
+    updated_at = datetime.now(timezone.utc)
+    for start in range(0, len(docs), batch_size):
+        operations = []
+        for doc in docs[start:start + batch_size]:
+            update = dict(doc, updated_at=updated_at)
+            if prune_run is not None:
+                update['rebuild_id'] = prune_run
+            operations.append(UpdateOne({'branch_id': doc['branch_id'], 'date': doc['date']}, {'$set': update}, upsert=True))
+        result = await collection.bulk_write(operations, ordered=False)
+        written += result.upserted_count + result.matched_count
+    if prune_run is not None:
+        await collection.delete_many({'rebuild_id': {'$ne': prune_run}})
+    return written
+
+def new_rebuild_id() -> str:
+    return uuid.uuid4().hex
@@ -1,11 +1,13 @@
 import pandas as pd
 from datetime import datetime
 
+INTEGER_COLS = ['Product_ID', 'Quantity_Sold', 'Inventory_Level', 'branch_id']
+
 def preprocess_kpi_data(df: pd.DataFrame) -> pd.DataFrame:
     """
     Preprocesses the raw KPI data DataFrame.
     - Converts 'date' and 'expiration_date' columns to datetime objects.
-    - Ensures numerical columns are of the correct type.
+    - Ensures numerical columns are of the correct type, with counts and IDs as integers.
     """
     df['Date'] = pd.to_datetime(df['Date'])
     df['Expiration_Date'] = pd.to_datetime(df['Expiration_Date'])
@@ -15,17 +17,24 @@ def preprocess_kpi_data(df: pd.DataFrame) -> pd.DataFrame:
     for col in numerical_cols:
         df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0) # Coerce errors to NaN, then fill NaN with 0
 
+    # Counts and IDs are whole numbers; store them as integers rather than doubles
+    # (columns with missing values stay as they are)
+    for col in INTEGER_COLS:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]) and df[col].notna().all():
+            df[col] = df[col].astype('int64')
+
     return df
 
 def convert_df_to_docs(df: pd.DataFrame) -> list[dict]:
     """
     Converts a pandas DataFrame to a list of dictionaries, suitable for MongoDB insertion.
-    Ensures date fields are in ISO format.
+    Date fields become datetime objects, stored as native BSON dates so that range
+    queries can use indexes. Python ints that fit in 32 bits are encoded as BSON int32.
     """
     records = df.to_dict(orient='records')
     for record in records:
         if isinstance(record.get('Date'), pd.Timestamp):
-            record['Date'] = record['Date'].isoformat()
+            record['Date'] = record['Date'].to_pydatetime()
         if isinstance(record.get('Expiration_Date'), pd.Timestamp):
-            record['Expiration_Date'] = record['Expiration_Date'].isoformat()
+            record['Expiration_Date'] = record['Expiration_Date'].to_pydatetime()
     return records
@@ -0,0 +1,98 @@
+'''
+Worker pool for CPU-bound KPI calculations.
+
+The functions in services/calculations.py are synchronous and can take seconds
+on a large result set. Called directly in an async handler, they block the event
+loop, and every other request, even GET / or POST /transfers/, waits until the
+calculation has finished. offload() runs them on a worker pool instead:
+
+    thread   (default) a ThreadPoolExecutor. No copying, and the event loop still
+             gets the GIL between bytecode slices, so light requests keep flowing.
+    process  a ProcessPoolExecutor. Calculations run truly in parallel, but every
+             input is pickled to the worker, so it only pays off when the
+             calculation costs much more than copying its input.
+    inline   no pool; calculations run on the event loop as before.
+
+Inputs smaller than CALCULATION_OFFLOAD_MIN_ROWS run inline, because handing
+them to a worker costs more than the calculation itself.
+
+Per calculation, /metrics reports the time a job waited for a free worker and
+the time it ran. It also reports the number of jobs in flight and how many of
+those are queued behind busy workers.
+'''
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sized, Tuple
+from config import settings
+from services.metrics import REGISTRY, Gauge, Histogram, LATENCY_BUCKETS
+
+EXECUTOR_KINDS = ("thread", "process", "inline")
+
+calculation_wait = Histogram("kpi_calculation_wait_seconds", "Time a calculation waited for a free worker.",
+                             ["calculation"], LATENCY_BUCKETS)
+calculation_run = Histogram("kpi_calculation_run_seconds", "Time a calculation ran on a worker.",
+                            ["calculation"], LATENCY_BUCKETS)
+calculations_in_flight = Gauge("kpi_calculations_in_flight", "Calculations submitted to the pool and not finished.", [])
+calculation_queue_depth = Gauge("kpi_calculation_queue_depth", "Calculations waiting for a free worker.", [])
+REGISTRY.extend([calculation_wait, calculation_run, calculations_in_flight, calculation_queue_depth])
+
+_executor: Optional[Executor] = None
+
+def worker_count() -> int:
+    return settings.CALCULATION_WORKERS or min(32, (os.cpu_count() or 1) + 4)
+
+def get_executor() -> Optional[Executor]:
+    """
+    The process-wide calculation pool, created on first use. None in inline mode.
+    """
+    global _executor
+    kind = settings.CALCULATION_EXECUTOR
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError(f"CALCULATION_EXECUTOR must be one of: {', '.join(EXECUTOR_KINDS)}")
+    if kind == "inline":
+        return None
+    if _executor is None:
+        if kind == "process":
+            _executor = ProcessPoolExecutor(max_workers=worker_count())
+        else:
+            _executor = ThreadPoolExecutor(max_workers=worker_count(), thread_name_prefix="kpi-calculation")
+    return _executor
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _timed_call(calculation: Callable[..., Any], data: Any, args: Tuple[Any, ...]) -> Tuple[Any, float, float]:
+    # Runs in the worker. Wall-clock time, because it is compared across processes.
+    started = time.time()
+    result = calculation(data, *args)
+    return result, started, time.time()
+
+def _update_queue_gauges(change: int):
+    calculations_in_flight.add(change)
+    queued = max(0, calculations_in_flight.value() - worker_count())
+    calculation_queue_depth.add(queued - calculation_queue_depth.value())
+
+async def offload(calculation: Callable[..., Any], data: Any, *args: Any) -> Any:
+    """
+    Returns calculation(data, *args), computed on the worker pool unless 'data' is small.
+    """
+    executor = get_executor()
+    if executor is None or (isinstance(data, Sized) and len(data) < settings.CALCULATION_OFFLOAD_MIN_ROWS):
+        return calculation(data, *args)
+
+    name = getattr(calculation, "__name__", "calculation")
+    submitted = time.time()
+    _update_queue_gauges(1)
+    try:
+        result, started, finished = await asyncio.get_running_loop().run_in_executor(
+            executor, _timed_call, calculation, data, args)
+    finally:
+        _update_queue_gauges(-1)
+    calculation_wait.observe(max(0.0, started - submitted), name)
+    calculation_run.observe(finished - started, name)
+    return result
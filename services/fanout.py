@@ -0,0 +1,56 @@
+'''
+Scatter-gather over the shared Motor connection pool.
+
+A query spanning many branches is split into one shard per branch. Each shard
+runs as its own MongoDB operation, and all shards are issued concurrently with
+asyncio.gather. The partial results are then merged by the caller. Each shard
+is a narrow (branch_id, Date) index range, so the wall-clock latency tracks the
+slowest branch rather than the sum of all of them. A semaphore caps the number
+of shards in flight (FANOUT_CONCURRENCY), so one request cannot take over the
+whole connection pool.
+'''
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+from config import settings
+from services.catalog import get_catalog
+
+ShardT = TypeVar("ShardT")
+ResultT = TypeVar("ResultT")
+
+async def scatter_gather(shards: Sequence[ShardT], fetch: Callable[[ShardT], Awaitable[ResultT]],
+                         concurrency: Optional[int] = None) -> List[ResultT]:
+    """
+    Runs fetch(shard) for every shard, at most 'concurrency' at a time, and returns the results in shard order.
+    """
+    slots = asyncio.Semaphore(concurrency or settings.FANOUT_CONCURRENCY)
+
+    async def run(shard: ShardT) -> ResultT:
+        async with slots:
+            return await fetch(shard)
+
+    return await asyncio.gather(*(run(shard) for shard in shards))
+
+async def resolve_branch_ids(db, branch_ids: Optional[Sequence[int]] = None) -> List[int]:
+    """
+    The requested branches, or every branch in the catalog when none were requested.
+    """
+    if branch_ids:
+        return list(dict.fromkeys(branch_ids))
+    catalog = await get_catalog(db)
+    return sorted(catalog.branches)
+
+async def fan_out_by_branch(collection, query: Dict[str, Any], fetch: Callable[[Any, Dict[str, Any]], Awaitable[ResultT]],
+                            branch_ids: Optional[Sequence[int]] = None,
+                            concurrency: Optional[int] = None) -> Dict[int, ResultT]:
+    """
+    Runs fetch(collection, query restricted to one branch) for each branch concurrently.
+
+    Returns {branch_id: result}. Without 'branch_ids', every branch in the catalog is queried.
+    """
+    branch_ids = await resolve_branch_ids(collection.database, branch_ids)
+    results = await scatter_gather(
+        branch_ids,
+        lambda branch_id: fetch(collection, {**query, "branch_id": branch_id}),
+        concurrency,
+    )
+    return dict(zip(branch_ids, results))
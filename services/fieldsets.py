@@ -0,0 +1,28 @@
+'''
+Sparse fieldsets: let clients choose which fields each response item contains.
+'''
+from typing import Any, Dict, Iterable, List, Optional
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parses a comma-separated 'fields' parameter. None means all fields.
+    """
+    if fields is None:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+def wants_field(fields: Optional[List[str]], name: str) -> bool:
+    """
+    True if 'name' should be included, so expensive fields can be skipped when not requested.
+    """
+    return fields is None or name in fields
+
+def select_fields(item: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return item
+    return {key: value for key, value in item.items() if key in fields}
+
+def select_fields_many(items: Iterable[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    if fields is None:
+        return list(items)
+    return [select_fields(item, fields) for item in items]
@@ -0,0 +1,42 @@
+'''
+Query filters shared by the analytics endpoints.
+
+A date window is turned into a half-open range on the date field, so together
+with the branch filter it matches the (branch_id, Date) index and the cost of a
+request grows with the size of the window rather than with total history.
+'''
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, NamedTuple, Optional
+
+class DateRange(NamedTuple):
+    """
+    Inclusive calendar-day window; either bound may be open.
+    """
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    def predicate(self) -> Dict[str, datetime]:
+        predicate = {}
+        if self.start_date is not None:
+            predicate["$gte"] = datetime.combine(self.start_date, time.min)
+        if self.end_date is not None:
+            # Dates may carry a time of day, so include everything before the next midnight.
+            predicate["$lt"] = datetime.combine(self.end_date + timedelta(days=1), time.min)
+        return predicate
+
+    def params(self) -> Dict[str, Optional[date]]:
+        return {"start_date": self.start_date, "end_date": self.end_date}
+
+def kpi_query(branch_id: Optional[int] = None, date_range: Optional[DateRange] = None,
+              date_field: str = "Date") -> Dict[str, Any]:
+    """
+    Builds the Mongo filter for an optional branch and date window.
+    """
+    query = {}
+    if branch_id is not None:
+        query["branch_id"] = branch_id
+    if date_range is not None:
+        predicate = date_range.predicate()
+        if predicate:
+            query[date_field] = predicate
+    return query
@@ -0,0 +1,183 @@
+'''
+Mergeable top-seller summaries for sliding-window /top-sellers queries.
+
+calculate_top_sellers sums every product of every requested row and sorts them
+all, so a request costs history x catalog size. Instead, each (branch_id, day)
+bucket keeps a summary of at most TOP_SELLER_SKETCH_SIZE products in the
+'top_seller_sketches' collection. The daily KPI materializer
+(services/materializer.py) rewrites a bucket whenever its partition changes. A
+window query merges the summaries of its buckets, so it costs buckets x summary
+size however many SKUs the catalog has. Summaries are only used for a window
+they fully cover (summaries_cover); otherwise /top-sellers sums the raw rows.
+
+Summaries carry Space-Saving's guarantees:
+
+    - a listed value over-estimates the product's true sales value by at most
+      its 'max_error';
+    - a product that is not listed sold at most the summary's 'floor'.
+
+A bucket summary lists its largest products exactly (error 0), and its floor is
+the largest value it had to drop. Merging adds, to both the value and the error
+of a product, the floors of the summaries it is missing from, and then keeps
+the largest values again (the merge rule of Agarwal et al., "Mergeable
+Summaries"). A window is therefore answered exactly whenever no bucket in it
+sold more distinct products than the summary size.
+'''
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import pandas as pd
+from pymongo import UpdateOne
+from config import settings
+from services.daily_kpis import DAILY_KPIS_COLLECTION
+from services.filters import DateRange, kpi_query
+
+SKETCHES_COLLECTION = "top_seller_sketches"
+
+class TopSalesSummary:
+    """
+    At most 'capacity' products with an upper-bound sales value and its maximum over-estimate.
+    """
+    def __init__(self, capacity: int, values: Dict[Any, float], errors: Dict[Any, float], floor: float = 0.0):
+        self.capacity = capacity
+        self.values = values
+        self.errors = errors
+        self.floor = floor
+        self._truncate()
+
+    def _truncate(self):
+        if len(self.values) <= self.capacity:
+            return
+        ranked = sorted(self.values, key=lambda product_id: (-self.values[product_id], product_id))
+        for product_id in ranked[self.capacity:]:
+            # A dropped product sold at most its own upper bound.
+            self.floor = max(self.floor, self.values.pop(product_id))
+            self.errors.pop(product_id)
+
+    @classmethod
+    def from_totals(cls, totals: Dict[Any, float], capacity: int) -> "TopSalesSummary":
+        return cls(capacity, dict(totals), {product_id: 0.0 for product_id in totals})
+
+    @classmethod
+    def merge(cls, summaries: Iterable["TopSalesSummary"], capacity: int) -> "TopSalesSummary":
+        summaries = list(summaries)
+        total_floor = sum(summary.floor for summary in summaries)
+        # Start every product at the sum of all floors and swap in its own value where it is listed.
+        values, errors = defaultdict(float), defaultdict(float)
+        for summary in summaries:
+            for product_id, value in summary.values.items():
+                values[product_id] += value - summary.floor
+                errors[product_id] += summary.errors[product_id] - summary.floor
+        return cls(
+            capacity,
+            {product_id: total_floor + value for product_id, value in values.items()},
+            {product_id: total_floor + error for product_id, error in errors.items()},
+            total_floor,
+        )
+
+    def top(self, n: int) -> List[Dict[str, Any]]:
+        ranked = sorted(self.values, key=lambda product_id: (-self.values[product_id], product_id))
+        return [
+            {"product_id": product_id, "total_sales_value": self.values[product_id], "max_error": self.errors[product_id]}
+            for product_id in ranked[:n]
+        ]
+
+    def to_doc(self) -> Dict[str, Any]:
+        products = [{"product_id": item["product_id"], "value": item["total_sales_value"], "error": item["max_error"]}
+                    for item in self.top(self.capacity)]
+        return {"products": products, "floor": self.floor}
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any], capacity: int) -> "TopSalesSummary":
+        values = {item["product_id"]: item["value"] for item in doc["products"]}
+        errors = {item["product_id"]: item["error"] for item in doc["products"]}
+        return cls(capacity, values, errors, doc.get("floor", 0.0))
+
+def build_sketches(df: pd.DataFrame, capacity: int) -> List[Dict[str, Any]]:
+    """
+    One summary document per (branch_id, day) of raw kpi_data rows.
+    """
+    if df.empty:
+        return []
+    totals = pd.DataFrame({
+        "branch_id": df["branch_id"],
+        "day": df["Date"].dt.normalize(),
+        "Product_ID": df["Product_ID"],
+        # Quantity_Sold * Price, as in calculate_top_sellers
+        "sales_value": df["Quantity_Sold"] * df["Price"],
+    }).groupby(["branch_id", "day", "Product_ID"], sort=False)["sales_value"].sum()
+
+    docs = []
+    for (branch_id, day), bucket in totals.groupby(level=["branch_id", "day"], sort=False):
+        # Product IDs are kept as stored, as in calculate_top_sellers; numpy scalars become Python ones for BSON.
+        products = {getattr(product_id, "item", lambda: product_id)(): float(value)
+                    for (_, _, product_id), value in bucket.items()}
+        doc = TopSalesSummary.from_totals(products, capacity).to_doc()
+        doc.update({"branch_id": int(branch_id), "day": day.to_pydatetime()})
+        docs.append(doc)
+    return docs
+
+async def write_sketches(collection, docs: List[Dict[str, Any]], batch_size: int = 1000,
+                         prune_run: Optional[str] = None) -> int:
+    """
+    Replaces the summaries of the given (branch_id, day) buckets.
+
+    If 'prune_run' is given, summaries not written by this run are deleted afterwards,
+    as in services/daily_kpis.upsert_daily_kpis.
+    """
+    written = 0
+    for start in range(0, len(docs), batch_size):
+        operations = []
+        for doc in docs[start:start + batch_size]:
+            update = dict(doc) if prune_run is None else dict(doc, rebuild_id=prune_run)
+            operations.append(UpdateOne({"branch_id": doc["branch_id"], "day": doc["day"]}, {"$set": update}, upsert=True))
+        result = await collection.bulk_write(operations, ordered=False)
+        written += result.upserted_count + result.matched_count
+    if prune_run is not None:
+        await collection.delete_many({"rebuild_id": {"$ne": prune_run}})
+    return written
+
+async def _day_bounds(collection, query: Dict[str, Any], date_field: str):
+    projection = {"_id": 0, date_field: 1}
+    first, last = await asyncio.gather(
+        collection.find(query, projection).sort(date_field, 1).limit(1).to_list(length=1),
+        collection.find(query, projection).sort(date_field, -1).limit(1).to_list(length=1),
+    )
+    if not first:
+        return None
+    return pd.Timestamp(first[0][date_field]).normalize(), pd.Timestamp(last[0][date_field]).normalize()
+
+async def summaries_cover(db, branch_id: Optional[int], date_range: DateRange) -> bool:
+    """
+    True if every (branch_id, day) of the window that has data also has a summary.
+
+    Summaries are written together with the daily KPIs, so their counts must match. The
+    raw rows must also not start before or end after the summaries, which catches data
+    loaded before summaries were maintained and not materialized since.
+    """
+    sketches, daily_kpis, raw = db[SKETCHES_COLLECTION], db[DAILY_KPIS_COLLECTION], db[settings.COLLECTION_NAME]
+    sketch_count, daily_count, sketch_days, raw_days = await asyncio.gather(
+        sketches.count_documents(kpi_query(branch_id, date_range, date_field="day")),
+        daily_kpis.count_documents(kpi_query(branch_id, date_range, date_field="date")),
+        _day_bounds(sketches, kpi_query(branch_id, date_range, date_field="day"), "day"),
+        _day_bounds(raw, kpi_query(branch_id, date_range), "Date"),
+    )
+    return sketch_count > 0 and sketch_count == daily_count and sketch_days == raw_days
+
+async def window_summary(collection, query: Dict[str, Any], capacity: int) -> Optional[TopSalesSummary]:
+    """
+    Merges the bucket summaries matching 'query', or returns None if there are none.
+    """
+    docs = await collection.find(query, {"_id": 0, "products": 1, "floor": 1}).to_list(length=None)
+    if not docs:
+        return None
+    return TopSalesSummary.merge((TopSalesSummary.from_doc(doc, capacity) for doc in docs), capacity)
+
+async def latest_day(collection, date_field: str, branch_id: Optional[int] = None) -> Optional[datetime]:
+    """
+    The most recent value of 'date_field', so a window can end at the newest data.
+    """
+    query = {} if branch_id is None else {"branch_id": branch_id}
+    docs = await collection.find(query, {"_id": 0, date_field: 1}).sort(date_field, -1).limit(1).to_list(length=1)
+    return docs[0][date_field] if docs else None
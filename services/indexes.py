@@ -0,0 +1,184 @@
+'''
+Declarative index registry and query-plan verification.
+
+indexes() lists every index the application relies on. ensure_indexes() creates
+them (it is idempotent and runs at startup and after ingestion), and
+explain_query_shapes() runs explain() on each router's query shape and flags
+any plan that falls back to a collection scan (COLLSCAN), so index drift is
+caught before it shows up as production latency.
+'''
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from pymongo import IndexModel, ASCENDING
+from config import settings
+from services.pagination import KEYSET_SORT
+from services.daily_kpis import DAILY_KPIS_COLLECTION
+from services.rollup import ROLLUP_COLLECTION
+from services.materializer import DIRTY_PARTITIONS_COLLECTION
+from services.heavy_hitters import SKETCHES_COLLECTION
+from services.alerts import ALERTS_COLLECTION
+
+TRANSFERS_COLLECTION = "transfers"
+
+KPI_DATA_INDEXES: List[IndexModel] = [
+    # Branch filter plus date-range scans; the branch_id prefix also serves branch-only queries.
+    IndexModel([("branch_id", ASCENDING), ("Date", ASCENDING)], name="branch_id_date"),
+    IndexModel([("Date", ASCENDING)], name="date"),
+    IndexModel([("Expiration_Date", ASCENDING)], name="expiration_date"),
+    # Per-branch near-expiry window, returned in expiry order without an in-memory sort.
+    IndexModel([("branch_id", ASCENDING), ("Expiration_Date", ASCENDING)], name="branch_id_expiration_date"),
+    IndexModel([("Category", ASCENDING), ("branch_id", ASCENDING)], name="category_branch_id"),
+    IndexModel([("Product_ID", ASCENDING)], name="product_id"),
+]
+
+# Indexes of every collection except kpi_data, whose name is only known at call time.
+COLLECTION_INDEXES: Dict[str, List[IndexModel]] = {
+    DAILY_KPIS_COLLECTION: [
+        # Keyset pagination order used by every /kpis list endpoint.
+        IndexModel(KEYSET_SORT, name="date_branch_id_id"),
+        # One document per branch and day; also the upsert key of the daily KPI loader.
+        IndexModel([("branch_id", ASCENDING), ("date", ASCENDING)], name="branch_id_date", unique=True),
+        # The trend cache re-reads only documents written since its last refresh.
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    ALERTS_COLLECTION: [
+        # Keyset pagination order of /kpis/alerts.
+        IndexModel(KEYSET_SORT, name="date_branch_id_id"),
+        # Upsert key of the rules engine; also serves per-branch pages and re-evaluation deletes.
+        IndexModel([("branch_id", ASCENDING), ("date", ASCENDING), ("rule", ASCENDING)], name="branch_id_date_rule", unique=True),
+        # Severity-filtered pages, in keyset order.
+        IndexModel([("severity", ASCENDING)] + KEYSET_SORT, name="severity_date_branch_id_id"),
+    ],
+    ROLLUP_COLLECTION: [
+        # Rollup queries filter cells by branch and/or day window.
+        IndexModel([("branch_id", ASCENDING), ("day", ASCENDING)], name="branch_id_day"),
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+    DIRTY_PARTITIONS_COLLECTION: [
+        # The materializer reads marks up to its snapshot time, oldest first.
+        IndexModel([("changed_at", ASCENDING)], name="changed_at"),
+    ],
+    SKETCHES_COLLECTION: [
+        # One summary per branch and day; window queries filter on the day, optionally per branch.
+        IndexModel([("branch_id", ASCENDING), ("day", ASCENDING)], name="branch_id_day", unique=True),
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+    TRANSFERS_COLLECTION: [
+        IndexModel([("from_branch", ASCENDING), ("date", ASCENDING)], name="from_branch_date"),
+        IndexModel([("to_branch", ASCENDING), ("date", ASCENDING)], name="to_branch_date"),
+        IndexModel([("date", ASCENDING)], name="date"),
+    ],
+}
+
+def indexes() -> Dict[str, List[IndexModel]]:
+    """
+    Every registered index by collection, with kpi_data under the current COLLECTION_NAME.
+    """
+    return {settings.COLLECTION_NAME: KPI_DATA_INDEXES, **COLLECTION_INDEXES}
+
+def query_shapes() -> List[Dict[str, Any]]:
+    """
+    Representative query shapes issued by the routers, with sample values.
+    """
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    month_ago = today - timedelta(days=30)
+    return [
+        {"name": "kpi_data by branch", "collection": settings.COLLECTION_NAME,
+         "filter": {"branch_id": 1}},
+        {"name": "kpi_data by branch and date range", "collection": settings.COLLECTION_NAME,
+         "filter": {"branch_id": 1, "Date": {"$gte": month_ago, "$lt": today}}},
+        {"name": "kpi_data by date range", "collection": settings.COLLECTION_NAME,
+         "filter": {"Date": {"$gte": month_ago, "$lt": today}}},
+        {"name": "rx volume by branch", "collection": settings.COLLECTION_NAME,
+         "filter": {"branch_id": 1, "Category": "Rx"}},
+        {"name": "near expiries", "collection": settings.COLLECTION_NAME,
+         "filter": {"Expiration_Date": {"$gte": today, "$lte": today + timedelta(days=30)}},
+         "sort": [("Expiration_Date", ASCENDING)]},
+        {"name": "near expiries by branch", "collection": settings.COLLECTION_NAME,
+         "filter": {"branch_id": 1, "Expiration_Date": {"$gte": today, "$lte": today + timedelta(days=30)}},
+         "sort": [("Expiration_Date", ASCENDING)]},
+        {"name": "daily kpis page", "collection": DAILY_KPIS_COLLECTION,
+         "filter": {}, "sort": KEYSET_SORT},
+        {"name": "daily kpis by branch and date", "collection": DAILY_KPIS_COLLECTION,
+         "filter": {"branch_id": 1, "date": {"$gte": month_ago}}, "sort": KEYSET_SORT},
+        {"name": "alerts page", "collection": ALERTS_COLLECTION,
+         "filter": {}, "sort": KEYSET_SORT},
+        {"name": "alerts by severity and date", "collection": ALERTS_COLLECTION,
+         "filter": {"severity": "critical", "date": {"$gte": month_ago}}, "sort": KEYSET_SORT},
+        {"name": "alerts by branch", "collection": ALERTS_COLLECTION,
+         "filter": {"branch_id": 1}, "sort": KEYSET_SORT},
+        {"name": "rollup by branch and day range", "collection": ROLLUP_COLLECTION,
+         "filter": {"branch_id": 1, "day": {"$gte": month_ago, "$lt": today}}},
+        {"name": "top-seller summaries by day range", "collection": SKETCHES_COLLECTION,
+         "filter": {"day": {"$gte": month_ago, "$lt": today}}},
+        {"name": "transfers by source branch", "collection": TRANSFERS_COLLECTION,
+         "filter": {"from_branch": 1}},
+    ]
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Creates every registered index that does not exist yet.
+    """
+    created = {}
+    for collection_name, models in indexes().items():
+        created[collection_name] = await db[collection_name].create_indexes(models)
+    return created
+
+async def missing_indexes(db) -> List[Dict[str, str]]:
+    """
+    Lists registered indexes that are absent from the database.
+    """
+    missing = []
+    for collection_name, models in indexes().items():
+        existing = await db[collection_name].index_information()
+        for model in models:
+            name = model.document["name"]
+            if name not in existing:
+                missing.append({"collection": collection_name, "index": name})
+    return missing
+
+def plan_stages(plan: Any) -> List[str]:
+    """
+    Collects every 'stage' name in an explain() plan tree.
+    """
+    stages = []
+    if isinstance(plan, dict):
+        if isinstance(plan.get("stage"), str):
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(plan_stages(value))
+    return stages
+
+async def explain_query_shapes(db) -> List[Dict[str, Any]]:
+    """
+    Runs explain() on every registered query shape and reports its winning plan.
+    """
+    reports = []
+    for shape in query_shapes():
+        cursor = db[shape["collection"]].find(shape["filter"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        explain = await cursor.explain()
+        stages = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        reports.append({
+            "name": shape["name"],
+            "collection": shape["collection"],
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return reports
+
+async def check_indexes(db) -> Dict[str, Any]:
+    """
+    Full index health report: missing registered indexes and query shapes that scan collections.
+    """
+    plans = await explain_query_shapes(db)
+    missing = await missing_indexes(db)
+    return {
+        "ok": not missing and not any(plan["collscan"] for plan in plans),
+        "missing_indexes": missing,
+        "query_plans": plans,
+    }
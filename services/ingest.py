@@ -0,0 +1,199 @@
+'''
+Chunked, pipelined and resumable CSV ingestion into kpi_data.
+
+The CSV is read in chunks of CHUNK_SIZE rows on a worker thread, so parsing the
+next chunk overlaps with writing the previous one. Each chunk is preprocessed
+and split into unordered bulk batches; at most MAX_IN_FLIGHT batches are in
+flight at once, which bounds memory no matter how large the file is.
+
+Every row gets a deterministic _id built from its natural key
+(branch_id, Date, Product_ID) and is written with an upsert, so replaying rows
+never duplicates them. After all batches of a chunk and of every earlier chunk
+have been acknowledged, its rollup cells are written (services/rollup.py), its
+(branch_id, day) partitions are marked for daily KPI materialization
+(services/materializer.py) and the number of rows done is saved to the
+'ingest_checkpoints' collection, with the byte offset where the next chunk
+starts. A rerun after a crash seeks to that offset instead of re-reading the
+rows already done.
+'''
+import asyncio
+import io
+import os
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+from pymongo import ReplaceOne
+from config import settings
+from services.data_preprocessing import preprocess_kpi_data, convert_df_to_docs
+from services.catalog import write_dimensions, CATALOG_FIELDS
+from services.rollup import build_cells, write_cells
+from services.materializer import mark_partitions
+
+CHECKPOINTS_COLLECTION = "ingest_checkpoints"
+CHUNK_SIZE = 50_000
+BATCH_SIZE = 1000
+MAX_IN_FLIGHT = 4
+
+def row_id(doc: Dict[str, Any]) -> str:
+    """
+    Deterministic _id of a kpi_data row: one document per branch, day and product.
+    """
+    return f"{doc['branch_id']}:{str(doc['Date'])[:10]}:{doc['Product_ID']}"
+
+def source_key(csv_file_path: str) -> str:
+    """
+    Identifies a CSV file for checkpointing. Changing the file restarts its ingestion.
+    """
+    stat = os.stat(csv_file_path)
+    return f"{os.path.abspath(csv_file_path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+async def read_checkpoint(db, source: str) -> Dict[str, Any]:
+    checkpoint = await db[CHECKPOINTS_COLLECTION].find_one({"_id": source})
+    return checkpoint or {"_id": source, "rows_done": 0, "completed": False}
+
+async def write_checkpoint(db, source: str, rows_done: int, completed: bool = False, offset: Optional[int] = None) -> None:
+    await db[CHECKPOINTS_COLLECTION].update_one(
+        {"_id": source},
+        {"$set": {"rows_done": rows_done, "completed": completed, "offset": offset}},
+        upsert=True,
+    )
+
+class ChunkReader:
+    """
+    Reads a CSV as DataFrames of up to 'chunk_size' rows and reports the byte offset
+    after each one, so a resumed ingestion can seek past the rows it already wrote.
+
+    Without an offset (checkpoints from before offsets were saved), the first 'skip'
+    rows are skipped as raw records, without parsing them.
+    """
+    def __init__(self, csv_file_path: str, chunk_size: int, offset: Optional[int] = None, skip: int = 0):
+        self.chunk_size = chunk_size
+        self._file = open(csv_file_path, "rb")
+        self._header = self._read_record()
+        if offset:
+            self._file.seek(offset)
+        else:
+            skipped = 0
+            while skipped < skip:
+                record = self._read_record()
+                if not record:
+                    break
+                skipped += bool(record.strip())
+
+    def _read_record(self) -> bytes:
+        # A newline inside a quoted field does not end the record; quotes otherwise come in pairs.
+        record = self._file.readline()
+        while record.count(b'"') % 2:
+            line = self._file.readline()
+            if not line:
+                break
+            record += line
+        return record
+
+    def read(self) -> Optional[Tuple[pd.DataFrame, int]]:
+        """
+        The next chunk and the offset where the one after it starts, or None at the end of the file.
+        """
+        records = []
+        while len(records) < self.chunk_size:
+            record = self._read_record()
+            if not record:
+                break
+            # pandas skips blank lines, so they do not count as rows either.
+            if record.strip():
+                records.append(record if record.endswith(b"\n") else record + b"\n")
+        if not records:
+            return None
+        return pd.read_csv(io.BytesIO(self._header + b"".join(records))), self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+def _prepare_chunk(chunk: pd.DataFrame, normalize: bool):
+    processed = preprocess_kpi_data(chunk)
+    facts = processed.drop(columns=list(CATALOG_FIELDS)) if normalize else processed
+    docs = convert_df_to_docs(facts)
+    for doc in docs:
+        doc["_id"] = row_id(doc)
+    return processed, docs, build_cells(processed)
+
+async def _write_batch(collection, docs: List[Dict[str, Any]], slots: asyncio.Semaphore) -> int:
+    try:
+        result = await collection.bulk_write(
+            [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False)
+        return result.upserted_count + result.matched_count
+    finally:
+        slots.release()
+
+async def upsert_rows(collection, docs: List[Dict[str, Any]], batch_size: int = BATCH_SIZE) -> int:
+    """
+    Writes kpi_data rows as upserts on their row_id, so loading the same rows again replaces them.
+    """
+    written = 0
+    for start in range(0, len(docs), batch_size):
+        batch = docs[start:start + batch_size]
+        for doc in batch:
+            doc["_id"] = row_id(doc)
+        result = await collection.bulk_write([ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch], ordered=False)
+        written += result.upserted_count + result.matched_count
+    return written
+
+async def ingest_csv(db, csv_file_path: str, chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE,
+                     max_in_flight: int = MAX_IN_FLIGHT, restart: bool = False) -> Dict[str, Any]:
+    """
+    Streams a KPI CSV into kpi_data, resuming from the last checkpoint of the same file.
+
+    Returns the number of rows skipped (already ingested), read and written.
+    """
+    collection = db[settings.COLLECTION_NAME]
+    source = source_key(csv_file_path)
+    checkpoint = {"rows_done": 0, "completed": False} if restart else await read_checkpoint(db, source)
+    if checkpoint["completed"]:
+        return {"skipped": checkpoint["rows_done"], "read": 0, "written": 0}
+
+    rows_skipped = checkpoint["rows_done"]
+    reader = ChunkReader(csv_file_path, chunk_size, checkpoint.get("offset"), rows_skipped)
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(max_in_flight)
+    # (rows done and file offset once this chunk is written, its batch tasks, its rollup cells), oldest first
+    pending = deque()
+    rows_read = 0
+    written = 0
+
+    async def save_finished_chunks():
+        nonlocal written
+        while pending and all(task.done() for task in pending[0][2]):
+            rows_done, offset, tasks, cells = pending.popleft()
+            written += sum(task.result() for task in tasks)
+            await write_cells(db, cells, batch_size)
+            await mark_partitions(db, ((cell["branch_id"], cell["day"]) for cell in cells))
+            await write_checkpoint(db, source, rows_done, offset=offset)
+
+    try:
+        while True:
+            result = await loop.run_in_executor(None, reader.read)
+            if result is None:
+                break
+            chunk, offset = result
+            rows_read += len(chunk)
+            processed, docs, cells = await loop.run_in_executor(None, _prepare_chunk, chunk, settings.NORMALIZE_KPI_FACTS)
+            await write_dimensions(db, processed)
+            tasks = []
+            for start in range(0, len(docs), batch_size):
+                # Backpressure: wait for a free slot before queueing another batch.
+                await slots.acquire()
+                tasks.append(asyncio.create_task(_write_batch(collection, docs[start:start + batch_size], slots)))
+                await save_finished_chunks()
+            pending.append((rows_skipped + rows_read, offset, tasks, cells))
+            await save_finished_chunks()
+        for _, _, tasks, _ in list(pending):
+            await asyncio.gather(*tasks)
+        await save_finished_chunks()
+    finally:
+        reader.close()
+        for _, _, tasks, _ in pending:
+            for task in tasks:
+                task.cancel()
+
+    await write_checkpoint(db, source, rows_skipped + rows_read, completed=True)
+    return {"skipped": rows_skipped, "read": rows_read, "written": written}
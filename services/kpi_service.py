@@ -2,40 +2,125 @@
 This service handles the business logic for fetching and analyzing KPI data.
 '''
 from database import get_database
-from models import DailyKPIInDB
-from datetime import datetime, timedelta
+from models import AlertInDB, DailyKPIInDB
+from datetime import date
+from services.cache import cached_result
+from services.calculations import calculate_kpi_summary, projection_for
+from services.catalog import get_catalog, CATALOG_FIELDS
+from services.filters import DateRange, kpi_query
+from services.metrics import phase, record_docs
+from services.serialization import trusted_models
+from services.executor import offload
+from services.pagination import fetch_page, DEFAULT_PAGE_SIZE
+from services.rollup import ROLLUP_COLLECTION, aggregate_rollup, rollup_query
+from services.daily_kpis import DAILY_KPIS_COLLECTION
+from services.alerts import ALERTS_COLLECTION
+from services.trends import DEFAULT_WINDOW, compute_trends, select_days, trend_records, trend_series
+from config import settings
+import asyncio
 
 class KPIService:
-    async def get_daily_kpis(self, branch_id: int = None, start_date: datetime = None, end_date: datetime = None):
+    async def _get_page(self, endpoint: str, query: dict, params: dict, limit: int, cursor: str,
+                        collection_name: str = DAILY_KPIS_COLLECTION, model=DailyKPIInDB):
         db = await get_database()
-        query = {}
-        if branch_id:
-            query["branch_id"] = branch_id
-        if start_date and end_date:
-            query["date"] = {"$gte": start_date, "$lte": end_date}
-        elif start_date:
-            query["date"] = {"$gte": start_date}
-        elif end_date:
-            query["date"] = {"$lte": end_date}
-        kpis = await db["daily_kpis"].find(query).to_list(1000)
-        return [DailyKPIInDB(**kpi) for kpi in kpis]
-
-    async def get_kpi_trends(self, branch_id: int = None):
-        # This is a placeholder for a more complex trend analysis.
-        # For now, we'll just return the last 7 days of data.
+        collection = db[collection_name]
+
+        async def compute():
+            with phase("db_fetch"):
+                docs, next_cursor = await fetch_page(collection, query, limit, cursor)
+            record_docs(len(docs))
+            with phase("decode"):
+                # daily_kpis and alerts rows are written by this service, so they are not validated again.
+                return trusted_models(model, docs), next_cursor
+
+        params = {**params, "limit": limit, "cursor": cursor}
+        return await cached_result(collection, endpoint, params, compute)
+
+    async def get_daily_kpis(self, branch_id: int = None, start_date: date = None, end_date: date = None,
+                             limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+        # DateRange converts the calendar dates to datetimes; BSON cannot encode date objects.
+        date_range = DateRange(start_date, end_date)
+        query = kpi_query(branch_id, date_range, date_field="date")
+        params = {"branch_id": branch_id, **date_range.params()}
+        return await self._get_page("kpis_daily", query, params, limit, cursor)
+
+    async def get_kpi_trends(self, branch_id: int = None, window: int = DEFAULT_WINDOW,
+                             start_date: date = None, end_date: date = None):
+        """
+        Rolling means, moving sums and week-over-week / month-over-month deltas of
+        the daily KPIs of one branch, or of all branches summed (see services/trends.py).
+        """
         db = await get_database()
-        query = {"date": {"$gte": datetime.now() - timedelta(days=7)}}
-        if branch_id:
-            query["branch_id"] = branch_id
-        kpis = await db["daily_kpis"].find(query).to_list(1000)
-        return [DailyKPIInDB(**kpi) for kpi in kpis]
 
-    async def get_kpi_alerts(self, branch_id: int = None):
+        async def compute():
+            with phase("db_fetch"):
+                daily = await trend_series.series(db, branch_id)
+            with phase("compute"):
+                # Trends are computed over the whole series, so the first days of the window are correct too.
+                trends = select_days(compute_trends(daily, window), start_date, end_date)
+                return trend_records(trends, branch_id)
+
+        params = {"branch_id": branch_id, "window": window, "start_date": start_date, "end_date": end_date}
+        return await cached_result(db[DAILY_KPIS_COLLECTION], "kpis_trends", params, compute)
+
+    async def get_kpi_alerts(self, branch_id: int = None, severity: str = None, rule: str = None,
+                             start_date: date = None, end_date: date = None,
+                             limit: int = DEFAULT_PAGE_SIZE, cursor: str = None):
+        """
+        A page of the alerts raised by the rules engine (services/alerts.py), read from the indexed alerts collection.
+        """
+        date_range = DateRange(start_date, end_date)
+        query = kpi_query(branch_id, date_range, date_field="date")
+        if severity is not None:
+            query["severity"] = severity
+        if rule is not None:
+            query["rule"] = rule
+        params = {"branch_id": branch_id, "severity": severity, "rule": rule, **date_range.params()}
+        return await self._get_page("kpis_alerts", query, params, limit, cursor, ALERTS_COLLECTION, AlertInDB)
+
+    async def get_kpi_summary(self, branch_id: int = None, top_n: int = 5, start_date: date = None, end_date: date = None):
+        """
+        Computes sales, Rx volume, cash reconciliation, stock-outs and top sellers
+        from one scan of the raw KPI data, so a dashboard needs a single request.
+        """
         db = await get_database()
-        query = {"total_stockouts": {"$gt": 0}}
-        if branch_id:
-            query["branch_id"] = branch_id
-        alerts = await db["daily_kpis"].find(query).to_list(1000)
-        return [DailyKPIInDB(**alert) for alert in alerts]
+        collection = db[settings.COLLECTION_NAME]
+        date_range = DateRange(start_date, end_date)
+        query = kpi_query(branch_id, date_range)
+
+        async def compute():
+            projection = projection_for(calculate_kpi_summary, exclude=CATALOG_FIELDS)
+            with phase("db_fetch"):
+                data, catalog = await asyncio.gather(
+                    collection.find(query, projection).to_list(length=None),
+                    get_catalog(db),
+                )
+            record_docs(len(data))
+            with phase("compute"):
+                summary = await offload(calculate_kpi_summary, data, top_n)
+                catalog.attach_product_names(summary["top_sellers"])
+            summary["branch_id"] = branch_id
+            return summary
+
+        params = {"branch_id": branch_id, **date_range.params(), "top_n": top_n}
+        return await cached_result(collection, "kpis_summary", params, compute)
+
+    async def get_rollup(self, grain: str = "day", dimensions: list = (), branch_id: int = None, category: str = None,
+                         product_id: int = None, start_date: date = None, end_date: date = None):
+        """
+        Rolls the pre-aggregated cube up to 'grain' and the requested dimensions.
+        """
+        db = await get_database()
+        collection = db[ROLLUP_COLLECTION]
+        date_range = DateRange(start_date, end_date)
+        query = rollup_query(branch_id, category, product_id, date_range)
+
+        async def compute():
+            with phase("db_fetch"):
+                return await aggregate_rollup(collection, query, grain, dimensions)
+
+        params = {"grain": grain, "by": ",".join(dimensions), "branch_id": branch_id, "category": category,
+                  "product_id": product_id, **date_range.params()}
+        return await cached_result(collection, "kpis_rollup", params, compute)
 
 kpi_service = KPIService()
@@ -0,0 +1,252 @@
+'''
+Incremental materialization of daily_kpis from changed (branch_id, day) partitions.
+
+Every write path marks the partitions it touched in the 'dirty_partitions'
+collection, after the rows themselves have been acknowledged. Each mark carries
+a 'changed_at' high-water mark. materialize_dirty() then does the following:
+
+1. Takes a snapshot time and reads the marks changed up to it.
+2. Reloads only those partitions' kpi_data rows: per branch, one (branch_id,
+   Date) index range per run of consecutive days.
+3. Recomputes them with services/daily_kpis.compute_daily_kpis and upserts the
+   results, together with each partition's top-seller summary
+   (services/heavy_hitters.py). A partition that no longer has rows loses both.
+   The alert rules (services/alerts.py) are then re-evaluated for those days.
+4. Clears only the marks whose 'changed_at' is still at or before the snapshot,
+   so a partition written again mid-run stays dirty for the next run.
+
+If a run fails, its partitions are retried one at a time. A partition that keeps
+failing is parked in 'failed_partitions' after MATERIALIZE_MAX_ATTEMPTS runs,
+and is retried when it is written again or retry_failed_partitions() is called.
+Failures are counted on /metrics, and materialize_forever backs off
+exponentially after a failed run.
+
+Appending one day of sales therefore costs one day's recompute. The API runs
+materialize_dirty every MATERIALIZE_INTERVAL_SECONDS in the background, and
+scripts/materialize_daily_kpis.py runs it from the command line.
+'''
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+import pandas as pd
+from pymongo import UpdateOne
+from pymongo.errors import ConnectionFailure
+from config import settings
+from services.cache import bump_data_version
+from services.catalog import get_catalog
+from services.daily_kpis import DAILY_KPIS_COLLECTION, compute_daily_kpis, upsert_daily_kpis
+from services.heavy_hitters import SKETCHES_COLLECTION, build_sketches, write_sketches
+from services.alerts import refresh_alerts
+from services.metrics import REGISTRY, Counter
+
+DIRTY_PARTITIONS_COLLECTION = "dirty_partitions"
+FAILED_PARTITIONS_COLLECTION = "failed_partitions"
+MAX_PARTITIONS_PER_RUN = 5000
+MAX_BACKOFF_SECONDS = 300
+
+run_failures = Counter("kpi_materialize_run_failures_total", "Materializer runs that failed as a whole.", [])
+partition_failures = Counter("kpi_materialize_partition_failures_total", "Failed attempts to materialize a single partition.", [])
+partitions_parked = Counter("kpi_materialize_partitions_parked_total", "Partitions moved to failed_partitions.", [])
+REGISTRY.extend([run_failures, partition_failures, partitions_parked])
+
+def partition_id(branch_id: int, day: datetime) -> str:
+    return f"{branch_id}:{day:%Y-%m-%d}"
+
+def _day(value) -> datetime:
+    return pd.Timestamp(value).normalize().to_pydatetime()
+
+async def mark_partitions(db, partitions: Iterable[Tuple[int, Any]]) -> int:
+    """
+    Records that the kpi_data rows of these (branch_id, day) partitions changed. Call after the rows are written.
+    """
+    changed_at = datetime.now(timezone.utc)
+    operations = {}
+    for branch_id, day in partitions:
+        day = _day(day)
+        key = partition_id(branch_id, day)
+        operations[key] = UpdateOne(
+            {"_id": key},
+            {"$set": {"branch_id": int(branch_id), "date": day}, "$max": {"changed_at": changed_at}},
+            upsert=True,
+        )
+    if operations:
+        await db[DIRTY_PARTITIONS_COLLECTION].bulk_write(list(operations.values()), ordered=False)
+    return len(operations)
+
+def partitions_of(df: pd.DataFrame) -> List[Tuple[int, datetime]]:
+    """
+    The distinct (branch_id, day) partitions of a preprocessed kpi_data DataFrame.
+    """
+    pairs = pd.DataFrame({"branch_id": df["branch_id"], "day": df["Date"].dt.normalize()}).drop_duplicates()
+    return list(zip(pairs["branch_id"].astype(int), pairs["day"]))
+
+def _day_runs(days: Iterable[datetime]) -> List[Tuple[datetime, datetime]]:
+    """
+    Distinct midnights grouped into (first, last) runs of consecutive days.
+    """
+    runs: List[List[datetime]] = []
+    for day in sorted(set(days)):
+        if runs and day - runs[-1][1] == timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [(first, last) for first, last in runs]
+
+async def _load_partition_rows(db, partitions: List[Dict[str, Any]]) -> pd.DataFrame:
+    days_by_branch: Dict[int, List[datetime]] = {}
+    for partition in partitions:
+        days_by_branch.setdefault(partition["branch_id"], []).append(partition["date"])
+    collection = db[settings.COLLECTION_NAME]
+
+    async def fetch(branch_id: int, days: List[datetime]):
+        # Dates may carry a time of day (see services/filters.py), so each run of consecutive days
+        # is a [first, last + 1 day) range on the (branch_id, Date) index.
+        ranges = [{"Date": {"$gte": first, "$lt": last + timedelta(days=1)}} for first, last in _day_runs(days)]
+        query = {"branch_id": branch_id, **(ranges[0] if len(ranges) == 1 else {"$or": ranges})}
+        return await collection.find(query, {"_id": 0}).sort([("Date", 1), ("Product_ID", 1)]).to_list(length=None)
+
+    results = await asyncio.gather(*(fetch(branch_id, days) for branch_id, days in days_by_branch.items()))
+    return pd.DataFrame([row for rows in results for row in rows])
+
+async def mark_all_partitions(db) -> int:
+    """
+    Marks every (branch_id, day) of kpi_data dirty, e.g. to build the daily KPIs and summaries of older data.
+    """
+    # One partition per calendar day, however many times of day its rows carry.
+    day = {"$dateToString": {"format": "%Y-%m-%d", "date": "$Date"}}
+    pipeline = [{"$group": {"_id": {"branch_id": "$branch_id", "day": day}}}]
+    groups = await db[settings.COLLECTION_NAME].aggregate(pipeline).to_list(length=None)
+    return await mark_partitions(db, ((group["_id"]["branch_id"], group["_id"]["day"]) for group in groups))
+
+async def _materialize(db, partitions: List[Dict[str, Any]], batch_size: int) -> Dict[str, int]:
+    df = await _load_partition_rows(db, partitions)
+    docs, sketches = [], []
+    if not df.empty:
+        if "Product_Name" not in df.columns:
+            # Normalized facts carry no names; the catalog has them.
+            catalog = await get_catalog(db)
+            df["Product_Name"] = [catalog.product_name(product_id) for product_id in df["Product_ID"]]
+        # Daily KPIs are per calendar day, also for rows stored with a time of day.
+        df["Date"] = pd.to_datetime(df["Date"]).dt.normalize()
+        df["Expiration_Date"] = pd.to_datetime(df["Expiration_Date"])
+        docs = compute_daily_kpis(df)
+        sketches = build_sketches(df, settings.TOP_SELLER_SKETCH_SIZE)
+    written = await upsert_daily_kpis(db[DAILY_KPIS_COLLECTION], docs, batch_size)
+    sketches_written = await write_sketches(db[SKETCHES_COLLECTION], sketches, batch_size)
+
+    # Partitions whose rows are all gone no longer have a daily KPI.
+    present = {partition_id(doc["branch_id"], doc["date"]) for doc in docs}
+    emptied = [p for p in partitions if p["_id"] not in present]
+    removed, sketches_removed = 0, 0
+    for partition in emptied:
+        result = await db[DAILY_KPIS_COLLECTION].delete_one({"branch_id": partition["branch_id"], "date": partition["date"]})
+        removed += result.deleted_count
+        result = await db[SKETCHES_COLLECTION].delete_one({"branch_id": partition["branch_id"], "day": partition["date"]})
+        sketches_removed += result.deleted_count
+    return {"written": written, "removed": removed, "sketches_written": sketches_written, "sketches_removed": sketches_removed}
+
+async def _record_failure(db, partition: Dict[str, Any], error: Exception, snapshot: datetime) -> bool:
+    """
+    Counts a failed attempt on the partition's mark. Returns True if the partition was parked.
+    """
+    partition_failures.add(1)
+    marks = db[DIRTY_PARTITIONS_COLLECTION]
+    await marks.update_one({"_id": partition["_id"]}, {"$inc": {"attempts": 1}, "$set": {"error": repr(error)}})
+    # A partition written again since the snapshot gets another chance with its new rows.
+    mark = await marks.find_one_and_delete({
+        "_id": partition["_id"],
+        "attempts": {"$gte": settings.MATERIALIZE_MAX_ATTEMPTS},
+        "changed_at": {"$lte": snapshot},
+    })
+    if mark is None:
+        return False
+    mark["failed_at"] = datetime.now(timezone.utc)
+    await db[FAILED_PARTITIONS_COLLECTION].replace_one({"_id": mark["_id"]}, mark, upsert=True)
+    partitions_parked.add(1)
+    print(f"Parked daily KPI partition {mark['_id']} after {mark['attempts']} failed attempts: {error!r}")
+    return True
+
+async def materialize_dirty(db, max_partitions: int = MAX_PARTITIONS_PER_RUN, batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Recomputes the daily KPIs of partitions marked dirty up to now.
+
+    If the run fails, its partitions are retried one at a time, so one bad partition does not
+    hold back the others. A partition that fails MATERIALIZE_MAX_ATTEMPTS runs in a row is moved
+    to 'failed_partitions'. Connection errors are raised instead, since they are not the data's fault.
+
+    Returns the number of partitions processed, daily KPI documents written, documents removed
+    and partitions that failed.
+    """
+    snapshot = datetime.now(timezone.utc)
+    marks = db[DIRTY_PARTITIONS_COLLECTION]
+    partitions = await marks.find({"changed_at": {"$lte": snapshot}}).sort("changed_at", 1).to_list(length=max_partitions)
+    if not partitions:
+        return {"partitions": 0, "written": 0, "removed": 0, "failed": 0}
+
+    try:
+        stats = await _materialize(db, partitions, batch_size)
+        done = partitions
+    except ConnectionFailure:
+        raise
+    except Exception as e:
+        print(f"Daily KPI materialization of {len(partitions)} partitions failed, retrying them one by one: {e!r}")
+        stats = {"written": 0, "removed": 0, "sketches_written": 0, "sketches_removed": 0}
+        done = []
+        for partition in partitions:
+            try:
+                result = await _materialize(db, [partition], batch_size)
+            except ConnectionFailure:
+                raise
+            except Exception as partition_error:
+                await _record_failure(db, partition, partition_error, snapshot)
+                continue
+            for key in stats:
+                stats[key] += result[key]
+            done.append(partition)
+
+    done_ids = [p["_id"] for p in done]
+    await marks.delete_many({"_id": {"$in": done_ids}, "changed_at": {"$lte": snapshot}})
+    await db[FAILED_PARTITIONS_COLLECTION].delete_many({"_id": {"$in": done_ids}})
+    if stats["written"] or stats["removed"]:
+        await bump_data_version(db, DAILY_KPIS_COLLECTION)
+    await refresh_alerts(db, ((partition["branch_id"], partition["date"]) for partition in done), batch_size)
+    if stats["sketches_written"] or stats["sketches_removed"]:
+        await bump_data_version(db, SKETCHES_COLLECTION)
+    return {"partitions": len(partitions), "written": stats["written"], "removed": stats["removed"],
+            "failed": len(partitions) - len(done)}
+
+async def retry_failed_partitions(db) -> int:
+    """
+    Marks every parked partition dirty again, e.g. after fixing its rows or the code that failed on them.
+    """
+    failed = await db[FAILED_PARTITIONS_COLLECTION].find({}, {"branch_id": 1, "date": 1}).to_list(length=None)
+    # Parked partitions stay listed until they materialize successfully.
+    return await mark_partitions(db, ((partition["branch_id"], partition["date"]) for partition in failed))
+
+async def materialize_forever(db, interval: float):
+    """
+    Background task: materializes dirty partitions every 'interval' seconds until cancelled.
+
+    After a failed run it waits twice as long each time, up to MAX_BACKOFF_SECONDS.
+    """
+    failures = 0
+    while True:
+        try:
+            stats = await materialize_dirty(db)
+            failures = 0
+            if stats["partitions"]:
+                print(f"Materialized {stats['partitions']} daily KPI partitions "
+                      f"({stats['written']} written, {stats['removed']} removed, {stats['failed']} failed).")
+            if stats["partitions"] >= MAX_PARTITIONS_PER_RUN and not stats["failed"]:
+                # More marks are waiting beyond this run's limit.
+                continue
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            failures += 1
+            run_failures.add(1)
+            delay = min(interval * 2 ** failures, MAX_BACKOFF_SECONDS)
+            print(f"Daily KPI materialization failed ({failures} in a row), retrying in {delay:g}s: {e!r}")
+            await asyncio.sleep(delay)
+            continue
+        await asyncio.sleep(interval)
@@ -0,0 +1,237 @@
+'''
+Per-request timing instrumentation, exposed in Prometheus text format on /metrics.
+
+timing_middleware opens a RequestMetrics for every request and keeps it in a
+context variable. Routers and KPIService wrap their work in phase() blocks
+(db_fetch, decode, compute) and report how many documents they read from
+MongoDB with record_docs(). The rest of the request time is booked as
+"serialize": request and response validation, Pydantic conversion and JSON
+encoding all happen in FastAPI outside the handler code. A cache hit has no
+db_fetch or compute phase at all, and an NDJSON stream fetches while it sends,
+so all of its time lands in serialize.
+
+Per route template, the middleware observes these histograms:
+
+    kpi_request_duration_seconds{route}         total time until the response is sent
+    kpi_request_phase_seconds{route,phase}      time spent in each phase
+    kpi_request_documents_scanned{route}        documents read from MongoDB
+    kpi_response_bytes{route}                   response body size
+
+Requests slower than SLOW_REQUEST_MS are logged with their phase breakdown, and
+with SERVER_TIMING_ENABLED the phases are also sent in a Server-Timing header.
+'''
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from config import settings
+
+UNMATCHED_ROUTE = "unmatched"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DOCUMENT_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+
+class Histogram:
+    """
+    A Prometheus histogram with cumulative buckets, one series per label set.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        counts, total, count = self._series.get(label_values) or ([0] * len(self.buckets), 0.0, 0)
+        for i, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                counts[i] += 1
+        self._series[label_values] = (counts, total + value, count + 1)
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def clear(self):
+        self._series.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            prefix = labels + "," if labels else ""
+            for upper_bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{upper_bound:g}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+class Gauge:
+    """
+    A Prometheus gauge, one value per label set.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def add(self, amount: float, *label_values: str):
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def clear(self):
+        self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self._values.items()):
+            labels = ",".join(f'{name}="{_escape(v)}"' for name, v in zip(self.label_names, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value:g}")
+        return lines
+
+class Counter(Gauge):
+    """
+    A Prometheus counter, one value per label set; only add() positive amounts.
+    """
+    kind = "counter"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+request_duration = Histogram("kpi_request_duration_seconds", "Request latency by route.",
+                             ["route"], LATENCY_BUCKETS)
+phase_duration = Histogram("kpi_request_phase_seconds", "Time spent in each request phase by route.",
+                           ["route", "phase"], LATENCY_BUCKETS)
+documents_scanned = Histogram("kpi_request_documents_scanned", "Documents read from MongoDB per request by route.",
+                              ["route"], DOCUMENT_BUCKETS)
+response_bytes = Histogram("kpi_response_bytes", "Response body size by route.",
+                           ["route"], BYTE_BUCKETS)
+# Everything /metrics renders; other modules append their own metrics (see services/executor.py).
+REGISTRY = [request_duration, phase_duration, documents_scanned, response_bytes]
+
+class RequestMetrics:
+    """
+    Phase timings and document counts collected while one request is handled.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.docs: Optional[int] = None
+
+    def add_phase(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_docs(self, count: int):
+        self.docs = (self.docs or 0) + count
+
+    def finish(self, elapsed: float) -> Dict[str, float]:
+        """
+        Returns every phase, booking the time no phase accounts for as "serialize".
+        """
+        phases = dict(self.phases)
+        # Concurrent phases can add up to more than the elapsed time.
+        phases["serialize"] = phases.get("serialize", 0.0) + max(0.0, elapsed - sum(self.phases.values()))
+        return phases
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Times the enclosed block as a phase of the current request. Outside a request it does nothing.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(name, time.perf_counter() - started)
+
+def record_docs(count: int):
+    """
+    Adds to the number of documents the current request read from MongoDB.
+    """
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add_docs(count)
+
+def server_timing(phases: Dict[str, float], total: float) -> str:
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in phases.items() if seconds > 0]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+def observe_request(route: str, elapsed: float, phases: Dict[str, float], docs: Optional[int], body_bytes: int):
+    request_duration.observe(elapsed, route)
+    for name, seconds in phases.items():
+        phase_duration.observe(seconds, route, name)
+    if docs is not None:
+        documents_scanned.observe(docs, route)
+    response_bytes.observe(body_bytes, route)
+
+def _log_slow_request(request, elapsed: float, phases: Dict[str, float], docs: Optional[int], body_bytes: int):
+    breakdown = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in phases.items())
+    target = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    print(f"Slow request: {request.method} {target} took {elapsed * 1000:.1f}ms "
+          f"({breakdown}; docs={docs if docs is not None else 'n/a'}, bytes={body_bytes})")
+
+def _route_template(request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+async def timing_middleware(request, call_next):
+    """
+    HTTP middleware that times each request and records its metrics once the body has been sent.
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    if settings.SERVER_TIMING_ENABLED:
+        # The header goes out before the body, so a streamed body's own phases are not in it.
+        elapsed = time.perf_counter() - metrics.started
+        response.headers["Server-Timing"] = server_timing(metrics.finish(elapsed), elapsed)
+    route = _route_template(request)
+    body_iterator = response.body_iterator
+
+    async def counted_body():
+        body_bytes = 0
+        try:
+            async for chunk in body_iterator:
+                body_bytes += len(chunk)
+                yield chunk
+        finally:
+            # Streamed responses are only complete here, so total latency is measured here too.
+            elapsed = time.perf_counter() - metrics.started
+            phases = metrics.finish(elapsed)
+            observe_request(route, elapsed, phases, metrics.docs, body_bytes)
+            if elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+                _log_slow_request(request, elapsed, phases, metrics.docs, body_bytes)
+
+    response.body_iterator = counted_body()
+    return response
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def reset_metrics():
+    for metric in REGISTRY:
+        metric.clear()
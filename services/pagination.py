@@ -0,0 +1,60 @@
+'''
+Keyset (cursor) pagination over daily KPI documents.
+
+Pages are ordered by (date, branch_id, _id) and the next page starts strictly
+after the last document of the previous one, so every page is a bounded index
+range scan no matter how deep the client has paged.
+'''
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
+
+KEYSET_SORT = [("date", 1), ("branch_id", 1), ("_id", 1)]
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    """
+    Encodes the sort key of the last document of a page as an opaque token.
+    """
+    key = [doc["date"].isoformat(), doc.get("branch_id"), str(doc["_id"])]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(token: str) -> Tuple[datetime, Optional[int], ObjectId]:
+    """
+    Decodes a token produced by encode_cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        date_str, branch_id, object_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.fromisoformat(date_str), branch_id, ObjectId(object_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {token}") from e
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Restricts 'query' to documents that sort after the cursor position.
+    """
+    if not cursor:
+        return query
+    date, branch_id, object_id = decode_cursor(cursor)
+    # Null and missing branch_ids sort first, and {"$gt": None} matches nothing.
+    later_branch = {"$ne": None} if branch_id is None else {"$gt": branch_id}
+    after_cursor = {"$or": [
+        {"date": {"$gt": date}},
+        {"date": date, "branch_id": later_branch},
+        {"date": date, "branch_id": branch_id, "_id": {"$gt": object_id}},
+    ]}
+    return {"$and": [query, after_cursor]} if query else after_cursor
+
+async def fetch_page(collection, query: Dict[str, Any], limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Returns one page of documents and the cursor for the next page (None on the last page).
+    """
+    docs = await collection.find(keyset_query(query, cursor)).sort(KEYSET_SORT).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor(docs[-1])
@@ -0,0 +1,119 @@
+'''
+Pre-aggregated branch x category x product x day rollup cube.
+
+Each cell of the 'kpi_rollup' collection holds the summed measures of the raw
+kpi_data rows for one (branch_id, Category, Product_ID, day). Cells also carry
+their week, month, quarter and year, so rolling up to a coarser grain or to a
+subset of the dimensions is a plain $group over the cells instead of a scan of
+the raw rows.
+
+Cells are written from the DataFrames seen at ingestion with $set upserts on a
+deterministic _id, so replaying a chunk rewrites the same cells instead of
+counting it twice.
+'''
+from typing import Any, Dict, List, Optional, Sequence
+import pandas as pd
+from pymongo import UpdateOne
+from services.calculations import stock_out_mask
+from services.filters import DateRange, kpi_query
+
+ROLLUP_COLLECTION = "kpi_rollup"
+CUBE_DIMENSIONS = ("branch_id", "Category", "Product_ID")
+GRAINS = ("day", "week", "month", "quarter", "year", "all")
+MEASURES = ("quantity_sold", "sales_value", "cash_received", "stock_outs", "inventory_level", "rows")
+
+def _period_columns(day: pd.Series) -> Dict[str, pd.Series]:
+    return {
+        "week": day - pd.to_timedelta(day.dt.weekday, unit="D"),  # weeks start on Monday
+        "month": day.dt.to_period("M").dt.start_time,
+        "quarter": day.dt.to_period("Q").dt.start_time,
+        "year": day.dt.to_period("Y").dt.start_time,
+    }
+
+def build_cells(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Sums preprocessed kpi_data rows into rollup cells.
+    """
+    if df.empty:
+        return []
+    frame = pd.DataFrame({
+        "branch_id": df["branch_id"],
+        "Category": df["Category"],
+        "Product_ID": df["Product_ID"],
+        "day": df["Date"].dt.normalize(),
+        "quantity_sold": df["Quantity_Sold"],
+        # Quantity_Sold * Price, as in calculate_total_sales_value
+        "sales_value": df["Quantity_Sold"] * df["Price"],
+        "cash_received": df["Cash_Received"],
+        # Same predicate as calculate_stock_outs and /stock-outs
+        "stock_outs": stock_out_mask(df["Inventory_Level"], df["Quantity_Sold"]).astype("int64"),
+        "inventory_level": df["Inventory_Level"],
+        "rows": 1,
+    })
+    cells = frame.groupby(list(CUBE_DIMENSIONS) + ["day"], sort=False).sum().reset_index()
+    cells = cells.assign(**_period_columns(cells["day"]))
+    docs = []
+    for cell in cells.to_dict(orient="records"):
+        day = cell["day"].to_pydatetime()
+        for grain in ("day", "week", "month", "quarter", "year"):
+            cell[grain] = cell[grain].to_pydatetime()
+        cell["_id"] = f"{cell['branch_id']}:{cell['Category']}:{cell['Product_ID']}:{day:%Y-%m-%d}"
+        docs.append(cell)
+    return docs
+
+async def write_cells(db, cells: List[Dict[str, Any]], batch_size: int = 1000) -> None:
+    """
+    Upserts rollup cells. Rewriting a cell replaces its measures, so it is safe to repeat.
+    """
+    collection = db[ROLLUP_COLLECTION]
+    for start in range(0, len(cells), batch_size):
+        operations = []
+        for cell in cells[start:start + batch_size]:
+            fields = {key: value for key, value in cell.items() if key != "_id"}
+            operations.append(UpdateOne({"_id": cell["_id"]}, {"$set": fields}, upsert=True))
+        await collection.bulk_write(operations, ordered=False)
+
+def rollup_pipeline(query: Dict[str, Any], grain: str = "day", dimensions: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    """
+    Rolls the cells matching 'query' up to 'grain' and the given subset of dimensions.
+    """
+    group_key = {} if grain == "all" else {"period": f"${grain}"}
+    for dimension in dimensions:
+        group_key[dimension] = f"${dimension}"
+    group = {"_id": group_key or None}
+    for measure in MEASURES:
+        group[measure] = {"$sum": f"${measure}"}
+    output = {"_id": 0}
+    for key in group_key:
+        output[key] = f"$_id.{key}"
+    output.update({
+        "quantity_sold": 1,
+        "sales_value": 1,
+        "cash_received": 1,
+        "discrepancy": {"$subtract": ["$sales_value", "$cash_received"]},
+        "stock_outs": 1,
+        "avg_inventory_level": {"$divide": ["$inventory_level", "$rows"]},
+        "rows": 1,
+    })
+    return [
+        {"$match": query},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+        {"$project": output},
+    ]
+
+async def aggregate_rollup(collection, query: Dict[str, Any], grain: str = "day",
+                           dimensions: Sequence[str] = ()) -> List[Dict[str, Any]]:
+    return await collection.aggregate(rollup_pipeline(query, grain, dimensions)).to_list(length=None)
+
+def rollup_query(branch_id: Optional[int] = None, category: Optional[str] = None,
+                 product_id: Optional[int] = None, date_range: Optional[DateRange] = None) -> Dict[str, Any]:
+    """
+    Builds the cell filter; the date window applies to the cell's day.
+    """
+    query = kpi_query(branch_id, date_range, date_field="day")
+    if category is not None:
+        query["Category"] = category
+    if product_id is not None:
+        query["Product_ID"] = product_id
+    return query
@@ -0,0 +1,62 @@
+'''
+Fast JSON serialization for documents the API reads from its own collections.
+
+Everything in kpi_data and daily_kpis was validated when it was written, so
+validating it again on every read is wasted work. The trusted path has two parts:
+
+* trusted_models() builds response models with model_construct, which skips
+  validation, instead of Model(**doc).
+* FastJSONResponse encodes with orjson. It handles ObjectId, datetimes, numpy
+  and pandas scalars and Pydantic models. An endpoint that returns one directly
+  also skips FastAPI's re-validation against its response_model; the
+  response_model is then only used for the OpenAPI schema.
+
+FastJSONResponse is the app's default response class, so endpoints that do
+return plain data still get the faster encoder after validation.
+'''
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Type, TypeVar
+import numpy as np
+import orjson
+import pandas as pd
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        # by_alias matches FastAPI's response_model output, e.g. "_id" for DailyKPIInDB.id
+        return value.model_dump(by_alias=True)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """
+    Encodes API content to JSON bytes. NaN and infinity become null.
+    """
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson. Returning one from an endpoint bypasses response_model validation.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def trusted_models(model: Type[ModelT], docs: Iterable[Dict[str, Any]]) -> List[ModelT]:
+    """
+    Wraps documents this service wrote itself in 'model' without validating them again.
+    """
+    return [model.model_construct(**doc) for doc in docs]
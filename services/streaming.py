@@ -0,0 +1,34 @@
+'''
+Helpers for streaming list endpoints as newline-delimited JSON (NDJSON).
+
+Streaming is opt-in, via 'Accept: application/x-ndjson' or '?stream=true'.
+Events are encoded and sent as soon as they are found while the Motor cursor is
+iterated, so memory stays bounded by the cursor batch size rather than the
+size of the result.
+'''
+from typing import Any, AsyncIterator, Dict
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from services.serialization import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 1000
+
+def wants_ndjson(request: Request, stream: bool = False) -> bool:
+    """
+    True if the client asked for a streamed NDJSON response.
+    """
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def ndjson_line(event: Dict[str, Any]) -> bytes:
+    return dumps(event) + b"\n"
+
+def ndjson_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Wraps an async iterator of events in a streaming NDJSON response.
+    """
+    async def body():
+        async for event in events:
+            yield ndjson_line(event)
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
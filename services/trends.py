@@ -0,0 +1,166 @@
+'''
+Rolling KPI trends over the per-branch daily_kpis time series.
+
+For sales value, Rx volume, stock-outs and cash discrepancy, compute_trends
+returns the following for every day of a series, over a trailing window of
+'window' days:
+
+    value         the day's own figure
+    rolling_mean  mean of the days with data in the window
+    moving_sum    sum over the window
+    wow_delta     moving_sum minus the moving_sum of 7 days earlier
+    mom_delta     moving_sum minus the moving_sum of one calendar month earlier
+
+The whole calculation is a handful of vectorized pandas rolling operations on a
+calendar-day index, so a branch with years of history takes milliseconds.
+
+The series come from TrendSeriesCache. It loads the measures of daily_kpis into
+memory once. When the collection's data version changes, it fetches only the
+documents whose 'updated_at' is newer than the ones it has, and splices them in.
+services/daily_kpis.upsert_daily_kpis stamps that field on every write, from the
+materializer and from the full loader alike. Deleted documents cannot be seen
+this way, so if the collection's exact document count (count_documents, answered
+from the _id index) no longer matches, the cache reloads in full.
+'''
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from services.cache import data_versions
+from services.daily_kpis import DAILY_KPIS_COLLECTION
+
+# Trend name -> daily_kpis field.
+TREND_MEASURES = {
+    "sales_value": "total_sales_value",
+    "rx_volume": "total_rx_volume",
+    "stockouts": "total_stockouts",
+    "cash_discrepancy": "total_cash_reconciliation",
+}
+TREND_STATISTICS = ("value", "rolling_mean", "moving_sum", "wow_delta", "mom_delta")
+DEFAULT_WINDOW = 7
+MAX_WINDOW = 365
+# Writers stamp 'updated_at' before their bulk write is acknowledged, so re-read a
+# little before the newest stamp seen; re-applying a document is harmless.
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+def compute_trends(daily: pd.DataFrame, window: int = DEFAULT_WINDOW) -> pd.DataFrame:
+    """
+    Trend statistics for a daily series.
+
+    Args:
+        daily (pd.DataFrame): One row per day with data, indexed by date, with a column per TREND_MEASURES key.
+        window (int): Trailing window in days.
+
+    Returns a frame indexed like 'daily' with (measure, statistic) columns; NaN where a value is undefined.
+    """
+    if daily.empty:
+        return pd.DataFrame(index=daily.index, columns=pd.MultiIndex.from_product([list(TREND_MEASURES), TREND_STATISTICS]))
+    values = daily[list(TREND_MEASURES)].astype("float64")
+    calendar = pd.date_range(values.index.min(), values.index.max(), freq="D")
+    # On a gap-free calendar a window of N rows is a window of N days; missing days are NaN.
+    values = values.reindex(calendar)
+    rolling = values.rolling(window, min_periods=1)
+    moving_sum = rolling.sum()
+    month_ago = moving_sum.reindex(calendar - pd.DateOffset(months=1))
+    month_ago.index = calendar
+    statistics = {
+        "value": values,
+        "rolling_mean": rolling.mean(),
+        "moving_sum": moving_sum,
+        "wow_delta": moving_sum - moving_sum.shift(7),
+        "mom_delta": moving_sum - month_ago,
+    }
+    trends = pd.concat(statistics, axis=1).swaplevel(axis=1)
+    trends = trends[pd.MultiIndex.from_product([list(TREND_MEASURES), TREND_STATISTICS])]
+    return trends.reindex(daily.index)
+
+def trend_records(trends: pd.DataFrame, branch_id: Optional[int]) -> List[Dict[str, Any]]:
+    """
+    One {"date", "branch_id", <measure>: {<statistic>: value}} item per row; NaN becomes None.
+    """
+    columns = {}
+    for column in trends.columns:
+        array = trends[column].to_numpy(dtype="float64")
+        columns[column] = np.where(np.isnan(array), None, array).tolist()
+    records = []
+    for i, day in enumerate(trends.index):
+        record = {"date": day.to_pydatetime(), "branch_id": branch_id}
+        for measure in TREND_MEASURES:
+            record[measure] = {statistic: columns[(measure, statistic)][i] for statistic in TREND_STATISTICS}
+        records.append(record)
+    return records
+
+class TrendSeriesCache:
+    """
+    The measures of daily_kpis per database, kept up to date incrementally.
+    """
+    def __init__(self):
+        # db name -> {"frame", "version", "watermark"}
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.full_loads = 0
+        self.incremental_loads = 0
+
+    @staticmethod
+    def _frame(docs: List[Dict[str, Any]]) -> pd.DataFrame:
+        columns = ["branch_id", "date"] + list(TREND_MEASURES.values())
+        frame = pd.DataFrame(docs, columns=columns + ["updated_at"])
+        frame["date"] = pd.to_datetime(frame["date"])
+        return frame.set_index(["branch_id", "date"])
+
+    async def _load(self, collection, query: Dict[str, Any]) -> pd.DataFrame:
+        projection = {"_id": 0, "branch_id": 1, "date": 1, "updated_at": 1}
+        projection.update({field: 1 for field in TREND_MEASURES.values()})
+        return self._frame(await collection.find(query, projection).to_list(length=None))
+
+    async def _refresh(self, collection, state: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        if state is not None and state["watermark"] is not None:
+            changed = await self._load(collection, {"updated_at": {"$gte": state["watermark"] - REFRESH_OVERLAP}})
+            frame = pd.concat([state["frame"].drop(changed.index, errors="ignore"), changed]).sort_index()
+            if len(frame) == await collection.count_documents({}):
+                self.incremental_loads += 1
+                return {"frame": frame, "watermark": frame["updated_at"].max()}
+        self.full_loads += 1
+        frame = (await self._load(collection, {})).sort_index()
+        watermark = frame["updated_at"].max() if not frame.empty else None
+        return {"frame": frame, "watermark": None if pd.isna(watermark) else watermark}
+
+    async def series(self, db, branch_id: Optional[int] = None) -> pd.DataFrame:
+        """
+        The daily series of one branch, or of all branches summed, indexed by date with TREND_MEASURES columns.
+        """
+        collection = db[DAILY_KPIS_COLLECTION]
+        lock = self._locks.setdefault(db.name, asyncio.Lock())
+        async with lock:
+            version = await data_versions.current(db, DAILY_KPIS_COLLECTION)
+            state = self._states.get(db.name)
+            if state is None or state["version"] != version:
+                state = await self._refresh(collection, state)
+                state["version"] = version
+                self._states[db.name] = state
+            frame = state["frame"]
+
+        measures = frame[list(TREND_MEASURES.values())]
+        if branch_id is None:
+            daily = measures.groupby(level="date").sum()
+        elif branch_id in frame.index.get_level_values("branch_id"):
+            daily = measures.xs(branch_id, level="branch_id")
+        else:
+            daily = measures.iloc[0:0].droplevel("branch_id")
+        return daily.rename(columns={field: measure for measure, field in TREND_MEASURES.items()})
+
+    def clear(self):
+        self._states.clear()
+
+trend_series = TrendSeriesCache()
+
+def select_days(trends: pd.DataFrame, start_date: Optional[date] = None, end_date: Optional[date] = None) -> pd.DataFrame:
+    """
+    Rows of 'trends' within the inclusive calendar-day window.
+    """
+    if start_date is not None:
+        trends = trends[trends.index >= datetime.combine(start_date, datetime.min.time())]
+    if end_date is not None:
+        trends = trends[trends.index < datetime.combine(end_date + timedelta(days=1), datetime.min.time())]
+    return trends
@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta
+import copy
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.calculations import (
+    calculate_total_sales_value,
+    calculate_rx_volume,
+    calculate_cash_reconciliation,
+    calculate_branch_metrics,
+    near_expiry_event,
+)
+from services.aggregations import (
+    aggregate_total_sales_value,
+    aggregate_rx_volume,
+    aggregate_cash_reconciliation,
+    aggregate_near_expiries,
+    aggregate_branch_totals,
+    branch_metrics_from_totals,
+)
+
+TEST_DATABASE_NAME = "pharmacy_kpi_test_db"
+TEST_COLLECTION_NAME = "kpi_aggregation_test_data"
+
+DUMMY_DATA = [
+    {
+        "Date": datetime(2025, 8, 25), "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
+        "Inventory_Level": 100, "Quantity_Sold": 10, "Price": 10.0, "Cash_Received": 100.0,
+        "Expiration_Date": datetime(2026, 8, 25), "branch_id": 1
+    },
+    {
+        "Date": datetime(2025, 8, 25), "Product_ID": "P002", "Product_Name": "Product B", "Category": "Rx",
+        "Inventory_Level": 50, "Quantity_Sold": 5, "Price": 20.0, "Cash_Received": 95.5,
+        "Expiration_Date": datetime(2025, 9, 10), "branch_id": 1
+    },
+    {
+        "Date": datetime(2025, 8, 25), "Product_ID": "P003", "Product_Name": "Product C", "Category": "Rx",
+        "Inventory_Level": 0, "Quantity_Sold": 2, "Price": 5.25, "Cash_Received": 10.0,
+        "Expiration_Date": datetime(2026, 1, 1), "branch_id": 2
+    },
+    {
+        "Date": datetime(2025, 8, 26), "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
+        "Inventory_Level": 90, "Quantity_Sold": 5, "Price": 10.0, "Cash_Received": 52.0,
+        "Expiration_Date": datetime(2026, 8, 25), "branch_id": 2
+    }
+]
+
+QUERIES = [{}, {"branch_id": 1}, {"branch_id": 2}, {"branch_id": 99}]
+
+@pytest.fixture
+async def collection():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    coll = client[TEST_DATABASE_NAME][TEST_COLLECTION_NAME]
+    await coll.delete_many({})
+    await coll.insert_many(copy.deepcopy(DUMMY_DATA))
+    yield coll
+    await coll.drop()
+    client.close()
+
+async def _python_reference(collection, query, calculation):
+    data = await collection.find(query).to_list(length=None)
+    return calculation(data)
+
+@pytest.mark.parametrize("query", QUERIES)
+async def test_total_sales_value_paths_match(collection, query):
+    expected = await _python_reference(collection, query, calculate_total_sales_value)
+    result = await aggregate_total_sales_value(collection, query)
+    assert result.keys() == expected.keys()
+    assert result["total_sales_value"] == pytest.approx(expected["total_sales_value"])
+
+@pytest.mark.parametrize("query", QUERIES)
+async def test_rx_volume_paths_match(collection, query):
+    expected = await _python_reference(collection, query, calculate_rx_volume)
+    result = await aggregate_rx_volume(collection, query)
+    assert result == expected
+
+@pytest.mark.parametrize("query", QUERIES)
+async def test_cash_reconciliation_paths_match(collection, query):
+    expected = await _python_reference(collection, query, calculate_cash_reconciliation)
+    result = await aggregate_cash_reconciliation(collection, query)
+    assert result.keys() == expected.keys()
+    for key, value in expected.items():
+        assert result[key] == pytest.approx(value)
+
+@pytest.mark.parametrize("query", QUERIES)
+async def test_near_expiries_paths_match(collection, query):
+    # Shift expirations relative to now so the window is not tied to the calendar.
+    # BSON dates have millisecond precision, so drop the microseconds up front.
+    today = datetime.today().replace(microsecond=0)
+    await collection.update_many({"Product_ID": "P002"}, {"$set": {"Expiration_Date": today + timedelta(days=10)}})
+    await collection.update_many({"Product_ID": "P003"}, {"$set": {"Expiration_Date": today + timedelta(days=3)}})
+    data = await collection.find(query).to_list(length=None)
+    events = [near_expiry_event(record, 30, today) for record in data]
+    expected = sorted((event for event in events if event), key=lambda item: item["expiration_date"])
+    result = await aggregate_near_expiries(collection, query, today, 30, breakdown=True)
+    items = result["items"]
+    assert [(item["product_id"], item["days_to_expiry"]) for item in items] == \
+           [(item["product_id"], item["days_to_expiry"]) for item in expected]
+    assert sum(result["by_branch"].values()) == len(expected)
+    assert sum(result["by_category"].values()) == len(expected)
+    limited = await aggregate_near_expiries(collection, query, today, 30, limit=1)
+    assert limited["items"] == items[:1]
+    # The counts cover the whole window, not just the returned items.
+    limited = await aggregate_near_expiries(collection, query, today, 30, limit=1, breakdown=True)
+    assert limited["items"] == items[:1]
+    assert (limited["by_branch"], limited["by_category"]) == (result["by_branch"], result["by_category"])
+
+async def test_branch_metrics_paths_match(collection):
+    expected = await _python_reference(collection, {}, calculate_branch_metrics)
+    totals = {branch_id: await aggregate_branch_totals(collection, {"branch_id": branch_id}) for branch_id in (1, 2, 99)}
+    assert totals[99] is None
+    result = branch_metrics_from_totals(totals)
+    assert result.keys() == expected.keys()
+    for metric, by_branch in expected.items():
+        assert result[metric].keys() == by_branch.keys()
+        for branch_id, value in by_branch.items():
+            assert result[metric][branch_id] == pytest.approx(value)
@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.alerts import ALERTS_COLLECTION, AlertRule, active_rules, evaluate_alerts, refresh_alerts
+from services.daily_kpis import DAILY_KPIS_COLLECTION, upsert_daily_kpis
+
+TEST_DATABASE_NAME = "pharmacy_kpi_alerts_test_db"
+START = datetime(2025, 8, 25)
+
+def kpi_row(branch_id: int, day: int, sales: float = 1000.0, stockouts: int = 0, cash: float = 0.0, near_expiries: int = 0):
+    return {
+        "branch_id": branch_id, "date": START + timedelta(days=day), "total_stockouts": stockouts,
+        "total_cash_reconciliation": cash, "total_near_expiries": near_expiries, "total_sales_value": sales,
+    }
+
+def rule(name: str, warning: float, critical: float) -> AlertRule:
+    return AlertRule(name, warning, critical, "{value}")
+
+def test_threshold_rules_pick_the_highest_severity():
+    daily = pd.DataFrame([
+        kpi_row(1, 0, stockouts=1, cash=-25.0),
+        kpi_row(1, 1, stockouts=4, near_expiries=6),
+        kpi_row(2, 0, cash=10.0, near_expiries=1),
+    ])
+    rules = [rule("stock_out", 1, 3), rule("cash_discrepancy", 20, 50), rule("near_expiry", 2, 5)]
+    alerts = {(a["rule"], a["branch_id"], a["date"]): a for a in evaluate_alerts(daily, rules, 7)}
+    assert {key: (a["severity"], a["value"], a["threshold"]) for key, a in alerts.items()} == {
+        ("stock_out", 1, START): ("warning", 1.0, 1),
+        ("stock_out", 1, START + timedelta(days=1)): ("critical", 4.0, 3),
+        ("cash_discrepancy", 1, START): ("warning", 25.0, 20),
+        ("near_expiry", 1, START + timedelta(days=1)): ("critical", 6.0, 5),
+    }
+
+def test_sales_drop_compares_with_the_trailing_mean_of_the_same_branch():
+    daily = pd.DataFrame(
+        [kpi_row(1, day, sales=1000.0) for day in range(7)] + [kpi_row(1, 7, sales=400.0), kpi_row(1, 8, sales=100.0)]
+        # Branch 2 sells little every day, so it never drops below its own average.
+        + [kpi_row(2, day, sales=100.0) for day in range(9)]
+    )
+    alerts = evaluate_alerts(daily, [rule("sales_drop", 0.5, 0.75)], 7)
+    assert [(a["branch_id"], a["date"], a["severity"]) for a in alerts] == [
+        (1, START + timedelta(days=8), "critical"),
+        (1, START + timedelta(days=7), "warning"),
+    ]
+    assert alerts[1]["value"] == pytest.approx(0.6)
+
+def test_sales_drop_needs_enough_history():
+    daily = pd.DataFrame([kpi_row(1, 0, sales=1000.0), kpi_row(1, 1, sales=1000.0), kpi_row(1, 2, sales=10.0)])
+    assert evaluate_alerts(daily, [rule("sales_drop", 0.5, 0.75)], 7) == []
+
+def test_active_rules_follow_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_RULES", "stock_out, sales_drop")
+    monkeypatch.setattr(settings, "ALERT_SALES_DROP_THRESHOLDS", "0.4,0.9")
+    rules = active_rules()
+    assert [(r.name, r.warning, r.critical) for r in rules] == [("stock_out", 1.0, 3.0), ("sales_drop", 0.4, 0.9)]
+    monkeypatch.setattr(settings, "ALERT_RULES", "stock_out,typo")
+    with pytest.raises(ValueError):
+        active_rules()
+
+def kpi_doc(branch_id: int, day: int, **values):
+    doc = {"top_sellers": [], "inventory_levels_top_sellers": [], "total_rx_volume": 0, "description": ""}
+    doc.update(kpi_row(branch_id, day, **values))
+    return doc
+
+@pytest.fixture
+async def db():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    database = client[TEST_DATABASE_NAME]
+    await client.drop_database(TEST_DATABASE_NAME)
+    yield database
+    await client.drop_database(TEST_DATABASE_NAME)
+    client.close()
+
+async def test_refresh_writes_and_clears_alerts_of_changed_days(db):
+    kpis = db[DAILY_KPIS_COLLECTION]
+    await upsert_daily_kpis(kpis, [kpi_doc(1, day) for day in range(7)] + [kpi_doc(1, 7, sales=100.0, stockouts=1)])
+    stats = await refresh_alerts(db, [(1, START + timedelta(days=day)) for day in range(8)])
+    assert stats["written"] == 2
+    alerts = await db[ALERTS_COLLECTION].find({}, {"_id": 0, "rule": 1, "severity": 1}).sort("rule", 1).to_list(length=None)
+    assert alerts == [{"rule": "sales_drop", "severity": "critical"}, {"rule": "stock_out", "severity": "warning"}]
+
+    # Corrected data for day 7 clears both alerts.
+    await upsert_daily_kpis(kpis, [kpi_doc(1, 7)])
+    stats = await refresh_alerts(db, [(1, START + timedelta(days=7))])
+    assert stats["removed"] == 2
+    assert await db[ALERTS_COLLECTION].count_documents({}) == 0
+
+async def test_a_changed_day_reevaluates_the_sales_drop_of_later_days(db):
+    kpis = db[DAILY_KPIS_COLLECTION]
+    await upsert_daily_kpis(kpis, [kpi_doc(1, day, sales=100.0) for day in range(8)])
+    await refresh_alerts(db, [(1, START + timedelta(days=day)) for day in range(8)])
+    assert await db[ALERTS_COLLECTION].count_documents({}) == 0
+
+    # A large corrected day 5 raises the trailing mean of the days after it.
+    await upsert_daily_kpis(kpis, [kpi_doc(1, 5, sales=5000.0)])
+    await refresh_alerts(db, [(1, START + timedelta(days=5))])
+    alerts = await db[ALERTS_COLLECTION].find({"rule": "sales_drop"}).sort("date", 1).to_list(length=None)
+    assert [alert["date"] for alert in alerts] == [START + timedelta(days=6), START + timedelta(days=7)]
@@ -0,0 +1,68 @@
+import time
+from services.cache import ResultCache
+
+def make_compute(value, calls):
+    async def compute():
+        calls.append(value)
+        return value
+    return compute
+
+async def test_hit_after_miss():
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    calls = []
+    first = await cache.get_or_compute("sales_value", {"branch_id": 1}, "kpi_data", 1, make_compute({"total": 1}, calls))
+    second = await cache.get_or_compute("sales_value", {"branch_id": 1}, "kpi_data", 1, make_compute({"total": 2}, calls))
+    assert first == second == {"total": 1}
+    assert len(calls) == 1
+    assert cache.hits == 1 and cache.misses == 1
+
+async def test_params_are_part_of_the_key():
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    calls = []
+    await cache.get_or_compute("top_sellers", {"branch_id": 1, "top_n": 5}, "kpi_data", 1, make_compute([1], calls))
+    await cache.get_or_compute("top_sellers", {"branch_id": 1, "top_n": 3}, "kpi_data", 1, make_compute([2], calls))
+    await cache.get_or_compute("top_sellers", {"top_n": 5, "branch_id": 1}, "kpi_data", 1, make_compute([3], calls))
+    assert calls == [[1], [2]]
+
+async def test_new_data_version_invalidates_old_entries():
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+    calls = []
+    await cache.get_or_compute("sales_value", {}, "kpi_data", 1, make_compute("old", calls))
+    await cache.get_or_compute("transfers", {}, "transfers", 1, make_compute("transfers", calls))
+    result = await cache.get_or_compute("sales_value", {}, "kpi_data", 2, make_compute("new", calls))
+    assert result == "new"
+    assert cache.invalidations == 1
+    assert cache.stats()["entries"] == 2
+
+async def test_lru_eviction_by_entry_count():
+    cache = ResultCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+    calls = []
+    await cache.get_or_compute("a", {}, "kpi_data", 1, make_compute("a", calls))
+    await cache.get_or_compute("b", {}, "kpi_data", 1, make_compute("b", calls))
+    await cache.get_or_compute("a", {}, "kpi_data", 1, make_compute("a", calls))
+    await cache.get_or_compute("c", {}, "kpi_data", 1, make_compute("c", calls))
+    assert cache.evictions == 1
+    await cache.get_or_compute("a", {}, "kpi_data", 1, make_compute("a", calls))
+    assert calls == ["a", "b", "c"]
+
+async def test_memory_cap():
+    cache = ResultCache(max_entries=100, max_bytes=50, ttl_seconds=60)
+    calls = []
+    await cache.get_or_compute("a", {}, "kpi_data", 1, make_compute("x" * 20, calls))
+    await cache.get_or_compute("b", {}, "kpi_data", 1, make_compute("y" * 20, calls))
+    await cache.get_or_compute("c", {}, "kpi_data", 1, make_compute("z" * 20, calls))
+    assert cache.current_bytes <= 50
+    assert cache.evictions == 1
+    await cache.get_or_compute("big", {}, "kpi_data", 1, make_compute("w" * 100, calls))
+    assert cache.stats()["entries"] == 2
+
+async def test_ttl_expiry(monkeypatch):
+    cache = ResultCache(max_entries=10, max_bytes=10_000, ttl_seconds=5)
+    calls = []
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    await cache.get_or_compute("a", {}, "kpi_data", 1, make_compute("a", calls))
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+    await cache.get_or_compute("a", {}, "kpi_data", 1, make_compute("a", calls))
+    assert len(calls) == 2
+    assert cache.expirations == 1
@@ -0,0 +1,78 @@
+from datetime import datetime
+import pytest
+from services.calculations import (
+    calculate_branch_metrics,
+    calculate_kpi_summary,
+    calculate_sales_by_branch,
+    calculate_inventory_turns_by_branch,
+    calculate_service_level_by_branch,
+    calculate_total_sales_value,
+    calculate_rx_volume,
+    calculate_cash_reconciliation,
+    calculate_stock_outs,
+    calculate_top_sellers,
+    calculate_inventory_levels,
+    calculate_near_expiries,
+    projection_for,
+)
+from services.fieldsets import parse_fields, select_fields_many
+from testing_utils import make_records, assert_same
+
+@pytest.fixture(scope="module")
+def records():
+    return make_records(num_rows=300, seed=11)
+
+def test_branch_metrics_match_separate_scans(records):
+    metrics = calculate_branch_metrics(records)
+    assert_same(metrics["sales_by_branch"], calculate_sales_by_branch(records))
+    assert_same(metrics["inventory_turns_by_branch"], calculate_inventory_turns_by_branch(records))
+    assert_same(metrics["service_level_by_branch"], calculate_service_level_by_branch(records))
+
+@pytest.mark.parametrize("top_n", [1, 5])
+def test_kpi_summary_matches_separate_scans(records, top_n):
+    summary = calculate_kpi_summary(records, top_n)
+    cash = calculate_cash_reconciliation(records)
+    assert summary["total_sales_value"] == pytest.approx(calculate_total_sales_value(records)["total_sales_value"])
+    assert summary["total_rx_volume"] == calculate_rx_volume(records)["total_rx_volume"]
+    assert summary["total_cash_received"] == pytest.approx(cash["total_cash_received"])
+    assert summary["discrepancy"] == pytest.approx(cash["discrepancy"])
+    assert summary["stock_out_count"] == len(calculate_stock_outs(records))
+    assert_same(summary["top_sellers"], calculate_top_sellers(records, top_n))
+
+def test_empty_data():
+    assert calculate_branch_metrics([]) == {
+        "sales_by_branch": {},
+        "inventory_turns_by_branch": {},
+        "service_level_by_branch": {},
+    }
+    assert calculate_kpi_summary([])["top_sellers"] == []
+
+def _project(records, projection):
+    return [{k: v for k, v in record.items() if projection.get(k)} for record in records]
+
+@pytest.mark.parametrize("calculation", [
+    calculate_stock_outs,
+    calculate_top_sellers,
+    calculate_rx_volume,
+    calculate_total_sales_value,
+    calculate_cash_reconciliation,
+    calculate_inventory_levels,
+    calculate_branch_metrics,
+    calculate_kpi_summary,
+])
+def test_projection_covers_calculation(records, calculation):
+    projected = _project(records, projection_for(calculation))
+    assert_same(calculation(projected), calculation(records))
+
+def test_near_expiry_projection():
+    records = [{"Date": datetime(2025, 8, 25), "Product_ID": 1, "Product_Name": "Aspirin", "Category": "OTC",
+                "Expiration_Date": datetime(2999, 1, 1), "Price": 1.0}]
+    projected = _project(records, projection_for(calculate_near_expiries))
+    assert calculate_near_expiries(projected, 10**6) == calculate_near_expiries(records, 10**6)
+
+def test_sparse_fieldsets():
+    items = [{"product_id": 1, "total_sales_value": 2.0, "description": "..."}]
+    assert parse_fields(None) is None
+    assert parse_fields("product_id, total_sales_value,") == ["product_id", "total_sales_value"]
+    assert select_fields_many(items, ["product_id"]) == [{"product_id": 1}]
+    assert select_fields_many(items, None) == items
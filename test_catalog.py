@@ -0,0 +1,48 @@
+import pandas as pd
+from services.catalog import DimensionCatalog, build_dimensions, price_band
+
+def make_catalog():
+    return DimensionCatalog(
+        products=[
+            {"product_id": 1, "product_name": "Aspirin", "category": "OTC", "price_band": "low"},
+            {"product_id": 2, "product_name": "Insulin (Rx)", "category": "Rx", "price_band": "high"},
+        ],
+        branches=[{"branch_id": 1, "branch_name": "Branch 1"}],
+    )
+
+def test_product_lookup():
+    catalog = make_catalog()
+    assert catalog.product_name(2) == "Insulin (Rx)"
+    assert catalog.product_name("2") == "Insulin (Rx)"
+    assert catalog.product_name(99, "Unknown") == "Unknown"
+    assert catalog.category(1) == "OTC"
+    assert catalog.product_ids_in_category("Rx") == [2]
+
+def test_attach_product_names():
+    items = [{"product_id": 1, "product_name": None}, {"product_id": 99, "product_name": "Unknown"}]
+    make_catalog().attach_product_names(items)
+    assert [item["product_name"] for item in items] == ["Aspirin", "Unknown"]
+
+def test_attach_product_names_falls_back_for_products_missing_from_the_catalog():
+    items = [{"product_id": 99, "product_name": None}, {"product_id": "P404"}, {"product_id": 98, "product_name": "Old name"}]
+    make_catalog().attach_product_names(items)
+    assert [item["product_name"] for item in items] == ["Unknown", "Unknown", "Old name"]
+
+def test_price_band():
+    assert price_band(5) == "low"
+    assert price_band(15) == "medium"
+    assert price_band(45) == "high"
+    assert price_band(None) is None
+
+def test_build_dimensions():
+    df = pd.DataFrame([
+        {"Product_ID": 1, "Product_Name": "Aspirin", "Category": "OTC", "Price": 4.0, "branch_id": 1},
+        {"Product_ID": 1, "Product_Name": "Aspirin", "Category": "OTC", "Price": 8.0, "branch_id": 2},
+        {"Product_ID": 2, "Product_Name": "Insulin (Rx)", "Category": "Rx", "Price": 40.0, "branch_id": 2},
+    ])
+    products, branches = build_dimensions(df)
+    assert products == [
+        {"_id": 1, "Product_Name": "Aspirin", "Category": "OTC", "price_band": "low"},
+        {"_id": 2, "Product_Name": "Insulin (Rx)", "Category": "Rx", "price_band": "high"},
+    ]
+    assert [branch["_id"] for branch in branches] == [1, 2]
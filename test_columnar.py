@@ -0,0 +1,50 @@
+import pytest
+from services.columnar import ColumnarKPIData
+from services.calculations import (
+    calculate_stock_outs,
+    calculate_top_sellers,
+    calculate_rx_volume,
+    calculate_total_sales_value,
+    calculate_cash_reconciliation,
+    calculate_inventory_levels,
+    calculate_sales_by_branch,
+    calculate_inventory_turns_by_branch,
+    calculate_service_level_by_branch,
+)
+from testing_utils import make_records, assert_same
+
+@pytest.fixture(scope="module")
+def records():
+    return make_records()
+
+@pytest.fixture(scope="module")
+def columnar(records):
+    return ColumnarKPIData.from_records(records)
+
+def test_stock_outs(records, columnar):
+    assert_same(columnar.stock_outs(), calculate_stock_outs(records))
+
+@pytest.mark.parametrize("top_n", [1, 3, 10])
+def test_top_sellers(records, columnar, top_n):
+    assert_same(columnar.top_sellers(top_n), calculate_top_sellers(records, top_n))
+
+def test_scalar_kpis(records, columnar):
+    assert_same(columnar.rx_volume(), calculate_rx_volume(records))
+    assert_same(columnar.total_sales_value(), calculate_total_sales_value(records))
+    assert_same(columnar.cash_reconciliation(), calculate_cash_reconciliation(records))
+
+def test_inventory_levels(records, columnar):
+    assert_same(columnar.inventory_levels(), calculate_inventory_levels(records))
+
+def test_branch_kpis(records, columnar):
+    assert_same(columnar.sales_by_branch(), calculate_sales_by_branch(records))
+    assert_same(columnar.inventory_turns_by_branch(), calculate_inventory_turns_by_branch(records))
+    assert_same(columnar.service_level_by_branch(), calculate_service_level_by_branch(records))
+
+def test_empty_data():
+    columnar = ColumnarKPIData.from_records([])
+    assert columnar.stock_outs() == calculate_stock_outs([])
+    assert columnar.top_sellers() == calculate_top_sellers([])
+    assert columnar.rx_volume() == calculate_rx_volume([])
+    assert columnar.inventory_levels() == calculate_inventory_levels([])
+    assert columnar.sales_by_branch() == calculate_sales_by_branch([])
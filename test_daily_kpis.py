@@ -0,0 +1,48 @@
+from datetime import timedelta
+import pandas as pd
+from models import DailyKPI
+from services.daily_kpis import compute_daily_kpis
+
+def make_frame():
+    df = pd.read_csv("data/all_in_one_kpi_dataset.csv", nrows=3000)
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Expiration_Date'] = pd.to_datetime(df['Expiration_Date'])
+    return df
+
+def reference_daily_kpis(df):
+    # The original per-branch, per-date loop of scripts/load_kpis_to_db.py.
+    docs = []
+    for branch_id in df['branch_id'].unique():
+        branch_data = df[df['branch_id'] == branch_id]
+        for date in sorted(branch_data['Date'].unique()):
+            daily_data = branch_data[branch_data['Date'] == date]
+            top_sellers = daily_data.sort_values(by='Quantity_Sold', ascending=False, kind='stable').head(3)
+            total_sales = daily_data['Sales_Value'].sum()
+            docs.append({
+                'branch_id': int(branch_id),
+                'date': pd.Timestamp(date).to_pydatetime(),
+                'total_stockouts': int((daily_data['Inventory_Level'] == 0).sum()),
+                'total_near_expiries': int((daily_data['Expiration_Date'] <= date + timedelta(days=30)).sum()),
+                'top_sellers': top_sellers[['Product_Name', 'Quantity_Sold']].to_dict('records'),
+                'total_rx_volume': int(daily_data[daily_data['Category'] == 'Rx']['Quantity_Sold'].sum()),
+                'total_sales_value': total_sales,
+                'total_cash_reconciliation': daily_data['Cash_Received'].sum() - total_sales,
+                'inventory_levels_top_sellers': top_sellers[['Product_Name', 'Inventory_Level']].to_dict('records'),
+            })
+    return sorted(docs, key=lambda doc: (doc['branch_id'], doc['date']))
+
+def test_compute_daily_kpis_matches_reference_loop():
+    df = make_frame()
+    docs = sorted(compute_daily_kpis(df), key=lambda doc: (doc['branch_id'], doc['date']))
+    expected = reference_daily_kpis(df)
+    assert len(docs) == len(expected)
+    for doc, ref in zip(docs, expected):
+        for key, value in ref.items():
+            if isinstance(value, float):
+                assert abs(doc[key] - value) < 1e-6, key
+            else:
+                assert doc[key] == value, key
+        DailyKPI(**doc)
+
+def test_compute_daily_kpis_empty_frame():
+    assert compute_daily_kpis(make_frame().iloc[0:0]) == []
@@ -1,3 +1,4 @@
+from datetime import datetime
 import pytest
 from starlette.testclient import TestClient
 from main import app
@@ -31,24 +32,24 @@ def test_load_data_and_get_metrics(test_client: TestClient):
     # Insert some dummy data for testing
     dummy_data = [
         {
-            "Date": "2025-08-25", "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
+            "Date": datetime(2025, 8, 25), "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
             "Inventory_Level": 100, "Quantity_Sold": 10, "Price": 10.0, "Cash_Received": 100.0,
-            "Expiration_Date": "2026-08-25", "branch_id": 1
+            "Expiration_Date": datetime(2026, 8, 25), "branch_id": 1
         },
         {
-            "Date": "2025-08-25", "Product_ID": "P002", "Product_Name": "Product B", "Category": "Rx",
+            "Date": datetime(2025, 8, 25), "Product_ID": "P002", "Product_Name": "Product B", "Category": "Rx",
             "Inventory_Level": 50, "Quantity_Sold": 5, "Price": 20.0, "Cash_Received": 100.0,
-            "Expiration_Date": "2025-09-10", "branch_id": 1 # Near expiry
+            "Expiration_Date": datetime(2025, 9, 10), "branch_id": 1 # Near expiry
         },
         {
-            "Date": "2025-08-25", "Product_ID": "P003", "Product_Name": "Product C", "Category": "OTC",
+            "Date": datetime(2025, 8, 25), "Product_ID": "P003", "Product_Name": "Product C", "Category": "OTC",
             "Inventory_Level": 0, "Quantity_Sold": 2, "Price": 5.0, "Cash_Received": 10.0,
-            "Expiration_Date": "2026-01-01", "branch_id": 2 # Stock out
+            "Expiration_Date": datetime(2026, 1, 1), "branch_id": 2 # Stock out
         },
         {
-            "Date": "2025-08-26", "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
+            "Date": datetime(2025, 8, 26), "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
             "Inventory_Level": 90, "Quantity_Sold": 5, "Price": 10.0, "Cash_Received": 50.0,
-            "Expiration_Date": "2026-08-25", "branch_id": 2
+            "Expiration_Date": datetime(2026, 8, 25), "branch_id": 2
         }
     ]
     asyncio.run(db_client.db[settings.COLLECTION_NAME].insert_many(dummy_data))
@@ -82,6 +83,9 @@ def test_load_data_and_get_metrics(test_client: TestClient):
     assert response.json()[0]["product_id"] == "P001" # Product A: 10*10 + 5*10 = 150
     assert response.json()[1]["product_id"] == "P002" # Product B: 5*20 = 100
     assert response.json()[2]["product_id"] == "P003" # Product C: 2*5 = 10
+    response = test_client.get("/top-sellers/?exact=true")
+    assert response.status_code == 200
+    assert all(item["max_error"] == 0.0 for item in response.json())
 
     # Test near expiries for branch 1
     response = test_client.get("/near-expiries/?branch_id=1")
@@ -113,24 +117,24 @@ def test_branch_comparison(test_client: TestClient):
     # Insert some dummy data for testing
     dummy_data = [
         {
-            "Date": "2025-08-25", "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
+            "Date": datetime(2025, 8, 25), "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
             "Inventory_Level": 100, "Quantity_Sold": 10, "Price": 10.0, "Cash_Received": 100.0,
-            "Expiration_Date": "2026-08-25", "branch_id": 1
+            "Expiration_Date": datetime(2026, 8, 25), "branch_id": 1
         },
         {
-            "Date": "2025-08-25", "Product_ID": "P002", "Product_Name": "Product B", "Category": "Rx",
+            "Date": datetime(2025, 8, 25), "Product_ID": "P002", "Product_Name": "Product B", "Category": "Rx",
             "Inventory_Level": 50, "Quantity_Sold": 5, "Price": 20.0, "Cash_Received": 100.0,
-            "Expiration_Date": "2025-09-10", "branch_id": 1 # Near expiry
+            "Expiration_Date": datetime(2025, 9, 10), "branch_id": 1 # Near expiry
         },
         {
-            "Date": "2025-08-25", "Product_ID": "P003", "Product_Name": "Product C", "Category": "OTC",
+            "Date": datetime(2025, 8, 25), "Product_ID": "P003", "Product_Name": "Product C", "Category": "OTC",
             "Inventory_Level": 0, "Quantity_Sold": 2, "Price": 5.0, "Cash_Received": 10.0,
-            "Expiration_Date": "2026-01-01", "branch_id": 2 # Stock out
+            "Expiration_Date": datetime(2026, 1, 1), "branch_id": 2 # Stock out
         },
         {
-            "Date": "2025-08-26", "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
+            "Date": datetime(2025, 8, 26), "Product_ID": "P001", "Product_Name": "Product A", "Category": "OTC",
             "Inventory_Level": 90, "Quantity_Sold": 5, "Price": 10.0, "Cash_Received": 50.0,
-            "Expiration_Date": "2026-08-25", "branch_id": 2
+            "Expiration_Date": datetime(2026, 8, 25), "branch_id": 2
         }
     ]
     asyncio.run(db_client.db[settings.COLLECTION_NAME].insert_many(dummy_data))
@@ -143,3 +147,11 @@ def test_branch_comparison(test_client: TestClient):
     assert "service_level_by_branch" in data
     assert data["sales_by_branch"]["1"] == 200
     assert data["sales_by_branch"]["2"] == 60
+
+def test_near_expiries_schema_covers_the_breakdown():
+    schema = app.openapi()
+    response = schema["paths"]["/near-expiries/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    variants = response["anyOf"]
+    assert {"type": "array", "items": {"$ref": "#/components/schemas/NearExpiry"}} in variants
+    assert {"$ref": "#/components/schemas/NearExpiryBreakdown"} in variants
+    assert set(schema["components"]["schemas"]["NearExpiryBreakdown"]["properties"]) == {"items", "by_branch", "by_category"}
@@ -0,0 +1,39 @@
+import threading
+import pytest
+from config import settings
+from services import executor
+from services.executor import offload, calculation_run, calculations_in_flight
+from services.calculations import calculate_rx_volume
+
+RECORDS = [{"Category": "Rx", "Quantity_Sold": 2}, {"Category": "OTC", "Quantity_Sold": 5}]
+
+def thread_name(data):
+    return threading.current_thread().name
+
+@pytest.fixture
+def pool(monkeypatch):
+    def use(kind: str, min_rows: int = 0):
+        monkeypatch.setattr(settings, "CALCULATION_EXECUTOR", kind)
+        monkeypatch.setattr(settings, "CALCULATION_OFFLOAD_MIN_ROWS", min_rows)
+        executor.shutdown_executor()
+    yield use
+    executor.shutdown_executor()
+
+async def test_thread_pool_runs_off_the_event_loop(pool):
+    pool("thread")
+    assert (await offload(thread_name, RECORDS)).startswith("kpi-calculation")
+    assert calculation_run.count("thread_name") >= 1
+    assert calculations_in_flight.value() == 0
+
+async def test_small_inputs_run_inline(pool):
+    pool("thread", min_rows=10)
+    assert await offload(thread_name, RECORDS) == threading.current_thread().name
+
+async def test_process_pool_returns_the_same_result(pool):
+    pool("process")
+    assert await offload(calculate_rx_volume, RECORDS) == calculate_rx_volume(RECORDS)
+
+async def test_unknown_executor_kind_is_rejected(pool):
+    pool("gpu")
+    with pytest.raises(ValueError):
+        await offload(calculate_rx_volume, RECORDS)
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from services.fanout import scatter_gather, fan_out_by_branch
+
+async def test_results_keep_shard_order():
+    async def fetch(shard):
+        await asyncio.sleep(0.01 * (5 - shard))
+        return shard * 10
+    assert await scatter_gather([1, 2, 3, 4], fetch, concurrency=4) == [10, 20, 30, 40]
+
+async def test_latency_tracks_the_slowest_shard():
+    async def fetch(shard):
+        await asyncio.sleep(0.05)
+        return shard
+    started = time.perf_counter()
+    await scatter_gather(list(range(20)), fetch, concurrency=20)
+    assert time.perf_counter() - started < 0.5
+
+async def test_concurrency_limit_is_respected():
+    in_flight = 0
+    peak = 0
+
+    async def fetch(shard):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return shard
+
+    await scatter_gather(list(range(12)), fetch, concurrency=3)
+    assert peak == 3
+
+class FakeCollection:
+    database = None
+
+async def test_fan_out_by_branch_restricts_each_query():
+    seen = []
+
+    async def fetch(collection, query):
+        seen.append(query)
+        return query["branch_id"] * 2
+
+    result = await fan_out_by_branch(FakeCollection(), {"Date": {"$gte": 1}}, fetch, branch_ids=[3, 1, 3])
+    assert result == {3: 6, 1: 2}
+    assert {"Date": {"$gte": 1}, "branch_id": 1} in seen
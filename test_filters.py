@@ -0,0 +1,26 @@
+from datetime import date, datetime
+import pytest
+from fastapi import HTTPException
+from dependencies import get_date_range
+from services.filters import DateRange, kpi_query
+
+def test_kpi_query_without_filters_is_empty():
+    assert kpi_query() == {}
+    assert kpi_query(None, DateRange()) == {}
+
+def test_kpi_query_uses_half_open_datetime_range():
+    query = kpi_query(2, DateRange(date(2025, 9, 1), date(2025, 9, 30)))
+    assert query == {
+        "branch_id": 2,
+        "Date": {"$gte": datetime(2025, 9, 1), "$lt": datetime(2025, 10, 1)},
+    }
+
+def test_kpi_query_open_ended_and_custom_field():
+    assert kpi_query(date_range=DateRange(end_date=date(2025, 9, 1)), date_field="date") == {
+        "date": {"$lt": datetime(2025, 9, 2)},
+    }
+
+def test_date_range_dependency_rejects_inverted_window():
+    with pytest.raises(HTTPException):
+        get_date_range(date(2025, 9, 2), date(2025, 9, 1))
+    assert get_date_range(None, None) == DateRange()
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.calculations import calculate_top_sellers
+from services.filters import DateRange
+from services.heavy_hitters import TopSalesSummary, build_sketches, summaries_cover
+from services.materializer import mark_partitions, materialize_dirty
+
+def bucket_totals(seed: int, buckets: int, products: int):
+    rng = np.random.default_rng(seed)
+    # Zipf-like demand, so a few products dominate as in real sales.
+    weights = 1.0 / np.arange(1, products + 1)
+    totals = []
+    for _ in range(buckets):
+        sold = rng.choice(products, size=products // 2, replace=False, p=weights / weights.sum())
+        totals.append({int(p) + 1: float(rng.uniform(1, 100) * weights[p] * 100) for p in sold})
+    return totals
+
+def exact_totals(buckets):
+    totals = {}
+    for bucket in buckets:
+        for product_id, value in bucket.items():
+            totals[product_id] = totals.get(product_id, 0.0) + value
+    return totals
+
+def test_merge_is_exact_when_buckets_fit():
+    buckets = bucket_totals(1, buckets=14, products=40)
+    merged = TopSalesSummary.merge((TopSalesSummary.from_totals(b, 40) for b in buckets), 40)
+    expected = sorted(exact_totals(buckets).items(), key=lambda item: -item[1])[:10]
+    top = merged.top(10)
+    assert [item["product_id"] for item in top] == [product_id for product_id, _ in expected]
+    assert [item["total_sales_value"] for item in top] == pytest.approx([value for _, value in expected])
+    assert all(item["max_error"] == pytest.approx(0.0) for item in top)
+
+@pytest.mark.parametrize("capacity", [5, 20, 60])
+def test_merged_values_stay_within_their_error_bounds(capacity):
+    buckets = bucket_totals(2, buckets=30, products=300)
+    merged = TopSalesSummary.merge((TopSalesSummary.from_totals(b, capacity) for b in buckets), capacity)
+    exact = exact_totals(buckets)
+    assert len(merged.values) <= capacity
+    for item in merged.top(capacity):
+        true_value = exact[item["product_id"]]
+        assert item["total_sales_value"] - item["max_error"] <= true_value + 1e-6
+        assert true_value <= item["total_sales_value"] + 1e-6
+    for product_id, true_value in exact.items():
+        if product_id not in merged.values:
+            assert true_value <= merged.floor + 1e-6
+
+def test_merging_merged_summaries_keeps_the_bounds():
+    buckets = bucket_totals(3, buckets=20, products=200)
+    daily = [TopSalesSummary.from_totals(b, 15) for b in buckets]
+    weekly = [TopSalesSummary.merge(daily[i:i + 5], 15) for i in range(0, len(daily), 5)]
+    merged = TopSalesSummary.merge(weekly, 15)
+    exact = exact_totals(buckets)
+    for item in merged.top(15):
+        assert item["total_sales_value"] - item["max_error"] - 1e-6 <= exact[item["product_id"]] <= item["total_sales_value"] + 1e-6
+
+def test_doc_round_trip():
+    summary = TopSalesSummary.from_totals({1: 5.0, 2: 9.0, 3: 1.0}, 2)
+    assert summary.floor == 1.0
+    restored = TopSalesSummary.from_doc(summary.to_doc(), 2)
+    assert restored.top(2) == summary.top(2)
+    assert restored.floor == summary.floor
+
+def test_build_sketches_matches_calculate_top_sellers_per_bucket():
+    records = [
+        {"branch_id": 1, "Date": "2025-08-25", "Product_ID": 1, "Quantity_Sold": 10, "Price": 2.0},
+        {"branch_id": 1, "Date": "2025-08-25", "Product_ID": 2, "Quantity_Sold": 3, "Price": 10.0},
+        {"branch_id": 1, "Date": "2025-08-25", "Product_ID": 3, "Quantity_Sold": 1, "Price": 1.0},
+        {"branch_id": 2, "Date": "2025-08-25", "Product_ID": 1, "Quantity_Sold": 4, "Price": 2.0},
+    ]
+    df = pd.DataFrame(records)
+    df["Date"] = pd.to_datetime(df["Date"])
+    docs = {doc["branch_id"]: doc for doc in build_sketches(df, 2)}
+    assert docs[1]["floor"] == 1.0
+    expected = calculate_top_sellers([r for r in records if r["branch_id"] == 1], 2)
+    assert [(p["product_id"], p["value"]) for p in docs[1]["products"]] == \
+        [(item["product_id"], item["total_sales_value"]) for item in expected]
+    assert docs[2]["products"] == [{"product_id": 1, "value": 8.0, "error": 0.0}]
+
+def test_build_sketches_keeps_string_product_ids():
+    records = [
+        {"branch_id": 1, "Date": "2025-08-25", "Product_ID": "P001", "Quantity_Sold": 10, "Price": 2.0},
+        {"branch_id": 1, "Date": "2025-08-25", "Product_ID": "P002", "Quantity_Sold": 3, "Price": 10.0},
+        {"branch_id": 1, "Date": "2025-08-25", "Product_ID": "P003", "Quantity_Sold": 1, "Price": 1.0},
+    ]
+    df = pd.DataFrame(records)
+    df["Date"] = pd.to_datetime(df["Date"])
+    [doc] = build_sketches(df, 2)
+    expected = calculate_top_sellers(records, 2)
+    assert [(p["product_id"], p["value"]) for p in doc["products"]] == \
+        [(item["product_id"], item["total_sales_value"]) for item in expected]
+    assert all(type(p["product_id"]) is str for p in doc["products"])
+    restored = TopSalesSummary.from_doc(doc, 2)
+    assert [item["product_id"] for item in restored.top(2)] == ["P002", "P001"]
+
+def test_build_sketches_converts_numpy_product_ids():
+    df = pd.DataFrame({"branch_id": [1], "Date": pd.to_datetime(["2025-08-25"]), "Product_ID": np.array([7], dtype="int64"),
+                       "Quantity_Sold": [1], "Price": [2.0]})
+    [doc] = build_sketches(df, 2)
+    assert type(doc["products"][0]["product_id"]) is int
+
+TEST_DATABASE_NAME = "pharmacy_kpi_heavy_hitters_test_db"
+
+@pytest.fixture
+async def db():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    database = client[TEST_DATABASE_NAME]
+    await client.drop_database(TEST_DATABASE_NAME)
+    yield database
+    await client.drop_database(TEST_DATABASE_NAME)
+    client.close()
+
+def kpi_rows(day: datetime):
+    return [
+        {"Date": day, "Product_ID": product_id, "Product_Name": f"Product {product_id}", "Category": "OTC",
+         "Inventory_Level": 10, "Quantity_Sold": product_id, "Price": 1.0, "Sales_Value": float(product_id),
+         "Cash_Received": float(product_id), "Expiration_Date": datetime(2027, 1, 1), "branch_id": 1}
+        for product_id in (1, 2, 3)
+    ]
+
+async def test_summaries_are_only_used_when_they_cover_the_window(db):
+    days = [datetime(2025, 8, 25) + timedelta(days=offset) for offset in range(3)]
+    await db[settings.COLLECTION_NAME].insert_many([row for day in days for row in kpi_rows(day)])
+    # Only the newest day was materialized, as after loading old data before summaries existed.
+    await mark_partitions(db, [(1, days[-1])])
+    await materialize_dirty(db)
+
+    assert not await summaries_cover(db, None, DateRange())
+    assert not await summaries_cover(db, 1, DateRange(days[0].date(), days[-1].date()))
+    assert await summaries_cover(db, 1, DateRange(days[-1].date(), days[-1].date()))
+
+    await mark_partitions(db, [(1, day) for day in days[:-1]])
+    await materialize_dirty(db)
+    assert await summaries_cover(db, None, DateRange())
@@ -0,0 +1,25 @@
+from config import settings
+from services.indexes import KPI_DATA_INDEXES, indexes, plan_stages, query_shapes
+
+def test_plan_stages_finds_nested_collscan():
+    winning_plan = {"stage": "SORT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "COLLSCAN"}}}
+    assert plan_stages(winning_plan) == ["SORT", "FETCH", "COLLSCAN"]
+    assert "COLLSCAN" not in plan_stages({"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}})
+
+def test_every_query_shape_has_a_leading_index():
+    for shape in query_shapes():
+        leading_fields = {next(iter(model.document["key"])) for model in indexes()[shape["collection"]]}
+        used_fields = set(shape["filter"]) | {field for field, _ in shape.get("sort", [])}
+        assert used_fields & leading_fields, shape["name"]
+
+def test_index_names_are_unique_per_collection():
+    for models in indexes().values():
+        names = [model.document["name"] for model in models]
+        assert len(names) == len(set(names))
+
+def test_registry_follows_collection_name_changed_after_import(monkeypatch):
+    monkeypatch.setattr(settings, "COLLECTION_NAME", "kpi_renamed_data")
+    registry = indexes()
+    assert registry["kpi_renamed_data"] is KPI_DATA_INDEXES
+    assert {shape["collection"] for shape in query_shapes()} <= set(registry)
+    test_every_query_shape_has_a_leading_index()
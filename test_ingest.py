@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.data_preprocessing import preprocess_kpi_data, convert_df_to_docs
+from services.ingest import CHECKPOINTS_COLLECTION, ChunkReader, ingest_csv, row_id, source_key, upsert_rows, _prepare_chunk
+
+DATASET = "data/all_in_one_kpi_dataset.csv"
+
+def test_row_id_is_the_natural_key():
+    doc = {"branch_id": 3, "Date": "2025-08-25T00:00:00", "Product_ID": 7}
+    assert row_id(doc) == "3:2025-08-25:7"
+
+def test_prepare_chunk_assigns_deterministic_ids():
+    chunk = pd.read_csv("data/all_in_one_kpi_dataset.csv", nrows=200)
+    _, first, cells = _prepare_chunk(chunk.copy(), normalize=False)
+    _, second, _ = _prepare_chunk(chunk.copy(), normalize=True)
+    assert [doc["_id"] for doc in first] == [doc["_id"] for doc in second]
+    assert len({doc["_id"] for doc in first}) == len(first)
+    assert "Product_Name" in first[0] and "Product_Name" not in second[0]
+    assert sum(cell["rows"] for cell in cells) == len(first)
+
+def read_all(reader):
+    chunks, offsets = [], []
+    while (result := reader.read()) is not None:
+        chunks.append(result[0])
+        offsets.append(result[1])
+    reader.close()
+    return chunks, offsets
+
+def test_chunk_reader_matches_pandas():
+    chunks, _ = read_all(ChunkReader(DATASET, 1000))
+    expected = list(pd.read_csv(DATASET, chunksize=1000))
+    assert [len(chunk) for chunk in chunks] == [len(chunk) for chunk in expected]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), pd.concat(expected, ignore_index=True))
+
+def test_chunk_reader_resumes_at_an_offset_or_row_count():
+    chunks, offsets = read_all(ChunkReader(DATASET, 1000))
+    resumed, _ = read_all(ChunkReader(DATASET, 1000, offset=offsets[1]))
+    pd.testing.assert_frame_equal(resumed[0], chunks[2])
+    skipped, _ = read_all(ChunkReader(DATASET, 1000, skip=2000))
+    pd.testing.assert_frame_equal(skipped[0], chunks[2])
+
+def test_chunk_reader_keeps_quoted_newlines_in_one_row(tmp_path):
+    path = tmp_path / "quoted.csv"
+    path.write_bytes(b'id,note\n1,"two\nlines"\n\n2,plain\n3,"say ""hi"""')
+    chunks, offsets = read_all(ChunkReader(str(path), 2))
+    assert [chunk["id"].tolist() for chunk in chunks] == [[1, 2], [3]]
+    assert chunks[0]["note"].tolist() == ["two\nlines", "plain"]
+    assert chunks[1]["note"].tolist() == ['say "hi"']
+    resumed, _ = read_all(ChunkReader(str(path), 2, offset=offsets[0]))
+    assert resumed[0]["id"].tolist() == [3]
+
+TEST_DATABASE_NAME = "pharmacy_kpi_ingest_test_db"
+
+@pytest.fixture
+async def db():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    database = client[TEST_DATABASE_NAME]
+    await client.drop_database(TEST_DATABASE_NAME)
+    yield database
+    await client.drop_database(TEST_DATABASE_NAME)
+    client.close()
+
+async def test_ingest_resumes_after_the_checkpointed_chunk(db):
+    _, offsets = read_all(ChunkReader(DATASET, 1000))
+    total = len(pd.read_csv(DATASET))
+    # As if the run had stopped after its first chunk.
+    await db[CHECKPOINTS_COLLECTION].insert_one(
+        {"_id": source_key(DATASET), "rows_done": 1000, "offset": offsets[0], "completed": False})
+    stats = await ingest_csv(db, DATASET, chunk_size=1000, batch_size=500)
+    assert stats == {"skipped": 1000, "read": total - 1000, "written": total - 1000}
+    assert await db[settings.COLLECTION_NAME].count_documents({}) == total - 1000
+    assert (await db[CHECKPOINTS_COLLECTION].find_one({}))["completed"]
+
+async def test_upsert_rows_replaces_rows_loaded_again(db):
+    def docs():
+        return convert_df_to_docs(preprocess_kpi_data(pd.read_csv(DATASET, nrows=300)))
+
+    assert await upsert_rows(db[settings.COLLECTION_NAME], docs(), batch_size=100) == 300
+    assert await upsert_rows(db[settings.COLLECTION_NAME], docs(), batch_size=100) == 300
+    stored = await db[settings.COLLECTION_NAME].find({}, {"_id": 1}).to_list(length=None)
+    assert sorted(doc["_id"] for doc in stored) == sorted(row_id(doc) for doc in docs())
@@ -0,0 +1,166 @@
+import asyncio
+import copy
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.daily_kpis import DAILY_KPIS_COLLECTION
+from services.heavy_hitters import SKETCHES_COLLECTION
+import services.materializer as materializer
+from services.materializer import (
+    DIRTY_PARTITIONS_COLLECTION,
+    FAILED_PARTITIONS_COLLECTION,
+    mark_all_partitions,
+    mark_partitions,
+    materialize_dirty,
+    materialize_forever,
+    partition_id,
+    partitions_of,
+    retry_failed_partitions,
+)
+
+TEST_DATABASE_NAME = "pharmacy_kpi_materializer_test_db"
+
+ROWS = [
+    {
+        "Date": datetime(2025, 8, 25), "Product_ID": 1, "Product_Name": "Product A", "Category": "OTC",
+        "Inventory_Level": 100, "Quantity_Sold": 10, "Price": 10.0, "Sales_Value": 100.0, "Cash_Received": 100.0,
+        "Expiration_Date": datetime(2026, 8, 25), "branch_id": 1
+    },
+    {
+        "Date": datetime(2025, 8, 25), "Product_ID": 2, "Product_Name": "Product B", "Category": "Rx",
+        "Inventory_Level": 0, "Quantity_Sold": 5, "Price": 20.0, "Sales_Value": 100.0, "Cash_Received": 95.5,
+        "Expiration_Date": datetime(2025, 9, 10), "branch_id": 1
+    },
+    {
+        "Date": datetime(2025, 8, 26), "Product_ID": 1, "Product_Name": "Product A", "Category": "OTC",
+        "Inventory_Level": 90, "Quantity_Sold": 5, "Price": 10.0, "Sales_Value": 50.0, "Cash_Received": 52.0,
+        "Expiration_Date": datetime(2026, 8, 25), "branch_id": 2
+    },
+]
+
+def test_partitions_of_returns_distinct_branch_days():
+    df = pd.DataFrame({
+        "branch_id": [1, 1, 2, 1],
+        "Date": pd.to_datetime(["2025-08-25", "2025-08-25", "2025-08-25", "2025-08-26"]),
+    })
+    partitions = partitions_of(df)
+    assert [partition_id(branch_id, day) for branch_id, day in partitions] == ["1:2025-08-25", "2:2025-08-25", "1:2025-08-26"]
+
+def test_day_runs_merge_consecutive_days():
+    days = [datetime(2025, 8, d) for d in (27, 25, 26, 26, 30)]
+    assert materializer._day_runs(days) == [
+        (datetime(2025, 8, 25), datetime(2025, 8, 27)),
+        (datetime(2025, 8, 30), datetime(2025, 8, 30)),
+    ]
+
+@pytest.fixture
+async def db():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    database = client[TEST_DATABASE_NAME]
+    await client.drop_database(TEST_DATABASE_NAME)
+    await database[settings.COLLECTION_NAME].insert_many(copy.deepcopy(ROWS))
+    yield database
+    await client.drop_database(TEST_DATABASE_NAME)
+    client.close()
+
+async def test_only_marked_partitions_are_materialized(db):
+    await mark_partitions(db, [(1, datetime(2025, 8, 25, 0, 0))])
+    stats = await materialize_dirty(db)
+    assert stats == {"partitions": 1, "written": 1, "removed": 0, "failed": 0}
+
+    docs = await db[DAILY_KPIS_COLLECTION].find({}, {"_id": 0}).to_list(length=None)
+    assert [(doc["branch_id"], doc["date"]) for doc in docs] == [(1, datetime(2025, 8, 25))]
+    assert docs[0]["total_sales_value"] == pytest.approx(200.0)
+    assert docs[0]["total_stockouts"] == 1
+    sketch = await db[SKETCHES_COLLECTION].find_one({"branch_id": 1, "day": datetime(2025, 8, 25)})
+    assert [product["product_id"] for product in sketch["products"]] == [1, 2]
+    assert await db[DIRTY_PARTITIONS_COLLECTION].count_documents({}) == 0
+
+    # Nothing is dirty any more, so a second run does no work.
+    assert (await materialize_dirty(db))["partitions"] == 0
+
+async def test_partition_without_rows_loses_its_daily_kpi(db):
+    await mark_partitions(db, [(2, datetime(2025, 8, 26))])
+    await materialize_dirty(db)
+    await db[settings.COLLECTION_NAME].delete_many({"branch_id": 2})
+    await mark_partitions(db, [(2, datetime(2025, 8, 26))])
+    stats = await materialize_dirty(db)
+    assert stats == {"partitions": 1, "written": 0, "removed": 1, "failed": 0}
+    assert await db[DAILY_KPIS_COLLECTION].count_documents({}) == 0
+    assert await db[SKETCHES_COLLECTION].count_documents({"branch_id": 2}) == 0
+
+async def test_failing_partition_is_parked_without_blocking_the_others(db, monkeypatch):
+    compute_daily_kpis = materializer.compute_daily_kpis
+
+    def fail_on_branch_2(df):
+        if (df["branch_id"] == 2).any():
+            raise ValueError("bad row")
+        return compute_daily_kpis(df)
+
+    monkeypatch.setattr(materializer, "compute_daily_kpis", fail_on_branch_2)
+    monkeypatch.setattr(settings, "MATERIALIZE_MAX_ATTEMPTS", 2)
+    failures = materializer.partition_failures.value()
+    await mark_partitions(db, [(1, datetime(2025, 8, 25)), (2, datetime(2025, 8, 26))])
+
+    stats = await materialize_dirty(db)
+    assert stats == {"partitions": 2, "written": 1, "removed": 0, "failed": 1}
+    assert [doc["branch_id"] for doc in await db[DAILY_KPIS_COLLECTION].find().to_list(length=None)] == [1]
+    mark = await db[DIRTY_PARTITIONS_COLLECTION].find_one({})
+    assert (mark["_id"], mark["attempts"]) == ("2:2025-08-26", 1)
+
+    # The second failure parks it, and the next run has nothing left to do.
+    assert (await materialize_dirty(db))["failed"] == 1
+    assert await db[DIRTY_PARTITIONS_COLLECTION].count_documents({}) == 0
+    parked = await db[FAILED_PARTITIONS_COLLECTION].find_one({})
+    assert (parked["_id"], parked["attempts"]) == ("2:2025-08-26", 2)
+    assert "bad row" in parked["error"]
+    assert materializer.partition_failures.value() == failures + 2
+    assert (await materialize_dirty(db))["partitions"] == 0
+
+    # Once fixed, a retry materializes it and clears the dead letter.
+    monkeypatch.setattr(materializer, "compute_daily_kpis", compute_daily_kpis)
+    assert await retry_failed_partitions(db) == 1
+    assert await materialize_dirty(db) == {"partitions": 1, "written": 1, "removed": 0, "failed": 0}
+    assert await db[FAILED_PARTITIONS_COLLECTION].count_documents({}) == 0
+
+async def test_materialize_forever_backs_off_after_failures(monkeypatch):
+    async def failing(db):
+        raise RuntimeError("database down")
+
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+        if len(delays) == 4:
+            raise asyncio.CancelledError
+
+    monkeypatch.setattr(materializer, "materialize_dirty", failing)
+    monkeypatch.setattr(materializer.asyncio, "sleep", sleep)
+    monkeypatch.setattr(materializer, "MAX_BACKOFF_SECONDS", 15)
+    runs = materializer.run_failures.value()
+    with pytest.raises(asyncio.CancelledError):
+        await materialize_forever(None, 2)
+    assert delays == [4, 8, 15, 15]
+    assert materializer.run_failures.value() == runs + 4
+
+async def test_rows_with_a_time_of_day_belong_to_their_day(db):
+    timed = [dict(row, Date=row["Date"] + timedelta(hours=hours)) for row, hours in zip(copy.deepcopy(ROWS[:2]), (9, 17))]
+    await db[settings.COLLECTION_NAME].delete_many({"branch_id": 1})
+    await db[settings.COLLECTION_NAME].insert_many(timed)
+    assert await mark_all_partitions(db) == 2
+    assert sorted(mark["_id"] for mark in await db[DIRTY_PARTITIONS_COLLECTION].find().to_list(length=None)) == \
+        ["1:2025-08-25", "2:2025-08-26"]
+
+    await materialize_dirty(db)
+    doc = await db[DAILY_KPIS_COLLECTION].find_one({"branch_id": 1})
+    assert doc["date"] == datetime(2025, 8, 25)
+    assert doc["total_sales_value"] == pytest.approx(200.0)
+    sketch = await db[SKETCHES_COLLECTION].find_one({"branch_id": 1})
+    assert [product["product_id"] for product in sketch["products"]] == [1, 2]
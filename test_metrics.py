@@ -0,0 +1,87 @@
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from config import settings
+from services.metrics import (Counter, Histogram, RequestMetrics, phase, record_docs, timing_middleware,
+                              render_metrics, reset_metrics, request_duration, documents_scanned, phase_duration)
+from services.streaming import ndjson_response
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.middleware("http")(timing_middleware)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        with phase("db_fetch"):
+            time.sleep(0.01)
+        record_docs(3)
+        with phase("compute"):
+            return {"item_id": item_id}
+
+    @app.get("/stream")
+    async def get_stream():
+        async def events():
+            for i in range(4):
+                record_docs(1)
+                yield {"i": i}
+        return ndjson_response(events())
+
+    return app
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ["route"], [0.1, 1.0])
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{route="/a"} 2' in lines
+
+def test_counter_renders_its_type():
+    counter = Counter("test_failures_total", "Test.", [])
+    counter.add(1)
+    counter.add(2)
+    assert counter.render() == ["# HELP test_failures_total Test.", "# TYPE test_failures_total counter", "test_failures_total{} 3"]
+
+def test_unaccounted_time_is_booked_as_serialize():
+    metrics = RequestMetrics()
+    metrics.add_phase("db_fetch", 0.3)
+    metrics.add_phase("compute", 0.2)
+    phases = metrics.finish(1.0)
+    assert phases["serialize"] == 0.5
+    # Concurrent phases may exceed the elapsed time; serialize never goes negative.
+    assert metrics.finish(0.4)["serialize"] == 0.0
+
+def test_phase_outside_a_request_is_a_no_op():
+    with phase("compute"):
+        pass
+    record_docs(10)
+
+def test_middleware_records_phases_per_route_template():
+    reset_metrics()
+    client = TestClient(make_app())
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+
+    assert request_duration.count("/items/{item_id}") == 2
+    assert documents_scanned.count("/items/{item_id}") == 2
+    for name in ("db_fetch", "compute", "serialize"):
+        assert phase_duration.count("/items/{item_id}", name) == 2
+    text = render_metrics()
+    assert 'kpi_request_documents_scanned_sum{route="/items/{item_id}"} 6.000000' in text
+    assert 'kpi_response_bytes_count{route="/items/{item_id}"} 2' in text
+
+def test_streamed_documents_are_counted_after_the_body():
+    reset_metrics()
+    client = TestClient(make_app())
+    assert len(client.get("/stream").text.splitlines()) == 4
+    assert 'kpi_request_documents_scanned_sum{route="/stream"} 4.000000' in render_metrics()
+
+def test_server_timing_header_and_slow_request_log(monkeypatch, capsys):
+    monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", True)
+    monkeypatch.setattr(settings, "SLOW_REQUEST_MS", 0)
+    response = TestClient(make_app()).get("/items/1?verbose=1")
+    assert "db_fetch;dur=" in response.headers["Server-Timing"]
+    assert "total;dur=" in response.headers["Server-Timing"]
+    assert "Slow request: GET /items/1?verbose=1" in capsys.readouterr().out
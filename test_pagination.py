@@ -0,0 +1,33 @@
+from datetime import datetime
+import pytest
+from bson import ObjectId
+from services.pagination import encode_cursor, decode_cursor, keyset_query
+
+def test_cursor_round_trip():
+    doc = {"date": datetime(2025, 8, 25), "branch_id": 2, "_id": ObjectId("64b7f0c2a1b2c3d4e5f60718")}
+    assert decode_cursor(encode_cursor(doc)) == (doc["date"], 2, doc["_id"])
+
+@pytest.mark.parametrize("token", ["not-a-cursor", "", "WzEsMl0="])
+def test_invalid_cursor(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+def test_keyset_query_starts_after_cursor():
+    doc = {"date": datetime(2025, 8, 25), "branch_id": 2, "_id": ObjectId("64b7f0c2a1b2c3d4e5f60718")}
+    query = keyset_query({"total_stockouts": {"$gt": 0}}, encode_cursor(doc))
+    assert query["$and"][0] == {"total_stockouts": {"$gt": 0}}
+    assert query["$and"][1]["$or"] == [
+        {"date": {"$gt": doc["date"]}},
+        {"date": doc["date"], "branch_id": {"$gt": 2}},
+        {"date": doc["date"], "branch_id": 2, "_id": {"$gt": doc["_id"]}},
+    ]
+    assert keyset_query({"branch_id": 1}, None) == {"branch_id": 1}
+
+def test_keyset_query_after_a_null_branch_id():
+    doc = {"date": datetime(2025, 8, 25), "branch_id": None, "_id": ObjectId("64b7f0c2a1b2c3d4e5f60718")}
+    query = keyset_query({}, encode_cursor(doc))
+    assert query["$or"] == [
+        {"date": {"$gt": doc["date"]}},
+        {"date": doc["date"], "branch_id": {"$ne": None}},
+        {"date": doc["date"], "branch_id": None, "_id": {"$gt": doc["_id"]}},
+    ]
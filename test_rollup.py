@@ -0,0 +1,76 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.calculations import calculate_stock_outs
+from services.data_preprocessing import preprocess_kpi_data
+from services.rollup import ROLLUP_COLLECTION, build_cells, write_cells, aggregate_rollup, rollup_query
+
+TEST_DATABASE_NAME = "pharmacy_kpi_test_db"
+
+@pytest.fixture(scope="module")
+def frame():
+    return preprocess_kpi_data(pd.read_csv("data/all_in_one_kpi_dataset.csv", nrows=1500))
+
+def test_cells_preserve_totals(frame):
+    cells = build_cells(frame)
+    assert sum(cell["rows"] for cell in cells) == len(frame)
+    assert sum(cell["quantity_sold"] for cell in cells) == frame["Quantity_Sold"].sum()
+    assert sum(cell["sales_value"] for cell in cells) == pytest.approx((frame["Quantity_Sold"] * frame["Price"]).sum())
+    assert sum(cell["stock_outs"] for cell in cells) == len(calculate_stock_outs(frame.to_dict(orient="records")))
+    assert len({cell["_id"] for cell in cells}) == len(cells)
+
+def test_stock_outs_match_calculate_stock_outs(frame):
+    # Out of stock with nothing sold is not a stock-out, so the sample has both cases.
+    sample = frame.head(200).copy()
+    sample.loc[sample.index[:20], "Inventory_Level"] = 0
+    sample.loc[sample.index[:10], "Quantity_Sold"] = 0
+    expected = {}
+    for event in calculate_stock_outs(sample.to_dict(orient="records")):
+        key = (pd.Timestamp(event["date"]).normalize().to_pydatetime(), event["product_id"])
+        expected[key] = expected.get(key, 0) + 1
+    actual = {}
+    for cell in build_cells(sample):
+        if cell["stock_outs"]:
+            key = (cell["day"], cell["Product_ID"])
+            actual[key] = actual.get(key, 0) + cell["stock_outs"]
+    assert actual == expected
+    assert sum(actual.values()) < (sample["Inventory_Level"] == 0).sum()
+
+def test_cells_carry_their_periods(frame):
+    cell = build_cells(frame.head(1).assign(Date=pd.Timestamp("2025-08-28")))[0]
+    assert cell["day"] == datetime(2025, 8, 28)
+    assert cell["week"] == datetime(2025, 8, 25)
+    assert cell["month"] == datetime(2025, 8, 1)
+    assert cell["quarter"] == datetime(2025, 7, 1)
+    assert cell["year"] == datetime(2025, 1, 1)
+
+def test_build_cells_empty_frame(frame):
+    assert build_cells(frame.iloc[0:0]) == []
+
+@pytest.fixture
+async def db():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    database = client[TEST_DATABASE_NAME]
+    await database[ROLLUP_COLLECTION].delete_many({})
+    yield database
+    await database.drop_collection(ROLLUP_COLLECTION)
+    client.close()
+
+async def test_weekly_sales_by_category_matches_raw_rows(db, frame):
+    await write_cells(db, build_cells(frame))
+    # Writing the same rows again must not double count.
+    await write_cells(db, build_cells(frame))
+    rows = await aggregate_rollup(db[ROLLUP_COLLECTION], rollup_query(branch_id=2), "week", ["Category"])
+
+    branch = frame[frame["branch_id"] == 2]
+    week = branch["Date"] - pd.to_timedelta(branch["Date"].dt.weekday, unit="D")
+    expected = (branch["Quantity_Sold"] * branch["Price"]).groupby([week, branch["Category"]]).sum()
+    assert [(row["period"], row["Category"]) for row in rows] == [(w.to_pydatetime(), c) for w, c in expected.index]
+    assert [row["sales_value"] for row in rows] == pytest.approx(expected.tolist())
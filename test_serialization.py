@@ -0,0 +1,59 @@
+import json
+import math
+from datetime import date, datetime
+from typing import List
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pydantic import TypeAdapter
+from models import DailyKPIInDB
+from services.serialization import FastJSONResponse, dumps, trusted_models
+
+DAILY_KPI = {
+    "_id": ObjectId("64b7f0c2a1b2c3d4e5f60718"),
+    "date": datetime(2025, 8, 25),
+    "branch_id": 2,
+    "total_stockouts": 1,
+    "total_near_expiries": 3,
+    "top_sellers": [{"product_id": 5, "total_sales_value": 120.5}],
+    "total_rx_volume": 40,
+    "total_sales_value": 980.25,
+    "total_cash_reconciliation": -2.5,
+    "inventory_levels_top_sellers": [{"product_id": 5, "inventory_level": 12}],
+    "description": "Daily KPIs for branch 2.",
+}
+
+def test_dumps_converts_bson_numpy_and_pandas_values():
+    content = {
+        "id": ObjectId("64b7f0c2a1b2c3d4e5f60718"),
+        "date": datetime(2025, 8, 25, 13, 30),
+        "day": date(2025, 8, 25),
+        "timestamp": pd.Timestamp("2025-08-25"),
+        "count": np.int64(3),
+        "value": np.float64(1.5),
+        "by_branch": {1: 2.0},
+        "missing": math.nan,
+    }
+    assert json.loads(dumps(content)) == {
+        "id": "64b7f0c2a1b2c3d4e5f60718",
+        "date": "2025-08-25T13:30:00",
+        "day": "2025-08-25",
+        "timestamp": "2025-08-25T00:00:00",
+        "count": 3,
+        "value": 1.5,
+        "by_branch": {"1": 2.0},
+        "missing": None,
+    }
+
+def test_trusted_path_matches_validated_response():
+    validated = TypeAdapter(List[DailyKPIInDB])
+    expected = validated.dump_python([DailyKPIInDB(**DAILY_KPI)], mode="json", by_alias=True)
+    models = trusted_models(DailyKPIInDB, [DAILY_KPI])
+    assert isinstance(models[0], DailyKPIInDB)
+    assert json.loads(FastJSONResponse(models).body) == expected
+    assert expected[0]["_id"] == "64b7f0c2a1b2c3d4e5f60718"
+
+def test_response_headers_are_kept():
+    response = FastJSONResponse([], headers={"X-Next-Cursor": "abc"})
+    assert response.headers["x-next-cursor"] == "abc"
+    assert response.media_type == "application/json"
@@ -0,0 +1,26 @@
+import json
+from datetime import datetime
+from bson import ObjectId
+from starlette.requests import Request
+from services.streaming import wants_ndjson, ndjson_response, NDJSON_MEDIA_TYPE
+
+def make_request(accept: str = "application/json") -> Request:
+    return Request({"type": "http", "headers": [(b"accept", accept.encode())]})
+
+def test_wants_ndjson():
+    assert not wants_ndjson(make_request())
+    assert wants_ndjson(make_request(), stream=True)
+    assert wants_ndjson(make_request(NDJSON_MEDIA_TYPE))
+
+async def test_ndjson_response_emits_one_line_per_event():
+    async def events():
+        yield {"date": datetime(2025, 8, 25), "id": ObjectId("64b7f0c2a1b2c3d4e5f60718")}
+        yield {"product_id": "P003"}
+
+    response = ndjson_response(events())
+    assert response.media_type == NDJSON_MEDIA_TYPE
+    chunks = [chunk async for chunk in response.body_iterator]
+    assert [json.loads(chunk) for chunk in chunks] == [
+        {"date": "2025-08-25T00:00:00", "id": "64b7f0c2a1b2c3d4e5f60718"},
+        {"product_id": "P003"},
+    ]
@@ -0,0 +1,106 @@
+import copy
+from datetime import date, datetime, timedelta
+import numpy as np
+import pandas as pd
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from services.cache import bump_data_version
+from services.daily_kpis import DAILY_KPIS_COLLECTION, upsert_daily_kpis
+from services.trends import TREND_MEASURES, TrendSeriesCache, compute_trends, select_days, trend_records
+
+TEST_DATABASE_NAME = "pharmacy_kpi_trends_test_db"
+
+def daily_series(days: int, seed: int = 7, skip=()) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    index = [d for d in pd.date_range("2025-01-01", periods=days, freq="D") if d not in set(skip)]
+    return pd.DataFrame({measure: rng.integers(0, 100, len(index)).astype(float) for measure in TREND_MEASURES},
+                        index=pd.DatetimeIndex(index))
+
+def naive_window_sum(daily: pd.Series, day: pd.Timestamp, window: int):
+    days = [day - pd.Timedelta(days=offset) for offset in range(window)]
+    present = [daily[d] for d in days if d in daily.index]
+    return sum(present) if present else None
+
+@pytest.mark.parametrize("window", [1, 7, 30])
+def test_trends_match_a_day_by_day_calculation(window):
+    daily = daily_series(120, skip=[pd.Timestamp("2025-02-10"), pd.Timestamp("2025-02-11")])
+    trends = compute_trends(daily, window)
+    sales = daily["sales_value"]
+    for day in daily.index[::9]:
+        moving_sum = naive_window_sum(sales, day, window)
+        present = [sales[d] for d in sales.index if day - pd.Timedelta(days=window) < d <= day]
+        assert trends.loc[day, ("sales_value", "moving_sum")] == pytest.approx(moving_sum)
+        assert trends.loc[day, ("sales_value", "rolling_mean")] == pytest.approx(np.mean(present))
+        week_ago = naive_window_sum(sales, day - pd.Timedelta(days=7), window)
+        if week_ago is None:
+            assert np.isnan(trends.loc[day, ("sales_value", "wow_delta")])
+        else:
+            assert trends.loc[day, ("sales_value", "wow_delta")] == pytest.approx(moving_sum - week_ago)
+        month_ago = naive_window_sum(sales, day - pd.DateOffset(months=1), window)
+        if month_ago is None:
+            assert np.isnan(trends.loc[day, ("sales_value", "mom_delta")])
+        else:
+            assert trends.loc[day, ("sales_value", "mom_delta")] == pytest.approx(moving_sum - month_ago)
+    # Only days with data are reported.
+    assert list(trends.index) == list(daily.index)
+
+def test_trend_records_and_day_selection():
+    daily = daily_series(10)
+    trends = select_days(compute_trends(daily, 3), date(2025, 1, 9), date(2025, 1, 10))
+    records = trend_records(trends, 4)
+    assert [record["date"] for record in records] == [datetime(2025, 1, 9), datetime(2025, 1, 10)]
+    assert records[0]["branch_id"] == 4
+    assert records[0]["sales_value"]["value"] == daily.loc["2025-01-09", "sales_value"]
+    assert records[0]["sales_value"]["wow_delta"] is not None
+    assert records[0]["sales_value"]["mom_delta"] is None
+
+def test_empty_series_has_no_trends():
+    assert trend_records(compute_trends(daily_series(0), 7), None) == []
+
+def kpi_doc(branch_id: int, day: datetime, sales: float):
+    return {
+        "date": day, "branch_id": branch_id, "total_stockouts": 1, "total_near_expiries": 0, "top_sellers": [],
+        "total_rx_volume": 2, "total_sales_value": sales, "total_cash_reconciliation": 0.5,
+        "inventory_levels_top_sellers": [], "description": "",
+    }
+
+@pytest.fixture
+async def db():
+    client = AsyncIOMotorClient(settings.DATABASE_URL, serverSelectionTimeoutMS=2000)
+    try:
+        await client.admin.command("ping")
+    except Exception:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+    database = client[TEST_DATABASE_NAME]
+    await client.drop_database(TEST_DATABASE_NAME)
+    yield database
+    await client.drop_database(TEST_DATABASE_NAME)
+    client.close()
+
+async def test_series_cache_applies_new_days_incrementally(db):
+    collection = db[DAILY_KPIS_COLLECTION]
+    start = datetime(2025, 1, 1)
+    await upsert_daily_kpis(collection, [kpi_doc(b, start + timedelta(days=d), 10.0 * b) for b in (1, 2) for d in range(5)])
+    await bump_data_version(db, DAILY_KPIS_COLLECTION)
+    cache = TrendSeriesCache()
+
+    series = await cache.series(db, 1)
+    assert list(series["sales_value"]) == [10.0] * 5
+    assert (await cache.series(db))["sales_value"].tolist() == [30.0] * 5
+    assert cache.full_loads == 1
+
+    # A new day and a corrected old day land.
+    await upsert_daily_kpis(collection, copy.deepcopy([kpi_doc(1, start + timedelta(days=5), 50.0),
+                                                       kpi_doc(1, start, 5.0)]))
+    await bump_data_version(db, DAILY_KPIS_COLLECTION)
+    series = await cache.series(db, 1)
+    assert list(series["sales_value"]) == [5.0, 10.0, 10.0, 10.0, 10.0, 50.0]
+    assert (cache.full_loads, cache.incremental_loads) == (1, 1)
+
+    # A deleted day is only noticed by a full reload.
+    await collection.delete_one({"branch_id": 2, "date": start})
+    await bump_data_version(db, DAILY_KPIS_COLLECTION)
+    assert len(await cache.series(db, 2)) == 4
+    assert cache.full_loads == 2
@@ -0,0 +1,46 @@
+'''
+Helpers shared by the calculation tests: synthetic kpi_data records and a
+recursive comparison that tolerates float rounding.
+'''
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+def make_records(num_rows: int = 500, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    products = [("P001", "Aspirin", "OTC"), ("P002", "Insulin (Rx)", "Rx"), ("P003", "Bandages", "OTC"),
+                ("P004", "Antibiotic (Rx)", "Rx"), ("P005", "Vitamins", "OTC")]
+    start = datetime(2025, 8, 25)
+    records = []
+    for i in range(num_rows):
+        pid, name, cat = products[rng.integers(len(products))]
+        records.append({
+            "Date": start + timedelta(days=int(rng.integers(30))),
+            "Product_ID": pid,
+            "Product_Name": name,
+            "Category": cat,
+            "Inventory_Level": int(rng.integers(0, 5)),
+            "Quantity_Sold": int(rng.poisson(10)),
+            "Price": float(rng.uniform(5, 50)),
+            "Cash_Received": float(rng.uniform(0, 500)),
+            "branch_id": int(rng.integers(1, 4)),
+        })
+    # Rows without a usable product ID sell the most, so any path that ranks them differs.
+    for product_id in (None, 0):
+        records.append({**records[0], "Product_ID": product_id, "Product_Name": "No product",
+                        "Quantity_Sold": 10_000, "Price": 50.0})
+    return records
+
+def assert_same(result, expected):
+    if isinstance(expected, dict):
+        assert list(result.keys()) == list(expected.keys())
+        for key in expected:
+            assert_same(result[key], expected[key])
+    elif isinstance(expected, list):
+        assert len(result) == len(expected)
+        for r, e in zip(result, expected):
+            assert_same(r, e)
+    elif isinstance(expected, float):
+        assert result == pytest.approx(expected)
+    else:
+        assert result == expected